@@ -1,11 +1,31 @@
 """Module provides CRUD operations with database"""
-from typing import Any, Optional
+import base64
+import json
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Iterator, List, Optional
 
-from sqlalchemy.orm import Session
+from sqlalchemy import func, literal_column, or_, select, tuple_
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Query, Session
 
 from errors import exception_handler
 from models import models
 from schemas import schemas
+from services.response_cache import RSS_TAG, news_tags, response_cache
+
+# Maximum number of news inserted with one statement
+NEWS_BATCH_SIZE = 1000
+# Number of news on a page, if page size is not specified
+PAGE_SIZE = 50
+# Orders of news pages, newest first
+ORDER_BY_ID = 'id'
+ORDER_BY_PUBDATE = 'pubdate'
+# Statuses of conversion jobs
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
 
 
 def create_rss_entry(db: Session, rss_url: str, rss_header: str) -> models.Rss:
@@ -21,6 +41,7 @@ def create_rss_entry(db: Session, rss_url: str, rss_header: str) -> models.Rss:
     db.add(db_rss)
     db.commit()
     db.refresh(db_rss)
+    response_cache.invalidate({RSS_TAG})
     return db_rss
 
 
@@ -36,19 +57,25 @@ def create_rss(db: Session, rss: schemas.Rss) -> models.Rss:
     db.add(db_rss)
     db.commit()
     db.refresh(db_rss)
+    response_cache.invalidate({RSS_TAG})
     return db_rss
 
 
 def delete_rss_source(db: Session, rss_source_id: int) -> None:
     """
-    Delete rss source entry in the database
+    Delete rss source entry in the database, its news are deleted as well.
+    Cached responses showing the source or its news are invalidated
     :param db: sqlalchemy session object
     :param rss_source_id: rss source id in the database (schemas.Rss.id)
     :return:
     """
     rss_source = db.query(models.Rss).filter(models.Rss.id == rss_source_id).first()
+    pubdates = [pubdate for pubdate, in db.query(models.News.pubdate_format)
+                .filter(models.News.rss_source == rss_source_id).distinct()]
+    rss_url = rss_source.rss_url
     db.delete(rss_source)
     db.commit()
+    response_cache.invalidate({RSS_TAG} | news_tags([(rss_url, pubdate) for pubdate in pubdates] or [(rss_url, None)]))
 
 
 def get_rss_source_by_url(db: Session, rss_url: str):
@@ -80,9 +107,45 @@ def get_all_rss_sources(db: Session):
     return db.query(models.Rss).all()
 
 
+def get_rss_sources_with_news(db: Session) -> List[dict]:
+    """
+    Get all rss sources with related news as plain dictionaries, for read-only listings.
+    Rss sources and news are read with two queries, no matter how many sources there are,
+    without building ORM objects
+    :param db: sqlalchemy session object
+    :return: list of rss source dictionaries with 'news_list' key, fields are the same as in Rss schema
+    """
+    rss_sources = {}
+    for rss in db.execute(select(models.Rss.id, models.Rss.rss_url, models.Rss.rss_header)
+                          .order_by(models.Rss.id)).mappings():
+        rss_sources[rss["id"]] = dict(rss, news_list=[])
+    news_columns = [getattr(models.News, field) for field in schemas.News.__fields__]
+    for news in db.execute(select(*news_columns).order_by(models.News.rss_source, models.News.id)).mappings():
+        if news["rss_source"] in rss_sources:
+            rss_sources[news["rss_source"]]["news_list"].append(dict(news))
+    return list(rss_sources.values())
+
+
+def get_rss_sources_with_counts(db: Session) -> List[dict]:
+    """
+    Get all rss sources with number of related news as plain dictionaries, for read-only listings
+    :param db: sqlalchemy session object
+    :return: list of rss source dictionaries with 'news_count' key
+    """
+    query = (select(models.Rss.id,
+                    models.Rss.rss_url,
+                    models.Rss.rss_header,
+                    func.count(models.News.id).label("news_count"))
+             .outerjoin(models.News, models.News.rss_source == models.Rss.id)
+             .group_by(models.Rss.id)
+             .order_by(models.Rss.id))
+    return [dict(rss) for rss in db.execute(query).mappings()]
+
+
 def create_news_entry(db: Session, news: schemas.News, rss_id: int):
     """
-    Create a news entry in the database according to schema
+    Create a news entry in the database according to schema,
+    cached responses showing news of the source or the publication date are invalidated
     :param db: sqlalchemy session object
     :param news: News schema with data
     :param rss_id: rss source id
@@ -92,9 +155,55 @@ def create_news_entry(db: Session, news: schemas.News, rss_id: int):
     db.add(news)
     db.commit()
     db.refresh(news)
+    response_cache.invalidate(news_tags([(news.rss.rss_url, news.pubdate_format)]))
     return news
 
 
+def bulk_create_news(db: Session,
+                     rss_url: str,
+                     rss_header: Optional[str],
+                     news_list: List[dict],
+                     dialect: Optional[str] = None) -> int:
+    """
+    Insert news of the rss source in one transaction. Rss source entry is resolved or created
+    with the same transaction, news with titles already in the database are skipped.
+    Cached responses showing news of the source or publication dates of inserted news are invalidated,
+    rss sources list is invalidated if the rss source was created
+    :param db: sqlalchemy session object
+    :param rss_url: rss source url
+    :param rss_header: rss source header, used if the rss source is not in the database yet
+    :param news_list: list of news dictionaries with News model fields
+    :param dialect: detected feed dialect, stored if the rss source doesn't have one yet
+    :return: number of inserted news
+    """
+    rss_statement = postgresql.insert(models.Rss).values(rss_url=rss_url, rss_header=rss_header, dialect=dialect)
+    # Updating the conflicting row is needed to return its id, row inserted by the statement has zero 'xmax'
+    rss_statement = rss_statement.on_conflict_do_update(
+        index_elements=[models.Rss.rss_url],
+        set_={"dialect": func.coalesce(models.Rss.dialect, rss_statement.excluded.dialect)}
+    ).returning(models.Rss.id, literal_column("xmax = 0"))
+    rss_id, rss_created = db.execute(rss_statement).one()
+
+    # Publication dates of inserted news, skipped news are not returned
+    inserted_pubdates = []
+    for batch_start in range(0, len(news_list), NEWS_BATCH_SIZE):
+        news_rows = [{**news, "rss_source": rss_id} for news in news_list[batch_start:batch_start + NEWS_BATCH_SIZE]]
+        news_statement = postgresql.insert(models.News).values(news_rows).on_conflict_do_nothing(
+            index_elements=[models.News.title]
+        ).returning(models.News.pubdate_format)
+        inserted_pubdates.extend(db.execute(news_statement).scalars())
+    db.commit()
+    invalidated_tags = set()
+    if inserted_pubdates:
+        invalidated_tags.update(news_tags((rss_url, pubdate) for pubdate in set(inserted_pubdates)))
+    if rss_created:
+        # Rss sources list changes even if the new source has no news to insert
+        invalidated_tags.add(RSS_TAG)
+    if invalidated_tags:
+        response_cache.invalidate(invalidated_tags)
+    return len(inserted_pubdates)
+
+
 def get_news_by_title(db: Session, title: str):
     """
     Get news by title
@@ -166,12 +275,361 @@ def get_all_news(db: Session, limit_arg: Optional[int] = None):
     return db.query(models.News).limit(limit_arg).all()
 
 
+def query_news(db: Session,
+               pubdate: Optional[str] = None,
+               source: Optional[str] = None,
+               date_from: Optional[datetime] = None,
+               date_to: Optional[datetime] = None) -> Query:
+    """
+    Build query of news filtered by publication date, date range and/or rss source
+    :param db: sqlalchemy session object
+    :param pubdate: news publication date in YYYYMMDD format
+    :param source: rss source url
+    :param date_from: range start, inclusive, news without publication date are skipped if given
+    :param date_to: range end, exclusive, news without publication date are skipped if given
+    :return: news query
+    """
+    query = db.query(models.News)
+    if source is not None:
+        rss_source = get_rss_source_by_url(db=db, rss_url=source)
+        if rss_source is None:
+            raise exception_handler.NewsNotFound
+        query = query.filter(models.News.rss_source == rss_source.id)
+    if pubdate is not None:
+        query = query.filter(models.News.pubdate_format == pubdate)
+    if date_from is not None or date_to is not None:
+        query = query.filter(models.News.pubdate_ts.isnot(None))
+    if date_from is not None:
+        query = query.filter(models.News.pubdate_ts >= date_from)
+    if date_to is not None:
+        query = query.filter(models.News.pubdate_ts < date_to)
+    return query
+
+
+def _page_key_columns(order: str) -> list:
+    """
+    Columns news pages are ordered by, last one is unique
+    :param order: page order, ORDER_BY_ID or ORDER_BY_PUBDATE
+    :return: list of columns
+    """
+    if order == ORDER_BY_PUBDATE:
+        return [models.News.pubdate_ts, models.News.id]
+    return [models.News.id]
+
+
+def _encode_cursor(news: models.News, order: str) -> str:
+    """
+    Encode position of the news in ordered news into an opaque cursor
+    :param news: news entry
+    :param order: page order, ORDER_BY_ID or ORDER_BY_PUBDATE
+    :return: url safe cursor
+    """
+    key = [news.pubdate_ts.isoformat(), news.id] if order == ORDER_BY_PUBDATE else [news.id]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def _decode_cursor(cursor: str, order: str) -> list:
+    """
+    Decode cursor into values of page key columns
+    :param cursor: cursor from previous page
+    :param order: page order, ORDER_BY_ID or ORDER_BY_PUBDATE
+    :return: list of key column values
+    """
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if order == ORDER_BY_PUBDATE:
+            return [datetime.fromisoformat(key[0]), int(key[1])]
+        return [int(key[0])]
+    except (ValueError, TypeError, IndexError, KeyError):
+        raise exception_handler.NotValidCursor
+
+
+def get_news_page(query: Query,
+                  order: str = ORDER_BY_ID,
+                  page_size: Optional[int] = None,
+                  after: Optional[str] = None,
+                  before: Optional[str] = None) -> dict:
+    """
+    Get a page of news, newest first, with keyset pagination. Page starts right after
+    the 'after' cursor or ends right before the 'before' cursor, so only one page of rows
+    is read from the index whatever the page position is
+    :param query: news query, see 'query_news'
+    :param order: page order, ORDER_BY_ID or ORDER_BY_PUBDATE, news without publication date
+    can't be positioned by date and are skipped in ORDER_BY_PUBDATE order
+    :param page_size: number of news on a page, PAGE_SIZE if None
+    :param after: cursor of the last news of the previous page
+    :param before: cursor of the first news of the next page
+    :return: dictionary with 'news_list', 'next_cursor' and 'prev_cursor' keys,
+    cursors are None if there are no more pages in that direction
+    """
+    page_size = page_size or PAGE_SIZE
+    key_columns = _page_key_columns(order)
+    if order == ORDER_BY_PUBDATE:
+        query = query.filter(models.News.pubdate_ts.isnot(None))
+    if before is not None:
+        # Read the page backwards from the cursor and restore newest first order
+        query = query.filter(tuple_(*key_columns) > tuple_(*_decode_cursor(before, order)))
+        rows = query.order_by(*[column.asc() for column in key_columns]).limit(page_size + 1).all()
+        has_more = len(rows) > page_size
+        news_list = rows[:page_size][::-1]
+        next_cursor = _encode_cursor(news_list[-1], order) if news_list else None
+        prev_cursor = _encode_cursor(news_list[0], order) if has_more else None
+    else:
+        if after is not None:
+            query = query.filter(tuple_(*key_columns) < tuple_(*_decode_cursor(after, order)))
+        rows = query.order_by(*[column.desc() for column in key_columns]).limit(page_size + 1).all()
+        has_more = len(rows) > page_size
+        news_list = rows[:page_size]
+        next_cursor = _encode_cursor(news_list[-1], order) if has_more else None
+        prev_cursor = _encode_cursor(news_list[0], order) if after is not None and news_list else None
+    return {"news_list": news_list, "next_cursor": next_cursor, "prev_cursor": prev_cursor}
+
+
+def iter_news_with_source_url(query: Query,
+                              limit_arg: Optional[int] = None,
+                              batch_size: int = NEWS_BATCH_SIZE) -> Iterator[dict]:
+    """
+    Stream news of the query, newest first, as dictionaries with rss source url under 'url' key.
+    Rows are fetched from a server-side cursor in batches, so memory usage doesn't depend on number of news
+    :param query: news query, see 'query_news'
+    :param limit_arg: limit number of news
+    :param batch_size: number of rows fetched at once
+    :return: iterator over news dictionaries
+    """
+    news_columns = [getattr(models.News, field) for field in schemas.News.__fields__]
+    rows = (query.join(models.Rss, models.News.rss_source == models.Rss.id)
+            .with_entities(*news_columns, models.Rss.rss_url.label("url"))
+            .order_by(models.News.id.desc())
+            .limit(limit_arg)
+            .yield_per(batch_size))
+    for row in rows:
+        yield row._asdict()
+
+
+def search_news(db: Session,
+                search_query: str,
+                source: Optional[str] = None,
+                limit_arg: Optional[int] = None,
+                offset: int = 0) -> List[models.News]:
+    """
+    Search news by words in titles and descriptions with full-text GIN index, best matches first
+    :param db: sqlalchemy session object
+    :param search_query: search query, web search syntax: quoted phrases, 'or', '-word' are supported
+    :param source: rss source url, news of all sources if None
+    :param limit_arg: limit number of news
+    :param offset: number of best matching news to skip
+    :return: list of news
+    """
+    ts_query = func.websearch_to_tsquery('english', search_query)
+    query = db.query(models.News).filter(models.News.search_vector.op('@@')(ts_query))
+    if source is not None:
+        rss_source = get_rss_source_by_url(db=db, rss_url=source)
+        if rss_source is None:
+            raise exception_handler.NewsNotFound
+        query = query.filter(models.News.rss_source == rss_source.id)
+    rank = func.ts_rank_cd(models.News.search_vector, ts_query)
+    return query.order_by(rank.desc(), models.News.id.desc()).offset(offset).limit(limit_arg).all()
+
+
 def delete_news_by_id(db: Session, news_id: int):
     """
-    Delete news entry from the database by news id
+    Delete news entry from the database by news id,
+    cached responses showing news of its source or publication date are invalidated
     :param db: sqlalchemy session object
     :param news_id: news id in the database
     :return:
     """
+    deleted_news = (db.query(models.Rss.rss_url, models.News.pubdate_format)
+                    .join(models.News.rss)
+                    .filter(models.News.id == news_id)
+                    .first())
     db.query(models.News).filter(models.News.id == news_id).delete()
     db.commit()
+    if deleted_news is not None:
+        response_cache.invalidate(news_tags([tuple(deleted_news)]))
+
+
+def get_http_cache_entry(db: Session, rss_url: str) -> Optional[dict]:
+    """
+    Get HTTP cache entry of the rss source
+    :param db: sqlalchemy session object
+    :param rss_url: rss source url
+    :return: dictionary with 'etag', 'last_modified', 'body', 'news' and 'news_limit' keys or None
+    """
+    cache_entry = db.query(models.HttpCache).filter(models.HttpCache.rss_url == rss_url).first()
+    if cache_entry is None:
+        return None
+    return {"etag": cache_entry.etag,
+            "last_modified": cache_entry.last_modified,
+            "body": cache_entry.body,
+            "news": cache_entry.news,
+            "news_limit": cache_entry.news_limit}
+
+
+def update_http_cache_entry(db: Session, feed, news_list: List[dict], limit_arg: Optional[int] = None) -> None:
+    """
+    Store rss source response validators, body and parsed news in HTTP cache.
+    Responses without ETag or Last-Modified validators are not stored,
+    as well as not modified feeds with reused parse result
+    :param db: sqlalchemy session object
+    :param feed: fetched FeedDocument
+    :param news_list: list of news parsed from the feed
+    :param limit_arg: limit argument news were parsed with
+    :return:
+    """
+    if feed.not_modified and feed.cached_news(limit_arg) is not None:
+        return
+    if not feed.etag and not feed.last_modified:
+        return
+    cache_entry = db.query(models.HttpCache).filter(models.HttpCache.rss_url == feed.url).first()
+    if cache_entry is None:
+        cache_entry = models.HttpCache(rss_url=feed.url)
+        db.add(cache_entry)
+    cache_entry.etag = feed.etag
+    cache_entry.last_modified = feed.last_modified
+    cache_entry.body = feed.content
+    cache_entry.news = json.dumps(news_list, ensure_ascii=False)
+    cache_entry.news_limit = limit_arg
+    db.commit()
+
+
+def create_conversion_job(db: Session,
+                          file_format: str,
+                          filename: str,
+                          target_path: str,
+                          news_list: List[dict]) -> models.ConversionJob:
+    """
+    Func puts a news conversion job into the queue
+    :param db: sqlalchemy session object
+    :param file_format: format news are converted into, 'pdf', 'html' or 'epub'
+    :param filename: name of converted file
+    :param target_path: path converted file is saved to
+    :param news_list: list of news to convert
+    :return: queued conversion job entry
+    """
+    db_job = models.ConversionJob(id=uuid.uuid4().hex,
+                                  file_format=file_format,
+                                  filename=filename,
+                                  target_path=target_path,
+                                  news=json.dumps(news_list, ensure_ascii=False, default=str),
+                                  status=JOB_QUEUED,
+                                  created_at=datetime.now(timezone.utc))
+    db.add(db_job)
+    db.commit()
+    db.refresh(db_job)
+    return db_job
+
+
+def get_conversion_job(db: Session, job_id: str) -> Optional[models.ConversionJob]:
+    """
+    Get conversion job entry by it's id from the database
+    :param db: sqlalchemy session object
+    :param job_id: conversion job id
+    :return: conversion job entry or None
+    """
+    return db.query(models.ConversionJob).filter(models.ConversionJob.id == job_id).first()
+
+
+def get_conversion_job_position(db: Session, job: models.ConversionJob) -> Optional[int]:
+    """
+    Get position of a queued conversion job in the queue
+    :param db: sqlalchemy session object
+    :param job: conversion job entry
+    :return: number of queued jobs before the job, None if the job is not queued
+    """
+    if job.status != JOB_QUEUED:
+        return None
+    return (db.query(func.count(models.ConversionJob.id))
+            .filter(models.ConversionJob.status == JOB_QUEUED,
+                    models.ConversionJob.created_at < job.created_at)
+            .scalar())
+
+
+def claim_next_conversion_job(db: Session, instance_id: str) -> Optional[models.ConversionJob]:
+    """
+    Takes the oldest queued conversion job and marks it as running, leased by the application instance.
+    Row is locked while claimed, so a job is never taken by two application instances
+    :param db: sqlalchemy session object
+    :param instance_id: id of application instance running the job
+    :return: claimed conversion job entry or None if the queue is empty
+    """
+    db_job = (db.query(models.ConversionJob)
+              .filter(models.ConversionJob.status == JOB_QUEUED)
+              .order_by(models.ConversionJob.created_at)
+              .with_for_update(skip_locked=True)
+              .first())
+    if db_job is None:
+        db.rollback()
+        return None
+    db_job.status = JOB_RUNNING
+    db_job.started_at = db_job.heartbeat_at = datetime.now(timezone.utc)
+    db_job.claimed_by = instance_id
+    db.commit()
+    db.refresh(db_job)
+    return db_job
+
+
+def renew_conversion_job_leases(db: Session, instance_id: str, job_ids: List[str]) -> None:
+    """
+    Extends leases of conversion jobs the application instance is running
+    :param db: sqlalchemy session object
+    :param instance_id: id of application instance running the jobs
+    :param job_ids: ids of running conversion jobs
+    :return:
+    """
+    if not job_ids:
+        return
+    db.query(models.ConversionJob).filter(models.ConversionJob.id.in_(job_ids),
+                                          models.ConversionJob.status == JOB_RUNNING,
+                                          models.ConversionJob.claimed_by == instance_id).update(
+        {models.ConversionJob.heartbeat_at: datetime.now(timezone.utc)},
+        synchronize_session=False)
+    db.commit()
+
+
+def finish_conversion_job(db: Session,
+                          job_id: str,
+                          instance_id: str,
+                          error: Optional[str] = None,
+                          artifact_key: Optional[str] = None) -> None:
+    """
+    Marks conversion job as done, or as failed if error is provided.
+    Job is not changed if its lease was lost and the job was put back into the queue
+    :param db: sqlalchemy session object
+    :param job_id: conversion job id
+    :param instance_id: id of application instance which ran the job
+    :param error: error message of failed job
+    :param artifact_key: cache key of converted file
+    :return:
+    """
+    db.query(models.ConversionJob).filter(models.ConversionJob.id == job_id,
+                                          models.ConversionJob.status == JOB_RUNNING,
+                                          models.ConversionJob.claimed_by == instance_id).update(
+        {models.ConversionJob.status: JOB_FAILED if error else JOB_DONE,
+         models.ConversionJob.error: error,
+         models.ConversionJob.artifact_key: artifact_key,
+         models.ConversionJob.news: None,
+         models.ConversionJob.finished_at: datetime.now(timezone.utc)},
+        synchronize_session=False)
+    db.commit()
+
+
+def requeue_conversion_jobs(db: Session, expired_before: datetime, claimed_by: Optional[str] = None) -> None:
+    """
+    Puts running jobs back into the queue if their lease expired, so jobs of stopped or crashed
+    application instances are run again. Jobs still leased by other instances are not touched
+    :param db: sqlalchemy session object
+    :param expired_before: jobs whose lease was last renewed before this time are requeued
+    :param claimed_by: id of application instance whose jobs are requeued regardless of their lease
+    :return:
+    """
+    lease_lost = [models.ConversionJob.heartbeat_at.is_(None), models.ConversionJob.heartbeat_at < expired_before]
+    if claimed_by is not None:
+        lease_lost.append(models.ConversionJob.claimed_by == claimed_by)
+    db.query(models.ConversionJob).filter(models.ConversionJob.status == JOB_RUNNING, or_(*lease_lost)).update(
+        {models.ConversionJob.status: JOB_QUEUED,
+         models.ConversionJob.started_at: None,
+         models.ConversionJob.claimed_by: None,
+         models.ConversionJob.heartbeat_at: None},
+        synchronize_session=False)
+    db.commit()
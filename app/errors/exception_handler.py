@@ -16,6 +16,26 @@ class NotValidLimitArg(Exception):
     pass
 
 
+class NotValidDateArg(Exception):
+    """Error raised if date argument is not in YYYYMMDD format"""
+    pass
+
+
+class NotValidCursor(Exception):
+    """Error raised if pagination cursor is malformed"""
+    pass
+
+
 class NotValidFilename(Exception):
     """Error raised if input filename is not valid"""
     pass
+
+
+class ConversionFailed(Exception):
+    """Error raised if converter didn't produce a converted file"""
+    pass
+
+
+class ImageRejected(Exception):
+    """Error raised if downloaded image is not an image or exceeds size limits"""
+    pass
@@ -1,54 +1,123 @@
 import os
-from typing import Any, List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
-import requests.exceptions
+import httpx
 from fastapi import Depends, FastAPI, Form, HTTPException, Request
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Query, Session
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 from starlette.templating import Jinja2Templates
 
 
+import database
 from crud import crud
 from errors import exception_handler
-from rss_parser.caching.caching_images import ImageHandler
+from rss_parser.caching.caching_images import IMAGE_VARIANTS, VARIANTS_VERSION, ImageStore, image_variant
 from rss_parser.converters import converter
-from rss_parser.news_parser import news_parser
 from schemas import schemas
-from services import services, validator
+from services import http_client, ingestion, jobs, responses, scheduler, services, validator
+from services.response_cache import RSS_TAG, ResponseCache, news_tag, response_cache
 
 
 app = FastAPI()
 
-# Create database
-services.create_database()
+# Create database and upgrade already existing tables
+services.upgrade_database()
 # Static files location with bootstrap elements
 app.mount("/templates/static", StaticFiles(directory="templates/static"), name="static")
 # Setup Jinja templates folder location
 templates = Jinja2Templates(directory="templates")
 # Location of dump folder for converted files
 CONVERTED_FILES_FOLDER = os.path.join(os.path.dirname(__file__), 'converted_files_dump')
+# Cached images are served under urls changing with image content, so browsers and proxies keep them for a year
+IMAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+@app.on_event("startup")
+async def startup() -> None:
+    # Start background polling of stored rss sources
+    if scheduler.POLLER_ENABLED:
+        scheduler.feed_poller.start()
+    # Start conversion job queue with its worker processes
+    jobs.conversion_queue.start()
+
+
+@app.on_event("shutdown")
+async def shutdown() -> None:
+    # Stop background polling, conversion job queue and image prefetching,
+    # close pooled connections of the shared HTTP client
+    await scheduler.feed_poller.stop()
+    await jobs.conversion_queue.stop()
+    await ingestion.cancel_image_prefetch()
+    await http_client.close_http_client()
+
+
+def cached_page(request: Request, page_key: str) -> Optional[Response]:
+    """
+    Looks rendered page up in response cache. Page is rendered again if cached images it links
+    were evicted or downloaded again since the page was cached
+    :param request: request object
+    :param page_key: response key, see 'ResponseCache.key'
+    :return: cached response, 304 response if client has the same page, or None if page is not cached
+    """
+    cached_response = response_cache.get(page_key)
+    if cached_response is None:
+        return None
+    if cached_response["image_urls"]:
+        image_urls, _ = news_images(news_list=[{"news_img_link": img_link}
+                                               for img_link in cached_response["image_urls"]])
+        if image_urls != cached_response["image_urls"]:
+            return None
+    return responses.cached_content_response(request=request, cached_response=cached_response)
+
+
+def cache_page(request: Request, page_key: str, tags: Iterable[str], response: Response) -> Response:
+    """
+    Stores rendered page in response cache and sends it with 'ETag' header, urls of cached images
+    the page links are kept to check them when the page is read. Pages with images which are not cached yet
+    are not stored: they link images directly until the background task of the response caches them
+    :param request: request object
+    :param page_key: response key, see 'ResponseCache.key'
+    :param tags: tags of rss sources and publication dates of news shown on the page
+    :param response: rendered response
+    :return: response object
+    """
+    if response.background is not None:
+        return response
+    image_urls = getattr(response, "context", {}).get("image_urls")
+    cached_response = response_cache.put(page_key, tags, response.body, response.media_type, image_urls=image_urls)
+    return responses.cached_content_response(request=request, cached_response=cached_response)
 
 
 @app.get("/")
 def start(request: Request, db: Session = Depends(services.get_db)):
+    # Rss sources list is served from response cache until rss sources change
+    page_key = ResponseCache.key("GET /")
+    page = cached_page(request=request, page_key=page_key)
+    if page is not None:
+        return page
     rss_list = crud.get_all_rss_sources(db=db)
-    return templates.TemplateResponse('main.html', {"request": request,
-                                                    "rss_list": rss_list})
+    return cache_page(request=request,
+                      page_key=page_key,
+                      tags={RSS_TAG},
+                      response=templates.TemplateResponse('main.html', {"request": request,
+                                                                        "rss_list": rss_list}))
 
 
 @app.post("/read-rss",  response_class=HTMLResponse)
-def read_rss_source(request: Request,
-                    rss_url: Optional[str] = Form(None),
-                    limit_arg: Optional[Any] = Form(None),
-                    date_arg: Optional[str] = Form(None),
-                    save_pdf: Optional[bool] = Form(None),
-                    filename_pdf: Optional[str] = Form(None),
-                    save_html: Optional[bool] = Form(None),
-                    filename_html: Optional[str] = Form(None),
-                    save_epub: Optional[bool] = Form(None),
-                    filename_epub: Optional[str] = Form(None),
-                    db: Session = Depends(services.get_db)):
+async def read_rss_source(request: Request,
+                          rss_url: Optional[str] = Form(None),
+                          limit_arg: Optional[Any] = Form(None),
+                          date_arg: Optional[str] = Form(None),
+                          save_pdf: Optional[bool] = Form(None),
+                          filename_pdf: Optional[str] = Form(None),
+                          save_html: Optional[bool] = Form(None),
+                          filename_html: Optional[str] = Form(None),
+                          save_epub: Optional[bool] = Form(None),
+                          filename_epub: Optional[str] = Form(None),
+                          db: Session = Depends(services.get_db)):
 
     # Validate limit argument, if provided
     if limit_arg is not None:
@@ -58,12 +127,13 @@ def read_rss_source(request: Request,
         except exception_handler.NotValidLimitArg:
             raise HTTPException(status_code=418, detail="Not valid limit argument. Should be an integer <= 0")
 
-    # Check internet connection and validate provided url and check if it is leading to a rss feed
+    # Check internet connection, fetch provided url once and check if it is leading to a rss feed
     if not date_arg:
         try:
-            validator.check_internet_connection()
-            validator.validate_url_is_rss_feed(url=rss_url)
-        except requests.exceptions.ConnectionError:
+            await validator.check_internet_connection_async(client=http_client.get_http_client())
+            feed = await ingestion.fetch_feed(db=db, rss_url=rss_url)
+            validator.validate_url_is_rss_feed(feed=feed)
+        except httpx.TransportError:
             raise HTTPException(status_code=418, detail="No internet connection. Provide date arg. to read from cache")
         except exception_handler.NotRssFeedUrlError:
             raise HTTPException(status_code=418, detail="Provided URL doesn't lead to a RSS feed")
@@ -72,86 +142,112 @@ def read_rss_source(request: Request,
 
     parsed_news_list = []
 
-    # Check rss type of provided link and parse news from provided rss source
+    # Parse news from provided rss source and store news in the database, images are cached by conversion jobs
     if not date_arg:
-        rss_type = news_parser.rss_feed_type_checker(url=rss_url)
-        if rss_type:
-            parsed_news_list = news_parser.parse_rss_feed_with_non_xml(url=rss_url, limit_arg=limit_arg)
-        else:
-            parsed_news_list = news_parser.parse_rss_feed_regularly(url=rss_url, limit_arg=limit_arg)
-
-        # Cache images and save them locally under 'rss_parser/caching/cached_images' folder
-        cache_images = ImageHandler(parsed_news_list)
-        cache_images.download_images_concurrently()
-        cache_images.resize_cached_images_concurrently()
-
-        # Check if provided rss source is already in the database, if not insert into 'rss_book' table
-        if not crud.get_rss_source_by_url(db=db, rss_url=rss_url):
-            rss_header = news_parser.get_rss_header(url=rss_url)
-            crud.create_rss_entry(rss_url=rss_url, rss_header=rss_header, db=db)
-
-        # Get rss source entry for further relation with news table (rss source id from database is needed)
-        rss_entry_from_db = crud.get_rss_source_by_url(db=db, rss_url=rss_url)
-
-        # Insert news into table if they aren't already in there
-        for news in parsed_news_list:
-            if not crud.get_news_by_title(db=db, title=news['title']):
-                news['pubdate_format'] = services.format_pubdate(news['pubdate'])
-                crud.create_news_entry(db=db, news=news, rss_id=rss_entry_from_db.id)
+        parsed_news_list, _ = await ingestion.ingest_feed(db=db, feed=feed, limit_arg=limit_arg)
 
     # Get data from cache, if date argument provided
     if date_arg is not None:
         try:
-            parsed_news_list = crud.get_news_by_date_source(db=db,
-                                                            pubdate=date_arg,
-                                                            source=rss_url,
-                                                            limit_arg=limit_arg)
+            parsed_news_list = await run_in_threadpool(crud.get_news_by_date_source,
+                                                       db=db,
+                                                       pubdate=date_arg,
+                                                       source=rss_url,
+                                                       limit_arg=limit_arg)
         except exception_handler.NewsNotFound:
             raise HTTPException(status_code=404, detail=f"No news found published on {date_arg} from {rss_url}")
 
         if not list(parsed_news_list):
             raise HTTPException(status_code=404, detail=f"No news found published on {date_arg} from {rss_url}")
 
-    # Convert into pdf
-    if save_pdf:
+    # If date argument is provided, then data retrieved from the database and in that case we have to
+    # convert list of sqlalchemy.orm objects into dictionary for storing them with conversion jobs
+    if date_arg and (save_pdf or save_html or save_epub):
+        parsed_news_list = [services.object_as_dict(news) for news in parsed_news_list]
+
+    # Put conversions into the queue, files are rendered by worker processes in background
+    conversion_jobs = []
+    for file_format, save_file, filename in (('pdf', save_pdf, filename_pdf),
+                                             ('html', save_html, filename_html),
+                                             ('epub', save_epub, filename_epub)):
+        if not save_file:
+            continue
         try:
-            validator.validate_filename(filename=filename_pdf)
-            converter.Converter.convert_to_pdf(target_path=services.create_target_path(folder=CONVERTED_FILES_FOLDER,
-                                                                                       extension='pdf',
-                                                                                       filename=filename_pdf),
-                                               news_list=parsed_news_list)
+            validator.validate_filename(filename=filename)
         except exception_handler.NotValidFilename:
-            raise HTTPException(status_code=418, detail=f"Pdf filename field is empty")
-
-    # Convert into html
-    if save_html:
-        try:
-            validator.validate_filename(filename=filename_html)
-            converter.Converter.convert_to_html(target_path=services.create_target_path(folder=CONVERTED_FILES_FOLDER,
-                                                                                        extension='html',
-                                                                                        filename=filename_html),
-                                                news_list=parsed_news_list)
-        except exception_handler.NotValidFilename:
-            raise HTTPException(status_code=418, detail=f"Html filename field is empty")
-
-    # Convert into epub
-    if save_epub:
-        try:
-            validator.validate_filename(filename=filename_epub)
-            # If date argument is provided, then data retrieved from the database and in that case we have to
-            # convert list of sqlalchemy.orm objects into dictionary for correct EPUB converter work
-            if date_arg:
-                parsed_news_list = [services.object_as_dict(news) for news in parsed_news_list]
-            converter.Converter.convert_to_epub(target_path=services.create_target_path(folder=CONVERTED_FILES_FOLDER,
-                                                                                        extension='epub',
-                                                                                        filename=filename_epub),
-                                                news_list=parsed_news_list)
-        except exception_handler.NotValidFilename:
-            raise HTTPException(status_code=418, detail=f"Epub filename field is empty")
-
-    # Render HTML with parsed news
+            raise HTTPException(status_code=418, detail=f"{file_format.capitalize()} filename field is empty")
+        target_path = services.create_target_path(folder=CONVERTED_FILES_FOLDER,
+                                                  extension=file_format,
+                                                  filename=filename)
+        conversion_jobs.append(await run_in_threadpool(crud.create_conversion_job,
+                                                       db=db,
+                                                       file_format=file_format,
+                                                       filename=os.path.basename(target_path),
+                                                       target_path=target_path,
+                                                       news_list=parsed_news_list))
+    if conversion_jobs:
+        jobs.conversion_queue.notify()
+
+    # Render HTML with parsed news, cached images are served by the application
+    image_urls, cache_images_task = await run_in_threadpool(news_images, news_list=parsed_news_list)
     return templates.TemplateResponse('read_rss.html', {"request": request,
-                                                        "news_list": parsed_news_list})
+                                                        "news_list": parsed_news_list,
+                                                        "image_urls": image_urls,
+                                                        "conversion_jobs": conversion_jobs},
+                                      background=cache_images_task)
+
+
+def news_images(news_list: Iterable[Any], variant: str = "article") -> Tuple[Dict[str, str], Optional[BackgroundTask]]:
+    """
+    Builds urls of cached news images served by '/images' endpoint. Url contains version of image file,
+    so it changes when image is downloaded again. Images which are not cached yet are linked directly
+    and cached in background after the response is sent, so they are served by the application next time
+    :param news_list: news dictionaries or sqlalchemy.orm objects
+    :param variant: image variant shown on the page
+    :return: dictionary with image urls under image links and background task caching missing images
+    """
+    img_links = set(news['news_img_link'] if isinstance(news, dict) else news.news_img_link
+                    for news in news_list) - {'Empty'}
+    image_urls = {}
+    for img_link, location in ImageStore().lookup(img_links).items():
+        try:
+            image_version = f"{VARIANTS_VERSION}-{os.stat(location).st_mtime_ns:x}"
+        except FileNotFoundError:
+            continue
+        image_url = app.url_path_for("get_cached_image", image_key=ImageStore.image_key(img_link), variant=variant)
+        image_urls[img_link] = f"{image_url}?v={image_version}"
+    missing_images = [{'news_img_link': img_link} for img_link in img_links if img_link not in image_urls]
+    if not missing_images:
+        return image_urls, None
+    return image_urls, BackgroundTask(ingestion.cache_news_images, missing_images)
+
+
+def render_news_page(request: Request,
+                     page: dict,
+                     page_action: str,
+                     page_params: dict,
+                     page_method: str = "get") -> HTMLResponse:
+    """
+    Renders a page of news from the database with links to previous and next pages
+    :param request: request object
+    :param page: page of news with cursors, see 'crud.get_news_page'
+    :param page_action: url the page was requested from
+    :param page_params: parameters of the request, passed along with page cursors
+    :param page_method: method of the request
+    :return: rendered HTML page
+    """
+    image_urls, cache_images_task = news_images(news_list=page["news_list"])
+    return templates.TemplateResponse('get_news_from_db.html', {"request": request,
+                                                                "news_list": page["news_list"],
+                                                                "image_urls": image_urls,
+                                                                "next_cursor": page["next_cursor"],
+                                                                "prev_cursor": page["prev_cursor"],
+                                                                "page_action": page_action,
+                                                                "page_method": page_method,
+                                                                "page_params": {name: value for name, value
+                                                                                in page_params.items()
+                                                                                if value is not None}},
+                                      background=cache_images_task)
 
 
 @app.post("/read-cache", response_class=HTMLResponse)
@@ -159,103 +255,274 @@ def read_news_from_cache(request: Request,
                          dropdown_choices: Optional[Any] = Form(None),
                          limit_arg_cache: Optional[int] = Form(None),
                          date_arg_cache: Optional[str] = Form(None),
+                         after: Optional[str] = Form(None),
+                         before: Optional[str] = Form(None),
                          db: Session = Depends(services.get_db)):
-    # Validate limit argument
+    # Pages are served from response cache until news of the source or the date change
+    page_key = ResponseCache.key("POST /read-cache", dropdown_choices=dropdown_choices, limit_arg_cache=limit_arg_cache,
+                                 date_arg_cache=date_arg_cache, after=after, before=before)
+    cached_response = cached_page(request=request, page_key=page_key)
+    if cached_response is not None:
+        return cached_response
+    # Validate limit argument, it is a number of news on a page
     if limit_arg_cache is not None:
         try:
             validator.validate_limit_arg(value=limit_arg_cache)
             limit_arg_cache = int(limit_arg_cache)
         except Exception:
             raise HTTPException(status_code=418, detail="Not valid limit argument. Should be an integer <= 0")
-    # Get data from the database
+    # Get a page of data from the database
+    page_params = {"dropdown_choices": dropdown_choices,
+                   "limit_arg_cache": limit_arg_cache,
+                   "date_arg_cache": date_arg_cache}
     try:
         if dropdown_choices == "all":
             dropdown_choices = None
-        news_list = crud.get_news_by_date_source(db=db,
-                                                 pubdate=date_arg_cache,
-                                                 source=dropdown_choices,
-                                                 limit_arg=limit_arg_cache)
+        news_query = crud.query_news(db=db, pubdate=date_arg_cache, source=dropdown_choices)
+        page = crud.get_news_page(query=news_query, page_size=limit_arg_cache, after=after, before=before)
     except exception_handler.NewsNotFound:
         raise HTTPException(status_code=404,
                             detail=f"No news found published on {date_arg_cache} from {dropdown_choices}")
+    except exception_handler.NotValidCursor:
+        raise HTTPException(status_code=418, detail="Not valid page cursor")
 
-    if not list(news_list):
+    if not page["news_list"]:
         raise HTTPException(status_code=404,
                             detail=f"No news found published on {date_arg_cache} from {dropdown_choices}")
     # Render the output
-    return templates.TemplateResponse('get_news_from_db.html', {"request": request,
-                                                                "news_list": news_list})
+    return cache_page(request=request,
+                      page_key=page_key,
+                      tags={news_tag(source=dropdown_choices, pubdate=date_arg_cache)},
+                      response=render_news_page(request=request,
+                                                page=page,
+                                                page_action="/read-cache",
+                                                page_params=page_params,
+                                                page_method="post"))
 
 
-@app.get("/read-cache", response_model=List[schemas.News])
-def read_news_from_cache(
+@app.get("/read-cache", response_model=schemas.NewsPage)
+def read_news_from_cache(request: Request,
                          rss_source_url: Optional[str] = None,
                          limit_arg: Optional[int] = None,
                          date_arg: Optional[str] = None,
+                         date_from: Optional[str] = None,
+                         date_to: Optional[str] = None,
+                         after: Optional[str] = None,
+                         before: Optional[str] = None,
                          db: Session = Depends(services.get_db)):
-    # Validate limit argument
+    # Pages are served from response cache until news of the source or the date change
+    page_key = ResponseCache.key("GET /read-cache", rss_source_url=rss_source_url, limit_arg=limit_arg,
+                                 date_arg=date_arg, date_from=date_from, date_to=date_to, after=after, before=before)
+    cached_response = cached_page(request=request, page_key=page_key)
+    if cached_response is not None:
+        return cached_response
+    # Validate limit argument, it is a number of news on a page
     if limit_arg is not None:
         try:
             validator.validate_limit_arg(value=limit_arg)
             limit_arg = int(limit_arg)
         except Exception:
             raise HTTPException(status_code=418, detail="Not valid limit argument. Should be an integer <= 0")
-    # Get data from the database
+    # Validate date range arguments
     try:
-        news_list_from_db = crud.get_news_by_date_source(db=db,
-                                                         pubdate=date_arg,
-                                                         source=rss_source_url,
-                                                         limit_arg=limit_arg)
+        range_start, range_end = validator.validate_date_range(date_from=date_from, date_to=date_to)
+    except exception_handler.NotValidDateArg:
+        raise HTTPException(status_code=418, detail="Not valid date range argument. Should be YYYYMMDD date")
+    # Get a page of data from the database, news within date range are ordered by publication date
+    try:
+        news_query = crud.query_news(db=db,
+                                     pubdate=date_arg,
+                                     source=rss_source_url,
+                                     date_from=range_start,
+                                     date_to=range_end)
+        page = crud.get_news_page(query=news_query,
+                                  order=crud.ORDER_BY_PUBDATE if range_start or range_end else crud.ORDER_BY_ID,
+                                  page_size=limit_arg,
+                                  after=after,
+                                  before=before)
     except exception_handler.NewsNotFound:
         raise HTTPException(status_code=404, detail=f"No news found published on {date_arg} from {rss_source_url}")
-    if not list(news_list_from_db):
+    except exception_handler.NotValidCursor:
+        raise HTTPException(status_code=418, detail="Not valid page cursor")
+    if not page["news_list"]:
         raise HTTPException(status_code=404, detail=f"No news found published on {date_arg} from {rss_source_url}")
+    # Page is serialized once, cached page is sent as it is
+    return cache_page(request=request,
+                      page_key=page_key,
+                      tags={news_tag(source=rss_source_url, pubdate=date_arg)},
+                      response=Response(content=schemas.NewsPage(**page).json(), media_type="application/json"))
+
+
+def iter_news_json_lines(db: Session, news_query: Query, limit_arg: Optional[int] = None) -> Iterator[str]:
+    """
+    Streams news of the query as JSON Lines and closes the session when streaming is over
+    :param db: sqlalchemy session the query is bound to
+    :param news_query: news query
+    :param limit_arg: limit number of news
+    :return: iterator over JSON lines
+    """
+    try:
+        news_rows = crud.iter_news_with_source_url(query=news_query, limit_arg=limit_arg)
+        yield from converter.Converter.iter_json_lines(news_rows)
+    finally:
+        db.close()
+
+
+@app.get("/read-cache/json-lines")
+def stream_news_from_cache(rss_source_url: Optional[str] = None,
+                           limit_arg: Optional[int] = None,
+                           date_arg: Optional[str] = None,
+                           date_from: Optional[str] = None,
+                           date_to: Optional[str] = None):
+    # Validate limit and date range arguments
+    if limit_arg is not None:
+        try:
+            validator.validate_limit_arg(value=limit_arg)
+        except exception_handler.NotValidLimitArg:
+            raise HTTPException(status_code=418, detail="Not valid limit argument. Should be an integer <= 0")
+    try:
+        range_start, range_end = validator.validate_date_range(date_from=date_from, date_to=date_to)
+    except exception_handler.NotValidDateArg:
+        raise HTTPException(status_code=418, detail="Not valid date range argument. Should be YYYYMMDD date")
+    # Session lives as long as the response is streamed, so it is not taken from the request dependency
+    db = database.SessionLocal()
+    try:
+        news_query = crud.query_news(db=db,
+                                     pubdate=date_arg,
+                                     source=rss_source_url,
+                                     date_from=range_start,
+                                     date_to=range_end)
+    except exception_handler.NewsNotFound:
+        db.close()
+        raise HTTPException(status_code=404, detail=f"No news found from {rss_source_url}")
+    # News are converted and sent one by one, newest first
+    return StreamingResponse(iter_news_json_lines(db=db, news_query=news_query, limit_arg=limit_arg),
+                             media_type="application/x-ndjson")
+
+
+@app.get("/search", response_model=List[schemas.News])
+def search_news_in_cache(q: str,
+                         rss_source_url: Optional[str] = None,
+                         limit_arg: Optional[int] = None,
+                         offset: int = 0,
+                         db: Session = Depends(services.get_db)):
+    # Validate limit and offset arguments
+    if limit_arg is not None:
+        try:
+            validator.validate_limit_arg(value=limit_arg)
+        except exception_handler.NotValidLimitArg:
+            raise HTTPException(status_code=418, detail="Not valid limit argument. Should be an integer <= 0")
+    if offset < 0:
+        raise HTTPException(status_code=418, detail="Not valid offset argument. Should be an integer >= 0")
+    # Search news by words in titles and descriptions, best matches first
+    try:
+        news_list_from_db = crud.search_news(db=db,
+                                             search_query=q,
+                                             source=rss_source_url,
+                                             limit_arg=limit_arg,
+                                             offset=offset)
+    except exception_handler.NewsNotFound:
+        raise HTTPException(status_code=404, detail=f"No news found from {rss_source_url}")
+    if not news_list_from_db:
+        raise HTTPException(status_code=404, detail=f"No news matching '{q}' found")
     return news_list_from_db
 
 
 @app.get("/news", response_class=HTMLResponse)
 def get_all_news_from_db(request: Request,
+                         date_from: Optional[str] = None,
+                         date_to: Optional[str] = None,
+                         limit_arg: Optional[int] = None,
+                         after: Optional[str] = None,
+                         before: Optional[str] = None,
                          db: Session = Depends(services.get_db)):
-    news_list = crud.get_all_news(db=db)
-    if not news_list:
+    # Pages are served from response cache until any news change
+    page_key = ResponseCache.key("GET /news", date_from=date_from, date_to=date_to, limit_arg=limit_arg,
+                                 after=after, before=before)
+    cached_response = cached_page(request=request, page_key=page_key)
+    if cached_response is not None:
+        return cached_response
+    # Validate date range arguments
+    try:
+        range_start, range_end = validator.validate_date_range(date_from=date_from, date_to=date_to)
+    except exception_handler.NotValidDateArg:
+        raise HTTPException(status_code=418, detail="Not valid date range argument. Should be YYYYMMDD date")
+    # Get a page of news, news within date range are ordered by publication date
+    try:
+        news_query = crud.query_news(db=db, date_from=range_start, date_to=range_end)
+        page = crud.get_news_page(query=news_query,
+                                  order=crud.ORDER_BY_PUBDATE if range_start or range_end else crud.ORDER_BY_ID,
+                                  page_size=limit_arg,
+                                  after=after,
+                                  before=before)
+    except exception_handler.NotValidCursor:
+        raise HTTPException(status_code=418, detail="Not valid page cursor")
+    if not page["news_list"]:
         raise HTTPException(status_code=404, detail="News not found in the database")
-    return templates.TemplateResponse('get_news_from_db.html', {"request": request,
-                                                                "news_list": news_list})
+    return cache_page(request=request,
+                      page_key=page_key,
+                      tags={news_tag()},
+                      response=render_news_page(request=request,
+                                                page=page,
+                                                page_action="/news",
+                                                page_params={"date_from": date_from,
+                                                             "date_to": date_to,
+                                                             "limit_arg": limit_arg}))
 
 
 @app.get("/news/{pubdate}", response_class=HTMLResponse)
 def read_news_from_cache_by_date(request: Request,
                                  pubdate: str,
+                                 limit_arg: Optional[int] = None,
+                                 after: Optional[str] = None,
+                                 before: Optional[str] = None,
                                  db: Session = Depends(services.get_db)):
-    # Get news from database for exact published date
-    news_list = crud.get_news_by_date(db=db, pubdate=pubdate)
-    if not list(news_list):
+    # Pages are served from response cache until news published on the date change
+    page_key = ResponseCache.key(f"GET /news/{pubdate}", limit_arg=limit_arg, after=after, before=before)
+    cached_response = cached_page(request=request, page_key=page_key)
+    if cached_response is not None:
+        return cached_response
+    # Get a page of news from database for exact published date
+    try:
+        page = crud.get_news_page(query=crud.query_news(db=db, pubdate=pubdate),
+                                  page_size=limit_arg,
+                                  after=after,
+                                  before=before)
+    except exception_handler.NotValidCursor:
+        raise HTTPException(status_code=418, detail="Not valid page cursor")
+    if not page["news_list"]:
         raise HTTPException(status_code=404, detail=f"No news found published on {pubdate}")
-    return templates.TemplateResponse('get_news_from_db.html', {"request": request,
-                                                                "news_list": news_list})
+    return cache_page(request=request,
+                      page_key=page_key,
+                      tags={news_tag(pubdate=pubdate)},
+                      response=render_news_page(request=request,
+                                                page=page,
+                                                page_action=f"/news/{pubdate}",
+                                                page_params={"limit_arg": limit_arg}))
 
 
 @app.post("/news/delete/{news_id}")
-def delete_news_from_db(request: Request,
-                        news_id: int,
+def delete_news_from_db(news_id: int,
                         db: Session = Depends(services.get_db)):
     # Delete news from db by news id
     crud.delete_news_by_id(db=db, news_id=news_id)
-    # Get all news from db after delete operation
-    news_list = crud.get_all_news(db=db)
-    # Return html with updated news_list from db
-    return templates.TemplateResponse('get_news_from_db.html', {"request": request,
-                                                                "news_list": news_list})
+    # Redirect to the first page of news left in db
+    return RedirectResponse(url="/news", status_code=303)
 
 
-@app.get("/rss", response_model=List[schemas.Rss])
-def get_all_rss_sources_from_db(db: Session = Depends(services.get_db)):
-    # Get list of Rss entries from the database according to schema
-    all_rss_in_db = crud.get_all_rss_sources(db=db)
-    if not list(all_rss_in_db):
+@app.get("/rss", response_model=Union[List[schemas.Rss], List[schemas.RssCount]])
+def get_all_rss_sources_from_db(with_news: bool = True,
+                                db: Session = Depends(services.get_db)):
+    # Get list of Rss entries from the database according to schema, with all related news
+    # or only with number of them. Read-only listing is returned without pydantic validation
+    if with_news:
+        all_rss_in_db = crud.get_rss_sources_with_news(db=db)
+    else:
+        all_rss_in_db = crud.get_rss_sources_with_counts(db=db)
+    if not all_rss_in_db:
         raise HTTPException(status_code=404, detail="Rss sources not found in the database")
     # Return json response
-    return all_rss_in_db
+    return responses.LeanJSONResponse(content=all_rss_in_db)
 
 
 @app.post("/rss/create/", status_code=201)
@@ -278,3 +545,66 @@ def delete_rss_source(rss_source_id: int,
         return {"message": f"Rss source with id {rss_source_id} deleted from the database with all related news"}
     else:
         raise HTTPException(status_code=404, detail=f"Rss source with id {rss_source_id} not found")
+
+
+@app.get("/poller/status", response_model=schemas.PollerStatus)
+def get_poller_status():
+    return {"running": scheduler.feed_poller.is_running,
+            "polling": scheduler.feed_poller.is_polling,
+            "error": scheduler.feed_poller.error,
+            "feeds": scheduler.feed_poller.status()}
+
+
+@app.get("/jobs/{job_id}", response_model=schemas.ConversionJob)
+def get_conversion_job(job_id: str,
+                       db: Session = Depends(services.get_db)):
+    job = crud.get_conversion_job(db=db, job_id=job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Conversion job {job_id} not found")
+    # Queued jobs report their place in the queue, done jobs a link to the converted file
+    return {"id": job.id,
+            "file_format": job.file_format,
+            "filename": job.filename,
+            "status": job.status,
+            "queue_position": crud.get_conversion_job_position(db=db, job=job),
+            "error": job.error,
+            "created_at": job.created_at,
+            "started_at": job.started_at,
+            "finished_at": job.finished_at,
+            "download_url": app.url_path_for("download_converted_file", job_id=job.id)
+            if job.status == crud.JOB_DONE else None}
+
+
+@app.get("/jobs/{job_id}/download")
+def download_converted_file(request: Request,
+                            job_id: str,
+                            db: Session = Depends(services.get_db)):
+    job = crud.get_conversion_job(db=db, job_id=job_id)
+    if job is None or job.status != crud.JOB_DONE or not os.path.isfile(job.target_path):
+        raise HTTPException(status_code=404, detail=f"Converted file of job {job_id} not found")
+    # Converted file is addressed by its cache key, so the key is a strong entity tag
+    return responses.file_download_response(request=request,
+                                            path=job.target_path,
+                                            filename=job.filename,
+                                            etag=job.artifact_key or job.id)
+
+
+@app.get("/images/{image_key}/{variant}")
+def get_cached_image(request: Request, image_key: str, variant: str):
+    # Image variants and original images are served, original image is sent if the variant wasn't made
+    location = ImageStore().locate(image_key) if variant in IMAGE_VARIANTS or variant == "original" else None
+    if location is None:
+        raise HTTPException(status_code=404, detail=f"Image {image_key} not found")
+    image_file = location if variant == "original" else image_variant(location, variant)
+    try:
+        image_stat = os.stat(image_file)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Image {image_key} not found")
+    # Image file is replaced, not changed in place, so its size and modification time make a strong entity tag
+    image_etag = f"{image_key}-{variant}-{image_stat.st_size:x}-{image_stat.st_mtime_ns:x}"
+    return responses.file_download_response(request=request,
+                                            path=image_file,
+                                            filename=os.path.basename(image_file),
+                                            etag=image_etag,
+                                            cache_control=IMAGE_CACHE_CONTROL,
+                                            inline=True)
@@ -1,9 +1,13 @@
 """Module declares sqlalchemy models"""
-from sqlalchemy import Column, ForeignKey, Integer, String
+from sqlalchemy import Column, Computed, DateTime, ForeignKey, Index, Integer, LargeBinary, String, Text
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import relationship
 
 from database import Base
 
+# Full-text search document of a news, built from its title and description
+SEARCH_VECTOR_EXPRESSION = "to_tsvector('english', coalesce(title, '') || ' ' || coalesce(description, ''))"
+
 
 class Rss(Base):
     """
@@ -11,8 +15,9 @@ class Rss(Base):
     """
     __tablename__ = "rss_book"
     id = Column(Integer, primary_key=True, index=True)
-    rss_url = Column(String)
+    rss_url = Column(String, unique=True, index=True)
     rss_header = Column(String)
+    dialect = Column(String)
 
     news_list = relationship("News", back_populates="rss", cascade="all, delete-orphan")
 
@@ -25,12 +30,61 @@ class News(Base):
     id = Column(Integer, primary_key=True, index=True)
     rss_source = Column(Integer, ForeignKey("rss_book.id"))
     rss_header = Column(String)
-    title = Column(String)
+    title = Column(String, unique=True, index=True)
     description = Column(String)
     pubdate = Column(String)
     pubdate_format = Column(String)
     news_link = Column(String)
     news_img_link = Column(String)
     news_img_location = Column(String)
+    pubdate_ts = Column(DateTime(timezone=True), index=True)
+    search_vector = Column(TSVECTOR, Computed(SEARCH_VECTOR_EXPRESSION, persisted=True))
 
     rss = relationship("Rss", back_populates='news_list')
+
+    __table_args__ = (Index("ix_news_rss_source_pubdate_ts", "rss_source", "pubdate_ts"),
+                      Index("ix_news_search_vector", "search_vector", postgresql_using="gin"),
+                      Index("ix_news_pubdate_ts_id", "pubdate_ts", "id"),
+                      Index("ix_news_rss_source_id", "rss_source", "id"))
+
+
+class HttpCache(Base):
+    """
+    Class to define rss source HTTP cache model
+    """
+    __tablename__ = "http_cache"
+    id = Column(Integer, primary_key=True, index=True)
+    rss_url = Column(String, unique=True, index=True)
+    etag = Column(String)
+    last_modified = Column(String)
+    body = Column(LargeBinary)
+    news = Column(Text)
+    news_limit = Column(Integer)
+
+
+class ConversionJob(Base):
+    """
+    Class to define news conversion job model, table is used as a persistent job queue
+    """
+    __tablename__ = "conversion_jobs"
+    id = Column(String, primary_key=True)
+    file_format = Column(String)
+    filename = Column(String)
+    target_path = Column(String)
+    news = Column(Text)
+    status = Column(String, index=True)
+    error = Column(String)
+    artifact_key = Column(String)
+    created_at = Column(DateTime(timezone=True), index=True)
+    started_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
+    claimed_by = Column(String)
+    heartbeat_at = Column(DateTime(timezone=True))
+
+
+class SchemaVersion(Base):
+    """
+    Class to define database schema version model, the only row keeps the number of applied upgrade statements
+    """
+    __tablename__ = "schema_version"
+    version = Column(Integer, primary_key=True)
@@ -1,89 +1,627 @@
 """
 Module is used for image caching from parsed image links
 """
+import asyncio
+import hashlib
+import multiprocessing
 import os
-from concurrent.futures import ThreadPoolExecutor
-from typing import Iterable, NoReturn
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import closing
+from typing import Dict, Iterable, List, NoReturn, Optional, Tuple
+from urllib.parse import urlsplit
 
-import requests
-from PIL import Image
+import httpx
+from PIL import Image, features
+from starlette.concurrency import run_in_threadpool
 
+from errors import exception_handler
 
-class ImageHandler:
+# Format of image variants shown in browsers, JPEG is used if Pillow is built without WebP support
+WEB_IMAGE_FORMAT: str = 'WEBP' if features.check('webp') else 'JPEG'
+# Variants made of every stored image, maximum width and format of each variant.
+# Thumbnail is shown in news lists, article image in HTML files, document image in PDF and EPUB files
+IMAGE_VARIANTS: Dict[str, Tuple[int, str]] = {'thumbnail': (96, WEB_IMAGE_FORMAT),
+                                              'article': (250, WEB_IMAGE_FORMAT),
+                                              'document': (500, 'JPEG')}
+# Version of image variants, variants of images stored with an older version are made again
+VARIANTS_VERSION: int = 1
+# Variant file extensions and save options of variant formats
+VARIANT_EXTENSIONS: Dict[str, str] = {'JPEG': '.jpg', 'WEBP': '.webp'}
+VARIANT_SAVE_OPTIONS: Dict[str, dict] = {'JPEG': {'quality': 80, 'optimize': True},
+                                         'WEBP': {'quality': 80, 'method': 4}}
+# Number of processes resizing images
+IMAGE_WORKERS: int = min(4, os.cpu_count() or 1)
+# Size of image chunks read from response, in bytes
+IMAGE_CHUNK_SIZE: int = 64 * 1024
+# Images larger than that are not downloaded, in bytes
+MAX_IMAGE_BYTES: int = 5 * 1024 * 1024
+# Images with more pixels than that are not decoded and stored
+MAX_IMAGE_PIXELS: int = 40 * 1000 * 1000
+# Stored images are revalidated with conditional requests after that time, in seconds
+IMAGE_TTL: int = 24 * 60 * 60
+
+_image_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_image_pool() -> ProcessPoolExecutor:
     """
-        Class for handling operations with image caching and image processing
+    Returns shared pool of processes resizing images, creates it on the first call.
+    Processes are spawned, not forked, so they don't inherit threads and connections of the parent process
+    :return: process pool executor
+    """
+    global _image_pool
+    if _image_pool is None:
+        _image_pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+    return _image_pool
+
+
+def resize_in_pool(image_file: str, location: str) -> Tuple[int, int]:
+    """
+    Runs 'prepare_image' in image pool process. If a pool process died, pool can't be used anymore,
+    so variants are made in the calling thread and a new pool is created next time
+    :param image_file: downloaded image file path
+    :param location: stored image location variants are named after
+    :return: image width and height
+    :raise exception_handler.ImageRejected: if image can't be decoded or has too many pixels
+    """
+    global _image_pool
+    try:
+        return get_image_pool().submit(prepare_image, image_file, location).result()
+    except BrokenProcessPool:
+        _image_pool = None
+        return prepare_image(image_file, location)
+
+
+def variant_location(location: str, variant: str) -> str:
+    """
+    Returns location of an image variant, variants are stored next to the original image
+    :param location: stored image location
+    :param variant: variant name, one of IMAGE_VARIANTS
+    :return: image variant file path
+    """
+    return f"{os.path.splitext(location)[0]}.{variant}{VARIANT_EXTENSIONS[IMAGE_VARIANTS[variant][1]]}"
+
+
+def image_variant(location: str, variant: str) -> str:
+    """
+    Picks a variant of stored image, original image is used if the variant wasn't made
+    :param location: stored image location or 'Empty'
+    :param variant: variant name, one of IMAGE_VARIANTS
+    :return: image variant file path, stored image location or 'Empty'
+    """
+    if location == 'Empty':
+        return location
+    variant_file = variant_location(location, variant)
+    return variant_file if os.path.isfile(variant_file) else location
+
+
+def has_transparency(image: Image.Image) -> bool:
+    """
+    Checks whether an image has transparent pixels information
+    :param image: opened image
+    :return: True if image has alpha channel or transparent palette color
+    """
+    return image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+
+
+def variant_image(image: Image.Image, image_format: str) -> Image.Image:
+    """
+    Converts an image into a mode variant format supports, transparent images saved as JPEG get white background
+    :param image: resized image
+    :param image_format: 'JPEG' or 'WEBP'
+    :return: converted image
+    """
+    if not has_transparency(image):
+        return image if image.mode == 'RGB' else image.convert('RGB')
+    image = image.convert('RGBA')
+    if image_format != 'JPEG':
+        return image
+    background = Image.new('RGB', image.size, 'white')
+    background.paste(image, mask=image.getchannel('A'))
+    return background
+
+
+def prepare_image(image_file: str, location: str) -> Tuple[int, int]:
+    """
+    Makes variants of an image, runs in image pool process. Original image is kept as it is.
+    Image is decoded once, at reduced scale by codecs supporting it (JPEG), and variants are made
+    from the largest to the smallest one, each of the previous one
+    :param image_file: downloaded or stored image file path
+    :param location: stored image location variants are named after
+    :return: image width and height
+    :raise exception_handler.ImageRejected: if image has more than MAX_IMAGE_PIXELS pixels or can't be decoded
+    """
+    variant_files = {}
+    try:
+        with Image.open(image_file) as image:
+            # Image header is read only, pixels are not decoded yet
+            width, height = image.size
+            if width * height > MAX_IMAGE_PIXELS:
+                raise exception_handler.ImageRejected(f"Image has more than {MAX_IMAGE_PIXELS} pixels")
+            # Palette and other special modes are resized with nearest neighbour only, so they are converted
+            if image.format not in ('JPEG', 'MPO'):
+                image = image.convert('RGBA' if has_transparency(image) else 'RGB')
+            for variant, (max_width, image_format) in sorted(IMAGE_VARIANTS.items(),
+                                                             key=lambda item: item[1][0], reverse=True):
+                # Thumbnail sets up reduced scale decoding before the image is loaded and keeps aspect ratio
+                image.thumbnail((max_width, image.height), Image.LANCZOS)
+                variant_file = variant_location(location, variant)
+                temporary_file = f"{variant_file}.{uuid.uuid4().hex}.tmp"
+                variant_files[temporary_file] = variant_file
+                variant_image(image, image_format).save(temporary_file, format=image_format,
+                                                        **VARIANT_SAVE_OPTIONS[image_format])
+    except (OSError, ValueError, KeyError, Image.DecompressionBombError) as exc:
+        for temporary_file in variant_files:
+            if os.path.isfile(temporary_file):
+                os.remove(temporary_file)
+        raise exception_handler.ImageRejected(f"Image can't be decoded: {exc}")
+    for temporary_file, variant_file in variant_files.items():
+        os.replace(temporary_file, variant_file)
+    return width, height
+
+
+class ImageStore:
+    """
+        Class for storing downloaded images under keys derived from image links.
+        Images are spread over shard folders together with their variants, index database keeps size,
+        dimensions and last access time of every image and least recently used images are evicted
+        when store exceeds its size limit.
+        Store could be used by several processes at the same time
     """
 
     CACHED_IMAGES_LOCATION: str = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'cached_images')
+    INDEX_FILE: str = 'index.db'
+    # Version of index database schema, stored in 'user_version' pragma
+    SCHEMA_VERSION: int = 3
+    # Maximum total size of stored images, in bytes
+    MAX_STORE_SIZE: int = 512 * 1024 * 1024
+    # Extensions kept from image links, images with other links are stored as '.png'
+    IMAGE_EXTENSIONS: tuple = ('.gif', '.jpeg', '.jpg', '.png', '.webp')
+    # Maximum number of image links looked up with one query
+    LOOKUP_BATCH_SIZE: int = 500
+
+    def __init__(self, location: str = CACHED_IMAGES_LOCATION, max_size: int = MAX_STORE_SIZE) -> None:
+        """
+        ImageStore class initializing
+        :param location: folder images and index database are stored in
+        :param max_size: maximum total size of stored images, in bytes
+        """
+        self.location = location
+        self.max_size = max_size
+
+    @staticmethod
+    def image_key(img_link: str) -> str:
+        """
+        Calculates key of an image
+        :param img_link: image link
+        :return: sha256 hex digest of image link
+        """
+        return hashlib.sha256(img_link.encode('utf-8')).hexdigest()
+
+    def image_location(self, img_link: str) -> str:
+        """
+        Returns location of an image, images are sharded into folders by the first two characters of their key
+        :param img_link: image link
+        :return: image file path
+        """
+        image_key = self.image_key(img_link)
+        extension = os.path.splitext(urlsplit(img_link).path)[1].lower()
+        if extension not in self.IMAGE_EXTENSIONS:
+            extension = '.png'
+        return os.path.join(self.location, image_key[:2], f"{image_key}{extension}")
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Connects to index database, creates it if it doesn't exist.
+        Index is used in WAL mode, so readers are not blocked by other processes writing into it
+        :return: index database connection
+        """
+        os.makedirs(self.location, exist_ok=True)
+        connection = sqlite3.connect(os.path.join(self.location, self.INDEX_FILE), timeout=30)
+        connection.execute("PRAGMA journal_mode=WAL")
+        if connection.execute("PRAGMA user_version").fetchone()[0] < self.SCHEMA_VERSION:
+            self._upgrade_index(connection)
+        return connection
+
+    def _upgrade_index(self, connection: sqlite3.Connection) -> None:
+        """
+        Creates or upgrades index database tables. Index is locked while upgrading,
+        so it is upgraded by one process only
+        :param connection: index database connection
+        :return: None
+        """
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            schema_version = connection.execute("PRAGMA user_version").fetchone()[0]
+            if schema_version >= self.SCHEMA_VERSION:
+                return
+            connection.execute("CREATE TABLE IF NOT EXISTS images (image_key text PRIMARY KEY, location text NOT NULL, "
+                               "size integer NOT NULL, last_access real NOT NULL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS ix_images_last_access ON images (last_access)")
+            columns = [row[1] for row in connection.execute("PRAGMA table_info(images)")]
+            # Image dimensions, response validators and version of image variants, images stored
+            # before they were added get their variants made and are revalidated with unconditional request
+            for column, column_type in (('width', 'integer'), ('height', 'integer'),
+                                        ('etag', 'text'), ('last_modified', 'text'), ('fetched_at', 'real'),
+                                        ('variants', 'integer')):
+                if column not in columns:
+                    connection.execute(f"ALTER TABLE images ADD COLUMN {column} {column_type}")
+            connection.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+
+    @staticmethod
+    def image_files(location: str) -> List[str]:
+        """
+        Lists files of a stored image
+        :param location: stored image location
+        :return: stored image location followed by its variant locations
+        """
+        return [location] + [variant_location(location, variant) for variant in IMAGE_VARIANTS]
+
+    def image_size(self, location: str) -> int:
+        """
+        Calculates total size of stored image and its variants
+        :param location: stored image location
+        :return: size in bytes
+        """
+        return sum(os.path.getsize(image_file) for image_file in self.image_files(location)
+                   if os.path.isfile(image_file))
+
+    def temporary_location(self, img_link: str) -> str:
+        """
+        Returns unique temporary location of an image next to its store location. Images are written
+        under a temporary name and renamed then, so other processes never read a partially written image
+        :param img_link: image link
+        :return: temporary image file path
+        """
+        location = self.image_location(img_link)
+        os.makedirs(os.path.dirname(location), exist_ok=True)
+        return f"{location}.{uuid.uuid4().hex}.tmp"
+
+    def lookup(self, img_links: Iterable[str]) -> Dict[str, str]:
+        """
+        Looks images up in the store and marks found images as recently used.
+        Index entries of images removed from the disk are dropped
+        :param img_links: image links
+        :return: dictionary with stored image locations under image links
+        """
+        keys = {self.image_key(img_link): img_link for img_link in img_links}
+        locations = {}
+        with closing(self._connect()) as connection, connection:
+            key_list = list(keys)
+            for batch_start in range(0, len(key_list), self.LOOKUP_BATCH_SIZE):
+                batch = key_list[batch_start:batch_start + self.LOOKUP_BATCH_SIZE]
+                rows = connection.execute(f"SELECT image_key, location FROM images "
+                                          f"WHERE image_key IN ({', '.join('?' * len(batch))})", batch)
+                for image_key, location in rows.fetchall():
+                    if os.path.isfile(location):
+                        locations[keys[image_key]] = location
+                    else:
+                        connection.execute("DELETE FROM images WHERE image_key = ?", (image_key,))
+            now = time.time()
+            connection.executemany("UPDATE images SET last_access = ? WHERE image_key = ?",
+                                   [(now, self.image_key(img_link)) for img_link in locations])
+        return locations
+
+    def locate(self, image_key: str) -> Optional[str]:
+        """
+        Finds stored image by its key, used to serve stored images
+        :param image_key: image key, see 'image_key'
+        :return: stored image location or None if image is not stored
+        """
+        with closing(self._connect()) as connection:
+            row = connection.execute("SELECT location FROM images WHERE image_key = ?", (image_key,)).fetchone()
+        if row is None or not os.path.isfile(row[0]):
+            return None
+        return row[0]
+
+    def images_without_variants(self, locations: Iterable[str]) -> List[str]:
+        """
+        Finds stored images without variants of the current version, images are not opened
+        :param locations: stored image locations
+        :return: locations of images which need their variants made
+        """
+        keys = {os.path.splitext(os.path.basename(location))[0]: location for location in locations}
+        locations = []
+        with closing(self._connect()) as connection:
+            key_list = list(keys)
+            for batch_start in range(0, len(key_list), self.LOOKUP_BATCH_SIZE):
+                batch = key_list[batch_start:batch_start + self.LOOKUP_BATCH_SIZE]
+                rows = connection.execute(f"SELECT image_key FROM images "
+                                          f"WHERE image_key IN ({', '.join('?' * len(batch))}) "
+                                          f"AND coalesce(variants, 0) < ?", batch + [VARIANTS_VERSION])
+                locations.extend(keys[image_key] for image_key, in rows.fetchall())
+        return locations
+
+    def stale_images(self, img_links: Iterable[str], ttl: float = IMAGE_TTL) -> Dict[str, Tuple[str, str]]:
+        """
+        Finds stored images fetched earlier than time to live ago
+        :param img_links: image links
+        :param ttl: time to live of stored images, in seconds
+        :return: dictionary with image ETag and Last-Modified validators under links of stale images
+        """
+        keys = {self.image_key(img_link): img_link for img_link in img_links}
+        stale_images = {}
+        with closing(self._connect()) as connection:
+            key_list = list(keys)
+            for batch_start in range(0, len(key_list), self.LOOKUP_BATCH_SIZE):
+                batch = key_list[batch_start:batch_start + self.LOOKUP_BATCH_SIZE]
+                rows = connection.execute(f"SELECT image_key, etag, last_modified FROM images "
+                                          f"WHERE image_key IN ({', '.join('?' * len(batch))}) "
+                                          f"AND coalesce(fetched_at, 0) < ?", batch + [time.time() - ttl])
+                for image_key, etag, last_modified in rows.fetchall():
+                    stale_images[keys[image_key]] = (etag, last_modified)
+        return stale_images
+
+    def put(self,
+            img_link: str,
+            image_file: str,
+            width: Optional[int] = None,
+            height: Optional[int] = None,
+            etag: Optional[str] = None,
+            last_modified: Optional[str] = None) -> str:
+        """
+        Stores an image, image file is moved into the store next to its variants made before
+        :param img_link: image link
+        :param image_file: image file path, returned by 'temporary_location'
+        :param width: image width
+        :param height: image height
+        :param etag: image response ETag header
+        :param last_modified: image response Last-Modified header
+        :return: stored image location
+        """
+        location = self.image_location(img_link)
+        os.replace(image_file, location)
+        with closing(self._connect()) as connection, connection:
+            now = time.time()
+            connection.execute("INSERT OR REPLACE INTO images (image_key, location, size, last_access, width, height, "
+                               "etag, last_modified, fetched_at, variants) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                               (self.image_key(img_link), location, self.image_size(location), now, width, height,
+                                etag, last_modified, now, VARIANTS_VERSION))
+        return location
+
+    def revalidate(self, img_link: str) -> str:
+        """
+        Marks stored image as fresh after server confirmed it was not modified
+        :param img_link: image link
+        :return: stored image location
+        """
+        with closing(self._connect()) as connection, connection:
+            connection.execute("UPDATE images SET fetched_at = ? WHERE image_key = ?",
+                               (time.time(), self.image_key(img_link)))
+        return self.image_location(img_link)
+
+    def update_image(self, location: str, width: int, height: int) -> None:
+        """
+        Updates size and dimensions of stored image after its variants were made
+        :param location: stored image location
+        :param width: image width
+        :param height: image height
+        :return: None
+        """
+        with closing(self._connect()) as connection, connection:
+            connection.execute("UPDATE images SET size = ?, width = ?, height = ?, variants = ? WHERE location = ?",
+                               (self.image_size(location), width, height, VARIANTS_VERSION, location))
+
+    def remove(self, location: str) -> None:
+        """
+        Removes stored image with its variants, used for images which turned out not to be images
+        :param location: stored image location
+        :return: None
+        """
+        for image_file in self.image_files(location):
+            try:
+                os.remove(image_file)
+            except FileNotFoundError:
+                pass
+        with closing(self._connect()) as connection, connection:
+            connection.execute("DELETE FROM images WHERE location = ?", (location,))
+
+    def evict(self) -> None:
+        """
+        Removes least recently used images with their variants until total size of stored images fits the limit.
+        Index is locked while images are removed, so evictions of several processes don't overlap
+        :return: None
+        """
+        with closing(self._connect()) as connection, connection:
+            connection.execute("BEGIN IMMEDIATE")
+            store_size = connection.execute("SELECT coalesce(sum(size), 0) FROM images").fetchone()[0]
+            if store_size <= self.max_size:
+                return
+            evicted_keys = []
+            for image_key, location, size in connection.execute(
+                    "SELECT image_key, location, size FROM images ORDER BY last_access").fetchall():
+                if store_size <= self.max_size:
+                    break
+                for image_file in self.image_files(location):
+                    try:
+                        os.remove(image_file)
+                    except FileNotFoundError:
+                        pass
+                evicted_keys.append((image_key,))
+                store_size -= size
+            connection.executemany("DELETE FROM images WHERE image_key = ?", evicted_keys)
+
 
-    def __init__(self, news_list: Iterable[dict]) -> None:
+class ImageHandler:
+    """
+        Class for handling operations with image caching and image processing
+    """
+
+    def __init__(self, news_list: Iterable[dict], image_store: Optional[ImageStore] = None) -> None:
         """
         ImageHandler class initializing with news_list
         :param news_list: list of dicts of parsed news
+        :param image_store: store images are cached in
         """
         self.news_list = news_list
+        self.image_store = image_store or ImageStore()
 
-    @staticmethod
-    def download_image(news: dict) -> None:
+    def _img_links(self) -> List[str]:
         """
-        Function is used for downloading an image
-        and updating news dictionary with cached image file
-        location value
-        :param news: parsed news in dictionary format
+        Collects distinct image links of the news
+        :return: list of image links in news order
+        """
+        return list(dict.fromkeys(news['news_img_link'] for news in self.news_list if news['news_img_link'] != 'Empty'))
+
+    def _set_img_locations(self, locations: Dict[str, str]) -> None:
+        """
+        Updates news with cached image file locations
+        :param locations: dictionary with image locations under image links
         :return: None
         """
-        # Setting a unique filename for each news title, not to download them every time.
-        filename_generator = f"img_{str(news['title'][0:15]).lower().replace(' ', '')}.png"
-        cache_img_location = os.path.join(ImageHandler.CACHED_IMAGES_LOCATION, filename_generator)
-        # If cached image doesn't exist - download it
-        if not os.path.isfile(cache_img_location):
-            if news['news_img_link'] != 'Empty':
-                url_request = requests.get(news['news_img_link'])
-                with open(cache_img_location, 'wb') as file:
-                    file.write(url_request.content)
-                news['news_img_location'] = cache_img_location
-            else:
-                news['news_img_location'] = 'Empty'
-        else:
-            news['news_img_location'] = cache_img_location
+        for news in self.news_list:
+            news['news_img_location'] = locations.get(news['news_img_link'], 'Empty')
 
-    @staticmethod
-    def resize_image(image_location: str) -> None:
+    def store_image(self, img_link: str, downloaded_image: dict) -> Optional[str]:
         """
-        Function is used for an image resizing for
-        further correct placement into html template
+        Function makes variants of downloaded image in image pool process and stores it
+        :param img_link: image link
+        :param downloaded_image: dictionary returned by 'download_image_async'
+        :return: stored image location or None if image is rejected
+        """
+        if downloaded_image['not_modified']:
+            return self.image_store.revalidate(img_link)
+        try:
+            image_size = resize_in_pool(downloaded_image['image_file'], self.image_store.image_location(img_link))
+        except exception_handler.ImageRejected:
+            os.remove(downloaded_image['image_file'])
+            return None
+        return self.image_store.put(img_link, downloaded_image['image_file'], *image_size,
+                                    etag=downloaded_image['etag'],
+                                    last_modified=downloaded_image['last_modified'])
+
+    def resize_image(self, image_location: str) -> bool:
+        """
+        Function is used for making variants of a stored image
+        for further correct placement into templates. Stored images which are rejected are removed from the store
 
         :param image_location: local cache image location
-        :return:None
-        """
-        if image_location != 'Empty':
-            # Setting up max width for HTML template
-            image_width_for_html = 250
-            image = Image.open(image_location)
-            if image.size[0] > 250:
-                # Calculating image size ration
-                width_percent = (image_width_for_html / float(image.size[0]))
-                height_size = int((float(image.size[1]) * float(width_percent)))
-                # Resize and save with same filename
-                img = image.resize((image_width_for_html, height_size), Image.LANCZOS)
-                img.save(image_location)
-
-    def download_images_concurrently(self) -> NoReturn:
+        :return: False if image is rejected
         """
-        Function used as a wrapper for multithreaded
-        downloading of images
+        try:
+            image_size = resize_in_pool(image_location, image_location)
+        except exception_handler.ImageRejected:
+            self.image_store.remove(image_location)
+            return False
+        self.image_store.update_image(image_location, *image_size)
+        return True
+
+    async def download_image_async(self,
+                                   client: httpx.AsyncClient,
+                                   img_link: str,
+                                   etag: Optional[str] = None,
+                                   last_modified: Optional[str] = None) -> Optional[dict]:
+        """
+        Function is used for downloading an image into a temporary file with shared async HTTP client,
+        response is streamed by chunks and written to the file in a thread, so the event loop isn't blocked.
+        Conditional request is sent if validators of stored image are provided.
+        Responses which are not images or larger than MAX_IMAGE_BYTES are rejected
+        :param client: shared async HTTP client
+        :param img_link: image link
+        :param etag: ETag of stored image
+        :param last_modified: Last-Modified of stored image
+        :return: dictionary with 'not_modified', 'image_file', 'etag' and 'last_modified' keys
+        or None if image wasn't downloaded
+        """
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        image_file = await run_in_threadpool(self.image_store.temporary_location, img_link)
+        try:
+            async with client.stream('GET', img_link, headers=headers) as response:
+                if response.status_code == 304:
+                    return {'not_modified': True, 'image_file': None, 'etag': etag, 'last_modified': last_modified}
+                response.raise_for_status()
+                content_type = response.headers.get('Content-Type', '')
+                if not content_type.startswith('image/'):
+                    raise exception_handler.ImageRejected(f"Content type {content_type} is not an image")
+                if int(response.headers.get('Content-Length') or 0) > MAX_IMAGE_BYTES:
+                    raise exception_handler.ImageRejected(f"Image is larger than {MAX_IMAGE_BYTES} bytes")
+                image_size = 0
+                file = await run_in_threadpool(open, image_file, 'wb')
+                try:
+                    async for chunk in response.aiter_bytes(IMAGE_CHUNK_SIZE):
+                        image_size += len(chunk)
+                        # Content-Length could be missing or wrong, so size is checked while reading
+                        if image_size > MAX_IMAGE_BYTES:
+                            raise exception_handler.ImageRejected(f"Image is larger than {MAX_IMAGE_BYTES} bytes")
+                        await run_in_threadpool(file.write, chunk)
+                finally:
+                    await run_in_threadpool(file.close)
+        except (httpx.HTTPError, httpx.InvalidURL, exception_handler.ImageRejected):
+            if os.path.isfile(image_file):
+                await run_in_threadpool(os.remove, image_file)
+            return None
+        return {'not_modified': False,
+                'image_file': image_file,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified')}
 
+    async def cache_image_async(self,
+                                client: httpx.AsyncClient,
+                                img_link: str,
+                                validators: Tuple[Optional[str], Optional[str]] = (None, None)) -> Optional[str]:
+        """
+        Function downloads and stores an image, stored image is revalidated if its validators are provided.
+        Image is downloaded on the event loop and resized and stored in a thread waiting for image pool process
+        :param client: shared async HTTP client
+        :param img_link: image link
+        :param validators: ETag and Last-Modified of stored image
+        :return: stored image location or None if image wasn't downloaded
+        """
+        downloaded_image = await self.download_image_async(client, img_link, *validators)
+        if downloaded_image is None:
+            return None
+        return await asyncio.get_running_loop().run_in_executor(None, self.store_image, img_link, downloaded_image)
+
+    async def download_images_async(self, client: httpx.AsyncClient) -> None:
+        """
+        Function downloads images concurrently on the event loop,
+        number of simultaneous connections is limited by the client pool.
+        Every image link is downloaded once, images already in the store are downloaded again
+        only if they changed after time to live passed. Variants of downloaded images are made by image pool processes
+
+        :param client: shared async HTTP client
         :return: None
         """
-        with ThreadPoolExecutor(max_workers=10) as executor:
-            executor.map(self.download_image, self.news_list)
+        loop = asyncio.get_running_loop()
+        img_links = self._img_links()
+        locations = await loop.run_in_executor(None, self.image_store.lookup, img_links)
+        stale_images = await loop.run_in_executor(None, self.image_store.stale_images, locations)
+        fetched_img_links = [img_link for img_link in img_links
+                             if img_link not in locations or img_link in stale_images]
+        # Failed downloads are skipped
+        cached = await asyncio.gather(*[self.cache_image_async(client, img_link,
+                                                               stale_images.get(img_link, (None, None)))
+                                        for img_link in fetched_img_links],
+                                      return_exceptions=True)
+        for img_link, location in zip(fetched_img_links, cached):
+            # Stale image is still used if it couldn't be revalidated
+            if isinstance(location, str):
+                locations[img_link] = location
+        await loop.run_in_executor(None, self.image_store.evict)
+        self._set_img_locations(locations)
 
     def resize_cached_images_concurrently(self) -> NoReturn:
         """
         Function used as a wrapper for multithreaded
-        resizing of images
+        resizing of images. Variants are made when images are downloaded,
+        so only images stored before current variants were introduced are processed here.
+        News lose images which are rejected
 
         :return: None
         """
+        locations = set(news['news_img_location'] for news in self.news_list) - {'Empty'}
+        locations = self.image_store.images_without_variants(locations)
         with ThreadPoolExecutor(max_workers=10) as executor:
-            executor.map(self.resize_image, [news['news_img_location'] for news in self.news_list])
+            rejected = {location for location, resized in zip(locations, executor.map(self.resize_image, locations))
+                        if not resized}
+        for news in self.news_list:
+            if news['news_img_location'] in rejected:
+                news['news_img_location'] = 'Empty'
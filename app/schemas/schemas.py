@@ -1,5 +1,6 @@
 """Module defines pydantic schemas for the database"""
-from typing import List
+from datetime import datetime
+from typing import List, Optional
 
 import pydantic
 
@@ -16,11 +17,19 @@ class News(pydantic.BaseModel):
     news_link: str
     news_img_link: str
     news_img_location: str
+    pubdate_ts: Optional[datetime] = None
 
     class Config:
         orm_mode = True
 
 
+class NewsPage(pydantic.BaseModel):
+    """Class to define page of news schema, cursors are None if there are no more pages"""
+    news_list: List[News] = []
+    next_cursor: Optional[str]
+    prev_cursor: Optional[str]
+
+
 class Rss(pydantic.BaseModel):
     """Class to define Rss source schema"""
     id: int
@@ -30,3 +39,46 @@ class Rss(pydantic.BaseModel):
 
     class Config:
         orm_mode = True
+
+
+class RssCount(pydantic.BaseModel):
+    """Class to define Rss source schema with number of news instead of news"""
+    id: int
+    rss_url: str
+    rss_header: str
+    news_count: int
+
+
+class FeedPollStatus(pydantic.BaseModel):
+    """Class to define background poll status of a rss source"""
+    rss_url: str
+    interval: float
+    next_poll: float
+    last_poll: Optional[float]
+    last_success: Optional[float]
+    last_inserted: int
+    not_modified: bool
+    error: Optional[str]
+    in_progress: bool
+
+
+class PollerStatus(pydantic.BaseModel):
+    """Class to define background feed poller status"""
+    running: bool
+    polling: bool = False
+    error: Optional[str] = None
+    feeds: List[FeedPollStatus] = []
+
+
+class ConversionJob(pydantic.BaseModel):
+    """Class to define news conversion job schema"""
+    id: str
+    file_format: str
+    filename: str
+    status: str
+    queue_position: Optional[int]
+    error: Optional[str]
+    created_at: datetime
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
+    download_url: Optional[str]
@@ -0,0 +1,24 @@
+"""Module defines conversion of news into files, run by worker processes of conversion job queue"""
+import json
+import os
+
+from errors import exception_handler
+from rss_parser.caching.caching_files import ConvertedFileCache
+
+
+def convert_news(file_format: str, target_path: str, news: str) -> str:
+    """
+    Converts news into a file, runs in a worker process.
+    News converted before are copied from converted files cache instead of rendering
+    :param file_format: format news are converted into, 'pdf', 'html' or 'epub'
+    :param target_path: path converted file is saved to
+    :param news: json encoded list of news
+    :return: cache key of converted file
+    """
+    # File left from previous conversion with the same name shouldn't be taken for a result
+    if os.path.isfile(target_path):
+        os.remove(target_path)
+    _, artifact_key = ConvertedFileCache().convert(file_format, target_path, json.loads(news))
+    if not os.path.isfile(target_path):
+        raise exception_handler.ConversionFailed(f"{file_format.upper()} file was not created")
+    return artifact_key
@@ -0,0 +1,33 @@
+"""Module holds shared connection-pooled async HTTP client"""
+from typing import Optional
+
+import httpx
+
+# Timeouts of each request made with the client, in seconds
+REQUEST_TIMEOUT = httpx.Timeout(15.0, connect=5.0)
+# Connection pool limits, kept alive connections are reused for requests to the same host
+POOL_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=30.0)
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Returns shared async HTTP client, creates it on the first call
+    :return: async HTTP client
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(timeout=REQUEST_TIMEOUT, limits=POOL_LIMITS, follow_redirects=True)
+    return _client
+
+
+async def close_http_client() -> None:
+    """
+    Closes shared async HTTP client and all pooled connections
+    :return: None
+    """
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
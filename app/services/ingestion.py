@@ -0,0 +1,126 @@
+"""Module combines rss feed ingestion steps: fetching, parsing, storing news and prefetching images"""
+import asyncio
+import os
+from typing import List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from crud import crud
+from rss_parser.caching.caching_images import ImageHandler
+from rss_parser.news_parser import news_parser
+from services import http_client, services
+
+# Images of news read with '/read-rss' form are downloaded in background after news are stored if enabled
+# with environment variable, otherwise they are downloaded by conversion jobs. Feed poller always prefetches them
+PREFETCH_IMAGES: bool = os.environ.get('RSS_PREFETCH_IMAGES', '0') == '1'
+# Running image prefetch tasks, references are kept until tasks are done
+_prefetch_tasks: Set[asyncio.Task] = set()
+
+
+async def fetch_feed(db: Session, rss_url: str) -> news_parser.FeedDocument:
+    """
+    Fetches rss feed once with shared async HTTP client. Conditional request is sent
+    if the feed is in HTTP cache, stored feed dialect is passed for known rss sources
+    :param db: sqlalchemy session object
+    :param rss_url: rss source url
+    :return: fetched feed document
+    """
+    cache_entry = await run_in_threadpool(crud.get_http_cache_entry, db=db, rss_url=rss_url)
+    rss_entry = await run_in_threadpool(crud.get_rss_source_by_url, db=db, rss_url=rss_url)
+    return await news_parser.FeedDocument.fetch_async(client=http_client.get_http_client(),
+                                                      url=rss_url,
+                                                      cache_entry=cache_entry,
+                                                      dialect=rss_entry.dialect if rss_entry else None)
+
+
+def store_news(db: Session,
+               feed: news_parser.FeedDocument,
+               news_list: List[dict],
+               limit_arg: Optional[int] = None) -> int:
+    """
+    Stores parsed news of the rss source in the database together with
+    rss source entry, detected feed dialect and HTTP cache entry
+    :param db: sqlalchemy session object
+    :param feed: fetched feed document
+    :param news_list: news parsed from the feed
+    :param limit_arg: limit argument news were parsed with
+    :return: number of news inserted into the database
+    """
+    news_rows = []
+    for news in news_list:
+        news['pubdate_format'] = services.format_pubdate(news['pubdate'])
+        news_rows.append(dict(news, pubdate_ts=services.parse_pubdate(news['pubdate'])))
+    # Rss source entry, feed dialect and news are stored with one transaction
+    inserted_count = crud.bulk_create_news(db=db,
+                                           rss_url=feed.url,
+                                           rss_header=news_parser.get_rss_header(feed=feed),
+                                           news_list=news_rows,
+                                           dialect=feed.dialect)
+
+    # Store the response and parsed news in HTTP cache for conditional requests
+    crud.update_http_cache_entry(db=db, feed=feed, news_list=news_list, limit_arg=limit_arg)
+    return inserted_count
+
+
+async def cache_news_images(news_list: List[dict]) -> None:
+    """
+    Downloads images of the news and saves them under 'rss_parser/caching/cached_images' folder,
+    news are updated with cached image locations
+    :param news_list: parsed news
+    :return: None
+    """
+    cache_images = ImageHandler(news_list)
+    await cache_images.download_images_async(client=http_client.get_http_client())
+    await run_in_threadpool(cache_images.resize_cached_images_concurrently)
+
+
+def prefetch_news_images(news_list: List[dict]) -> None:
+    """
+    Schedules downloading of news images in background, news are copied,
+    so news returned to the caller are not changed afterwards
+    :param news_list: parsed news
+    :return: None
+    """
+    prefetch_task = asyncio.create_task(cache_news_images([dict(news) for news in news_list]))
+    _prefetch_tasks.add(prefetch_task)
+    prefetch_task.add_done_callback(_prefetch_tasks.discard)
+
+
+async def cancel_image_prefetch() -> None:
+    """
+    Cancels running image prefetch tasks
+    :return: None
+    """
+    tasks = list(_prefetch_tasks)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def ingest_feed(db: Session,
+                      feed: news_parser.FeedDocument,
+                      limit_arg: Optional[int] = None,
+                      prefetch_images: bool = PREFETCH_IMAGES) -> Tuple[List[dict], int]:
+    """
+    Parses fetched rss feed and stores news in the database.
+    Images are not downloaded within ingestion, they are needed by converters only.
+    CPU-heavy parsing and blocking database calls are offloaded
+    to the threadpool, so the event loop stays responsive
+    :param db: sqlalchemy session object
+    :param feed: fetched and validated feed document
+    :param limit_arg: number of news to parse
+    :param prefetch_images: download news images in background after news are stored
+    :return: list of parsed news and number of news inserted into the database
+    """
+    # Parse news, cached parse result is reused if the feed was not modified
+    parsed_news_list = await run_in_threadpool(news_parser.parse_rss_feed, feed=feed, limit_arg=limit_arg)
+
+    inserted_count = await run_in_threadpool(store_news,
+                                             db=db,
+                                             feed=feed,
+                                             news_list=parsed_news_list,
+                                             limit_arg=limit_arg)
+    if prefetch_images:
+        prefetch_news_images(parsed_news_list)
+    return parsed_news_list, inserted_count
@@ -0,0 +1,242 @@
+"""Module defines conversion job queue rendering news into files with a pool of worker processes"""
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import socket
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+import database
+from crud import crud
+from services import ingestion
+from services.conversion import convert_news
+
+# Number of worker processes converting news at the same time
+CONVERSION_WORKERS: int = max(1, int(os.environ.get('RSS_CONVERSION_WORKERS', '2')))
+# How often the queue is checked for jobs submitted by other application instances
+# and leases of running jobs are renewed, in seconds
+QUEUE_TICK: float = 5
+# Running job is put back into the queue if its lease wasn't renewed for this time, in seconds
+JOB_LEASE: float = 60
+# Maximum delay before queue loop is retried after a failure, in seconds. It is well below job lease,
+# so leases of running jobs are renewed in time once the database is available again
+MAX_QUEUE_BACKOFF: float = 15
+
+# Module logger setting up
+jobs_logger = logging.getLogger("app.jobs")
+
+
+class ConversionQueue:
+    """
+    Class running conversion jobs stored in 'conversion_jobs' table with a pool of worker processes.
+    Jobs are persisted before they are run, so jobs queued or running when the application
+    stops are run again after the next start. Running jobs are leased by the application instance,
+    jobs whose lease expires are run again by any instance
+    """
+
+    def __init__(self, workers: int = CONVERSION_WORKERS, tick: float = QUEUE_TICK, lease: float = JOB_LEASE) -> None:
+        """
+        ConversionQueue class initializing
+        :param workers: maximum number of jobs run at the same time
+        :param tick: how often the queue is checked without being notified, in seconds
+        :param lease: time running job is leased for without renewal, in seconds
+        """
+        self.workers = workers
+        self.tick = tick
+        self.lease = lease
+        # Host and process id, process restarted with the same id requeues its interrupted jobs right away
+        self.instance_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._job_tasks: Dict[str, asyncio.Task] = {}
+
+    @property
+    def is_running(self) -> bool:
+        """
+        Checks whether queue loop is running
+        :return: True if queue is running
+        """
+        return self._task is not None and not self._task.done()
+
+    def _start_workers(self) -> ProcessPoolExecutor:
+        """
+        Creates pool of worker processes. Processes are spawned, not forked, so they don't inherit
+        threads, HTTP client and database connections of the application process
+        :return: process pool executor
+        """
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+
+    def _requeue_jobs(self, claimed_by: Optional[str] = None) -> None:
+        """
+        Puts jobs whose lease expired back into the queue
+        :param claimed_by: id of application instance whose jobs are requeued regardless of their lease
+        :return: None
+        """
+        db = database.SessionLocal()
+        try:
+            crud.requeue_conversion_jobs(db=db,
+                                         expired_before=datetime.now(timezone.utc) - timedelta(seconds=self.lease),
+                                         claimed_by=claimed_by)
+        finally:
+            db.close()
+
+    def _renew_leases(self, job_ids: List[str]) -> None:
+        """
+        Extends leases of jobs run by the application instance
+        :param job_ids: ids of running jobs
+        :return: None
+        """
+        db = database.SessionLocal()
+        try:
+            crud.renew_conversion_job_leases(db=db, instance_id=self.instance_id, job_ids=job_ids)
+        finally:
+            db.close()
+
+    def _claim_next_job(self) -> Optional[dict]:
+        """
+        Takes the oldest queued job
+        :return: dictionary with job 'id', 'file_format', 'target_path' and 'news' or None if queue is empty
+        """
+        db = database.SessionLocal()
+        try:
+            job = crud.claim_next_conversion_job(db=db, instance_id=self.instance_id)
+            if job is None:
+                return None
+            return {'id': job.id, 'file_format': job.file_format, 'target_path': job.target_path, 'news': job.news}
+        finally:
+            db.close()
+
+    def _finish_job(self, job_id: str, error: Optional[str] = None, artifact_key: Optional[str] = None) -> None:
+        """
+        Stores result of a job
+        :param job_id: conversion job id
+        :param error: error message of failed job
+        :param artifact_key: cache key of converted file
+        :return: None
+        """
+        db = database.SessionLocal()
+        try:
+            crud.finish_conversion_job(db=db,
+                                       job_id=job_id,
+                                       instance_id=self.instance_id,
+                                       error=error,
+                                       artifact_key=artifact_key)
+        finally:
+            db.close()
+
+    @staticmethod
+    async def cache_job_images(news: str) -> str:
+        """
+        Caches images of job news in the application process, images are downloaded with shared
+        async HTTP client and resized by image pool, images already in the store are not downloaded again
+        :param news: json encoded list of news
+        :return: json encoded list of news with cached image locations
+        """
+        news_list = json.loads(news)
+        await ingestion.cache_news_images(news_list)
+        return json.dumps(news_list, default=str)
+
+    async def run_job(self, job: dict) -> None:
+        """
+        Caches images of job news, runs a job in a worker process and stores its result
+        :param job: claimed job dictionary
+        :return: None
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            news = await self.cache_job_images(job['news'])
+            artifact_key = await loop.run_in_executor(self._executor,
+                                                      convert_news, job['file_format'], job['target_path'], news)
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool) and self._executor is not None:
+                # Worker process died, pool can't be used anymore and is replaced
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = self._start_workers()
+            await run_in_threadpool(self._finish_job, job['id'], f"{type(e).__name__}: {e}")
+        else:
+            await run_in_threadpool(self._finish_job, job['id'], None, artifact_key)
+        finally:
+            self._wakeup.set()
+
+    async def run(self) -> None:
+        """
+        Queue loop, renews leases of running jobs, requeues jobs with expired leases
+        and claims queued jobs while there are free workers. Failed iteration is logged
+        and the loop is retried after a delay doubling with every failure in a row
+        :return: None
+        """
+        own_jobs_requeued = False
+        backoff = self.tick
+        while True:
+            self._wakeup.clear()
+            try:
+                if not own_jobs_requeued:
+                    # Jobs left by the previous run of this instance are not waited for
+                    await run_in_threadpool(self._requeue_jobs, self.instance_id)
+                    own_jobs_requeued = True
+                await run_in_threadpool(self._renew_leases, list(self._job_tasks))
+                await run_in_threadpool(self._requeue_jobs)
+                while len(self._job_tasks) < self.workers:
+                    job = await run_in_threadpool(self._claim_next_job)
+                    if job is None:
+                        break
+                    job_task = asyncio.create_task(self.run_job(job))
+                    self._job_tasks[job['id']] = job_task
+                    job_task.add_done_callback(lambda _, job_id=job['id']: self._job_tasks.pop(job_id, None))
+            except Exception:
+                jobs_logger.exception(f"Conversion queue iteration failed, retrying in {backoff} seconds")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, MAX_QUEUE_BACKOFF)
+                continue
+            backoff = self.tick
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.tick)
+            except asyncio.TimeoutError:
+                pass
+
+    def notify(self) -> None:
+        """
+        Wakes the queue loop up after a job is submitted
+        :return: None
+        """
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def start(self) -> None:
+        """
+        Starts worker processes and queue loop in the running event loop
+        :return: None
+        """
+        if self.is_running:
+            return
+        self._executor = self._start_workers()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        """
+        Stops queue loop and worker processes. Unfinished jobs are run again after their leases expire,
+        so they are not run twice while worker processes finish them
+        :return: None
+        """
+        tasks = list(self._job_tasks.values())
+        if self._task is not None:
+            tasks.append(self._task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._task = None
+        self._executor = None
+
+
+# Conversion queue instance used by the application
+conversion_queue = ConversionQueue()
@@ -0,0 +1,255 @@
+"""Module defines cache of rendered responses, entries are invalidated by tags when news or rss sources change"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+from typing import Dict, Iterable, Optional, Set, Tuple
+from urllib.parse import urlencode
+
+# Responses are cached unless disabled with environment variable
+RESPONSE_CACHE_ENABLED: bool = os.environ.get('RSS_RESPONSE_CACHE_ENABLED', '1') == '1'
+# Time cached responses are kept for, in seconds. Changed data invalidates responses earlier
+RESPONSE_CACHE_TTL: float = float(os.environ.get('RSS_RESPONSE_CACHE_TTL', '300'))
+# Maximum number of cached responses
+RESPONSE_CACHE_SIZE: int = int(os.environ.get('RSS_RESPONSE_CACHE_SIZE', '256'))
+# Responses are kept in a database file shared by application workers if its path is set,
+# otherwise in memory of each worker
+RESPONSE_CACHE_PATH: Optional[str] = os.environ.get('RSS_RESPONSE_CACHE_PATH') or None
+# Tag of responses showing rss sources list
+RSS_TAG: str = 'rss'
+
+
+def news_tag(source: Optional[str] = None, pubdate: Optional[str] = None) -> str:
+    """
+    Builds tag of responses showing news of rss source published on a date
+    :param source: rss source url, news of all sources if None
+    :param pubdate: news publication date in YYYYMMDD format, news of all dates if None
+    :return: response tag
+    """
+    return f"news:{source or '*'}:{pubdate or '*'}"
+
+
+def news_tags(changes: Iterable[Tuple[str, Optional[str]]]) -> Set[str]:
+    """
+    Builds tags of responses affected by changed news: responses showing news of all sources and dates,
+    of the source, of the publication date and of the source published on the date
+    :param changes: rss source urls and publication dates of changed news
+    :return: response tags
+    """
+    tags = {news_tag()}
+    for source, pubdate in changes:
+        tags.update({news_tag(source=source), news_tag(pubdate=pubdate), news_tag(source=source, pubdate=pubdate)})
+    return tags
+
+
+class MemoryBackend:
+    """
+    Class keeping cached responses in process memory, least recently used responses are dropped
+    when the number of responses exceeds the limit
+    """
+
+    def __init__(self, max_size: int = RESPONSE_CACHE_SIZE) -> None:
+        """
+        MemoryBackend class initializing
+        :param max_size: maximum number of cached responses
+        """
+        self.max_size = max_size
+        self._entries: OrderedDict = OrderedDict()
+        # Responses are read and stored by threadpool threads
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[dict]:
+        """
+        Reads cached response and marks it as recently used
+        :param key: response key
+        :return: cached response dictionary or None if response is not cached or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry['expires_at'] < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, entry: dict) -> None:
+        """
+        Stores response, least recently used responses are dropped if the cache is full
+        :param key: response key
+        :param entry: response dictionary
+        :return: None
+        """
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, tags: Set[str]) -> None:
+        """
+        Drops responses having any of the tags
+        :param tags: response tags
+        :return: None
+        """
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if entry['tags'] & tags]:
+                del self._entries[key]
+
+
+class SQLiteBackend:
+    """
+    Class keeping cached responses in a database file, so application workers share cached responses
+    and their invalidation. Database is used in WAL mode, so readers are not blocked by workers writing into it
+    """
+
+    def __init__(self, path: str, max_size: int = RESPONSE_CACHE_SIZE) -> None:
+        """
+        SQLiteBackend class initializing, database tables are created if they don't exist
+        :param path: database file path
+        :param max_size: maximum number of cached responses
+        """
+        self.path = path
+        self.max_size = max_size
+        with closing(self._connect()) as connection, connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS responses (key text PRIMARY KEY, tags text NOT NULL, "
+                               "body blob NOT NULL, media_type text NOT NULL, etag text NOT NULL, "
+                               "image_urls text, expires_at real NOT NULL, last_access real NOT NULL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS ix_responses_last_access ON responses (last_access)")
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Connects to the database
+        :return: database connection
+        """
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute("PRAGMA journal_mode=WAL")
+        return connection
+
+    def get(self, key: str) -> Optional[dict]:
+        """
+        Reads cached response and marks it as recently used
+        :param key: response key
+        :return: cached response dictionary or None if response is not cached or expired
+        """
+        with closing(self._connect()) as connection, connection:
+            now = time.time()
+            row = connection.execute("SELECT tags, body, media_type, etag, image_urls, expires_at FROM responses "
+                                     "WHERE key = ? AND expires_at >= ?", (key, now)).fetchone()
+            if row is None:
+                return None
+            connection.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+        tags, body, media_type, etag, image_urls, expires_at = row
+        return {'tags': set(tags.strip('|').split('|')), 'body': body, 'media_type': media_type,
+                'etag': etag, 'image_urls': json.loads(image_urls) if image_urls else None, 'expires_at': expires_at}
+
+    def put(self, key: str, entry: dict) -> None:
+        """
+        Stores response, expired and least recently used responses are dropped if the cache is full
+        :param key: response key
+        :param entry: response dictionary
+        :return: None
+        """
+        with closing(self._connect()) as connection, connection:
+            now = time.time()
+            # Tags are wrapped with separators, so a tag is found by substring search
+            connection.execute("INSERT OR REPLACE INTO responses (key, tags, body, media_type, etag, image_urls, "
+                               "expires_at, last_access) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                               (key, f"|{'|'.join(entry['tags'])}|", entry['body'], entry['media_type'], entry['etag'],
+                                json.dumps(entry['image_urls']) if entry['image_urls'] else None,
+                                entry['expires_at'], now))
+            connection.execute("DELETE FROM responses WHERE expires_at < ?", (now,))
+            connection.execute("DELETE FROM responses WHERE key IN (SELECT key FROM responses "
+                               "ORDER BY last_access DESC LIMIT -1 OFFSET ?)", (self.max_size,))
+
+    def invalidate(self, tags: Set[str]) -> None:
+        """
+        Drops responses having any of the tags
+        :param tags: response tags
+        :return: None
+        """
+        with closing(self._connect()) as connection, connection:
+            connection.executemany("DELETE FROM responses WHERE instr(tags, ?) > 0", [(f"|{tag}|",) for tag in tags])
+
+
+class ResponseCache:
+    """
+    Class caching rendered responses under keys built from endpoint and request parameters.
+    Responses are tagged with rss sources and publication dates of news they show
+    and invalidated when these news change
+    """
+
+    def __init__(self, backend, ttl: float = RESPONSE_CACHE_TTL, enabled: bool = RESPONSE_CACHE_ENABLED) -> None:
+        """
+        ResponseCache class initializing
+        :param backend: MemoryBackend or SQLiteBackend instance
+        :param ttl: time cached responses are kept for, in seconds
+        :param enabled: responses are not cached if False
+        """
+        self.backend = backend
+        self.ttl = ttl
+        self.enabled = enabled
+
+    @staticmethod
+    def key(endpoint: str, **params) -> str:
+        """
+        Builds response key from endpoint and request parameters, parameters which are not given are skipped
+        :param endpoint: request method and endpoint path
+        :param params: request parameters
+        :return: response key
+        """
+        return f"{endpoint}?{urlencode(sorted((name, value) for name, value in params.items() if value is not None))}"
+
+    def get(self, key: str) -> Optional[dict]:
+        """
+        Reads cached response
+        :param key: response key
+        :return: dictionary with 'body', 'media_type', 'etag', 'tags', 'image_urls' and 'expires_at' keys
+        or None if response is not cached
+        """
+        if not self.enabled:
+            return None
+        return self.backend.get(key)
+
+    def put(self,
+            key: str,
+            tags: Iterable[str],
+            body: bytes,
+            media_type: str,
+            image_urls: Optional[Dict[str, str]] = None) -> dict:
+        """
+        Stores rendered response, entity tag is calculated from response body
+        :param key: response key
+        :param tags: tags of rss sources and publication dates of news shown by response
+        :param body: response body
+        :param media_type: response media type
+        :param image_urls: urls of cached images linked by response under image links
+        :return: response dictionary, see 'get'
+        """
+        entry = {'tags': set(tags),
+                 'body': body,
+                 'media_type': media_type,
+                 'etag': hashlib.sha256(body).hexdigest(),
+                 'image_urls': image_urls or None,
+                 'expires_at': time.time() + self.ttl}
+        if self.enabled:
+            self.backend.put(key, entry)
+        return entry
+
+    def invalidate(self, tags: Iterable[str]) -> None:
+        """
+        Drops cached responses having any of the tags
+        :param tags: response tags
+        :return: None
+        """
+        if self.enabled:
+            self.backend.invalidate(set(tags))
+
+
+# Response cache instance used by the application
+response_cache = ResponseCache(SQLiteBackend(RESPONSE_CACHE_PATH) if RESPONSE_CACHE_PATH else MemoryBackend())
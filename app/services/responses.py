@@ -0,0 +1,153 @@
+"""Module defines responses used by read-only listing, cached page and file download endpoints"""
+import json
+import mimetypes
+import os
+import re
+from datetime import datetime
+from typing import Any, Iterator, Optional, Tuple
+from urllib.parse import quote
+
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+# Size of file chunks sent by download responses, in bytes
+FILE_CHUNK_SIZE = 64 * 1024
+# Single byte range of 'Range' request header, open-ended and suffix ranges included
+BYTE_RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# WebP images are not known to mimetypes module of older python versions
+mimetypes.add_type("image/webp", ".webp")
+
+
+def _json_default(value: Any) -> str:
+    """
+    Serializes values json module doesn't support
+    :param value: value to serialize
+    :return: serialized value
+    """
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class LeanJSONResponse(JSONResponse):
+    """
+    JSON response rendering plain dictionaries and lists as they are. Content is not validated
+    and converted through pydantic models, so it should be already shaped as response schema
+    """
+
+    def render(self, content: Any) -> bytes:
+        return json.dumps(content,
+                          default=_json_default,
+                          ensure_ascii=False,
+                          allow_nan=False,
+                          separators=(",", ":")).encode("utf-8")
+
+
+def _byte_range(range_header: str, file_size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parses single byte range of 'Range' request header
+    :param range_header: 'Range' header value
+    :param file_size: size of requested file
+    :return: first and last byte positions, None if range is not satisfiable
+    """
+    match = BYTE_RANGE_PATTERN.match(range_header.strip())
+    if match is None or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        # Suffix range, last bytes of the file. Zero bytes or bytes of an empty file can't be sent
+        if int(last) == 0 or file_size == 0:
+            return None
+        return max(file_size - int(last), 0), file_size - 1
+    first, last = int(first), min(int(last), file_size - 1) if last else file_size - 1
+    if first > last:
+        return None
+    return first, last
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    """
+    Checks whether client already has the representation with the entity tag
+    :param request: request object
+    :param etag: quoted entity tag
+    :return: True if 'If-None-Match' header matches the entity tag
+    """
+    if_none_match = request.headers.get("if-none-match")
+    return bool(if_none_match) and (if_none_match.strip() == "*"
+                                    or etag in (tag.strip() for tag in if_none_match.split(",")))
+
+
+def _iter_file(path: str, first: int, last: int) -> Iterator[bytes]:
+    """
+    Reads file part by chunks
+    :param path: file path
+    :param first: first byte position
+    :param last: last byte position
+    :return: iterator over file chunks
+    """
+    with open(path, 'rb') as file:
+        file.seek(first)
+        left = last - first + 1
+        while left > 0:
+            chunk = file.read(min(FILE_CHUNK_SIZE, left))
+            if not chunk:
+                break
+            left -= len(chunk)
+            yield chunk
+
+
+def file_download_response(request: Request,
+                           path: str,
+                           filename: str,
+                           etag: str,
+                           cache_control: Optional[str] = None,
+                           inline: bool = False) -> Response:
+    """
+    Streams file as an attachment or inline content. Conditional requests with 'If-None-Match' are answered
+    with 304 status and single range requests with 206 status and the requested part only
+    :param request: request object
+    :param path: file path
+    :param filename: name the file is downloaded with
+    :param etag: entity tag of file content
+    :param cache_control: 'Cache-Control' header value, sent with full, partial and 304 responses
+    :param inline: file is shown by the browser instead of being downloaded
+    :return: response object
+    """
+    file_size = os.path.getsize(path)
+    etag = f'"{etag}"'
+    headers = {"ETag": etag,
+               "Accept-Ranges": "bytes",
+               "Content-Disposition": f"{'inline' if inline else 'attachment'}; filename*=utf-8''{quote(filename)}"}
+    if cache_control:
+        headers["Cache-Control"] = cache_control
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    media_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    range_header = request.headers.get("range")
+    # Range is ignored if file changed since client received its part
+    if range_header and request.headers.get("if-range", etag) == etag:
+        byte_range = _byte_range(range_header, file_size)
+        if byte_range is None:
+            return Response(status_code=416, headers=dict(headers, **{"Content-Range": f"bytes */{file_size}"}))
+        first, last = byte_range
+        headers.update({"Content-Range": f"bytes {first}-{last}/{file_size}",
+                        "Content-Length": str(last - first + 1)})
+        return StreamingResponse(_iter_file(path, first, last), status_code=206, media_type=media_type, headers=headers)
+    headers["Content-Length"] = str(file_size)
+    return StreamingResponse(_iter_file(path, 0, file_size - 1), media_type=media_type, headers=headers)
+
+
+def cached_content_response(request: Request, cached_response: dict) -> Response:
+    """
+    Sends cached response content with 'ETag' header, conditional requests with 'If-None-Match'
+    are answered with 304 status. Clients revalidate content on every use, as it changes with stored news
+    :param request: request object
+    :param cached_response: response dictionary, see 'response_cache.ResponseCache.get'
+    :return: response object
+    """
+    etag = f'"{cached_response["etag"]}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=cached_response["body"], media_type=cached_response["media_type"], headers=headers)
@@ -0,0 +1,259 @@
+"""Module defines background poller refreshing news of all stored rss sources"""
+import asyncio
+import os
+import time
+from typing import Dict, List, Optional, Set
+
+import sqlalchemy
+from sqlalchemy.engine import Connection
+from starlette.concurrency import run_in_threadpool
+
+import database
+from crud import crud
+from services import ingestion, validator
+
+# Poller is started together with the application unless disabled with environment variable
+POLLER_ENABLED: bool = os.environ.get('RSS_POLLER_ENABLED', '1') == '1'
+# Bounds and initial value of per-feed poll interval, in seconds
+MIN_POLL_INTERVAL: float = 5 * 60
+MAX_POLL_INTERVAL: float = 6 * 60 * 60
+DEFAULT_POLL_INTERVAL: float = 30 * 60
+# Interval multiplier applied when feed has nothing new or failed to be polled
+BACKOFF_FACTOR: float = 1.5
+# Maximum number of feeds polled at the same time
+MAX_CONCURRENT_POLLS: int = 5
+# How often the poller looks for feeds which are due, in seconds
+SCHEDULER_TICK: float = 30
+# Advisory lock held by the application worker polling feeds, other workers wait until it is released
+POLLER_LOCK_ID: int = 20220602
+
+
+class FeedPoller:
+    """
+    Class polling every rss source from 'rss_book' table in the background.
+    Each feed has its own poll interval adapting to how often the feed publishes news:
+    interval follows the average gap between new news and grows while there is nothing new.
+    Feeds are polled by one application worker at a time, the one holding the poller advisory lock
+    """
+
+    def __init__(self,
+                 max_concurrent_polls: int = MAX_CONCURRENT_POLLS,
+                 tick: float = SCHEDULER_TICK) -> None:
+        """
+        FeedPoller class initializing
+        :param max_concurrent_polls: maximum number of feeds polled at the same time
+        :param tick: how often due feeds are looked for, in seconds
+        """
+        self.max_concurrent_polls = max_concurrent_polls
+        self.tick = tick
+        self.feed_statuses: Dict[str, dict] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._task: Optional[asyncio.Task] = None
+        self._poll_tasks: Set[asyncio.Task] = set()
+        self._lock_connection: Optional[Connection] = None
+        # Error of the last poller loop tick, e.g. database being unavailable
+        self.error: Optional[str] = None
+
+    @property
+    def is_running(self) -> bool:
+        """
+        Checks whether poller loop is running
+        :return: True if poller is running
+        """
+        return self._task is not None and not self._task.done()
+
+    @property
+    def is_polling(self) -> bool:
+        """
+        Checks whether this application worker holds the poller lock and polls feeds
+        :return: True if feeds are polled by this worker
+        """
+        return self.is_running and self._lock_connection is not None
+
+    def _hold_poller_lock(self) -> bool:
+        """
+        Takes poller advisory lock or checks it is still held. Lock is held by a dedicated connection,
+        so it is released by the database if the worker dies or the connection is lost
+        :return: True if this worker holds the lock
+        """
+        try:
+            if self._lock_connection is None:
+                connection = database.engine.connect()
+                with connection.begin():
+                    locked = connection.execute(sqlalchemy.text("SELECT pg_try_advisory_lock(:lock_id)"),
+                                                {'lock_id': POLLER_LOCK_ID}).scalar()
+                if not locked:
+                    connection.close()
+                    return False
+                self._lock_connection = connection
+            else:
+                with self._lock_connection.begin():
+                    self._lock_connection.execute(sqlalchemy.text("SELECT 1"))
+            return True
+        except sqlalchemy.exc.SQLAlchemyError:
+            self._release_poller_lock()
+            return False
+
+    def _release_poller_lock(self) -> None:
+        """
+        Releases poller advisory lock, so another application worker takes polling over
+        :return: None
+        """
+        if self._lock_connection is None:
+            return
+        connection, self._lock_connection = self._lock_connection, None
+        try:
+            with connection.begin():
+                connection.execute(sqlalchemy.text("SELECT pg_advisory_unlock(:lock_id)"), {'lock_id': POLLER_LOCK_ID})
+            connection.close()
+        except sqlalchemy.exc.SQLAlchemyError:
+            # Connection isn't returned to the pool, lock is released when it is closed
+            connection.invalidate()
+
+    @staticmethod
+    def next_interval(interval: float, inserted_count: int, elapsed: Optional[float]) -> float:
+        """
+        Calculates poll interval of a feed after a poll
+        :param interval: current poll interval
+        :param inserted_count: number of news inserted after the poll
+        :param elapsed: seconds passed since the previous successful poll, None for the first poll
+        :return: next poll interval within MIN_POLL_INTERVAL and MAX_POLL_INTERVAL bounds
+        """
+        if elapsed is None:
+            # Everything is new on the first poll, publishing rate is unknown yet
+            return interval
+        if inserted_count:
+            interval = elapsed / inserted_count
+        else:
+            interval *= BACKOFF_FACTOR
+        return min(max(interval, MIN_POLL_INTERVAL), MAX_POLL_INTERVAL)
+
+    def _feed_status(self, rss_url: str) -> dict:
+        """
+        Returns status of a feed, registers the feed if it is polled for the first time
+        :param rss_url: rss source url
+        :return: feed status dictionary
+        """
+        return self.feed_statuses.setdefault(rss_url, {'rss_url': rss_url,
+                                                       'interval': DEFAULT_POLL_INTERVAL,
+                                                       'next_poll': time.time(),
+                                                       'last_poll': None,
+                                                       'last_success': None,
+                                                       'last_inserted': 0,
+                                                       'not_modified': False,
+                                                       'error': None,
+                                                       'in_progress': False})
+
+    @staticmethod
+    def _read_rss_urls() -> List[str]:
+        """
+        Reads urls of all rss sources stored in the database
+        :return: list of rss urls
+        """
+        db = database.SessionLocal()
+        try:
+            return [rss.rss_url for rss in crud.get_all_rss_sources(db=db)]
+        finally:
+            db.close()
+
+    async def poll_feed(self, rss_url: str) -> None:
+        """
+        Fetches the feed, stores its news and cached images and schedules the next poll
+        :param rss_url: rss source url
+        :return: None
+        """
+        status = self._feed_status(rss_url)
+        async with self._semaphore:
+            started = time.time()
+            status['last_poll'] = started
+            db = database.SessionLocal()
+            try:
+                feed = await ingestion.fetch_feed(db=db, rss_url=rss_url)
+                validator.validate_url_is_rss_feed(feed=feed)
+                # Nobody waits for the poll, so images are cached right away for pages and conversions
+                _, inserted_count = await ingestion.ingest_feed(db=db, feed=feed, prefetch_images=True)
+            except Exception as e:
+                status['error'] = f"{type(e).__name__}: {e}"
+                status['interval'] = min(status['interval'] * BACKOFF_FACTOR, MAX_POLL_INTERVAL)
+            else:
+                elapsed = started - status['last_success'] if status['last_success'] else None
+                status['interval'] = self.next_interval(status['interval'], inserted_count, elapsed)
+                status.update(last_success=started,
+                              last_inserted=inserted_count,
+                              not_modified=feed.not_modified,
+                              error=None)
+            finally:
+                await run_in_threadpool(db.close)
+                status['next_poll'] = time.time() + status['interval']
+                status['in_progress'] = False
+
+    async def run(self) -> None:
+        """
+        Poller loop, every tick starts polls of the feeds which are due if this worker holds the poller lock.
+        Failed tick is recorded and doesn't stop the loop, the next tick tries again
+        :return: None
+        """
+        while True:
+            try:
+                if await run_in_threadpool(self._hold_poller_lock):
+                    await self._start_due_polls()
+            except Exception as e:
+                self.error = f"{type(e).__name__}: {e}"
+            else:
+                self.error = None
+            await asyncio.sleep(self.tick)
+
+    async def _start_due_polls(self) -> None:
+        """
+        Starts polls of the feeds which are due
+        :return: None
+        """
+        rss_urls = await run_in_threadpool(self._read_rss_urls)
+        # Forget feeds deleted from the database
+        for rss_url in set(self.feed_statuses) - set(rss_urls):
+            if not self.feed_statuses[rss_url]['in_progress']:
+                del self.feed_statuses[rss_url]
+        now = time.time()
+        for rss_url in rss_urls:
+            status = self._feed_status(rss_url)
+            if status['in_progress'] or status['next_poll'] > now:
+                continue
+            status['in_progress'] = True
+            poll_task = asyncio.create_task(self.poll_feed(rss_url))
+            self._poll_tasks.add(poll_task)
+            poll_task.add_done_callback(self._poll_tasks.discard)
+
+    def start(self) -> None:
+        """
+        Starts poller loop in the running event loop
+        :return: None
+        """
+        if self.is_running:
+            return
+        self._semaphore = asyncio.Semaphore(self.max_concurrent_polls)
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        """
+        Stops poller loop, cancels polls in progress and releases the poller lock
+        :return: None
+        """
+        tasks = list(self._poll_tasks)
+        if self._task is not None:
+            tasks.append(self._task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await run_in_threadpool(self._release_poller_lock)
+        self._task = None
+
+    def status(self) -> List[dict]:
+        """
+        Returns poll status of every known feed
+        :return: list of feed status dictionaries
+        """
+        return [dict(status) for status in self.feed_statuses.values()]
+
+
+# Poller instance used by the application
+feed_poller = FeedPoller()
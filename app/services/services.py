@@ -1,15 +1,70 @@
 """Module combines various service functions"""
 import os.path
+from datetime import datetime, timezone
+from typing import Optional
 
 import sqlalchemy
 from dateutil import parser
 
 import database
+from models import models
 
+# Advisory lock taken while database is created and upgraded, so application workers starting
+# at the same time wait for the first one instead of altering the same tables
+SCHEMA_LOCK_ID = 20220601
+# Statements upgrading tables of already existing database. Database keeps the number of applied statements
+# as its schema version, so each statement is applied once and new statements are only appended to the list
+UPGRADE_STATEMENTS = [
+    "ALTER TABLE rss_book ADD COLUMN IF NOT EXISTS dialect VARCHAR",
+    # Rss url and news title become unique keys, duplicates are merged into the first inserted entry
+    "UPDATE news SET rss_source = first_rss.id "
+    "FROM rss_book, (SELECT rss_url, MIN(id) AS id FROM rss_book GROUP BY rss_url) AS first_rss "
+    "WHERE news.rss_source = rss_book.id AND rss_book.rss_url = first_rss.rss_url AND rss_book.id <> first_rss.id",
+    "DELETE FROM rss_book USING rss_book AS first_rss "
+    "WHERE rss_book.rss_url = first_rss.rss_url AND rss_book.id > first_rss.id",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_rss_book_rss_url ON rss_book (rss_url)",
+    "DELETE FROM news USING news AS first_news WHERE news.title = first_news.title AND news.id > first_news.id",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_news_title ON news (title)",
+    # Publication dates are stored as indexed timestamps, old news get the start of their publication day
+    "ALTER TABLE news ADD COLUMN IF NOT EXISTS pubdate_ts TIMESTAMP WITH TIME ZONE",
+    "UPDATE news SET pubdate_ts = to_date(pubdate_format, 'YYYYMMDD')::timestamp AT TIME ZONE 'UTC' "
+    "WHERE pubdate_ts IS NULL AND pubdate_format ~ '^[0-9]{8}$'",
+    "CREATE INDEX IF NOT EXISTS ix_news_pubdate_ts ON news (pubdate_ts)",
+    "CREATE INDEX IF NOT EXISTS ix_news_rss_source_pubdate_ts ON news (rss_source, pubdate_ts)",
+    # Full-text search over news titles and descriptions
+    f"ALTER TABLE news ADD COLUMN IF NOT EXISTS search_vector TSVECTOR "
+    f"GENERATED ALWAYS AS ({models.SEARCH_VECTOR_EXPRESSION}) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_news_search_vector ON news USING gin (search_vector)",
+    # Keyset pagination of news ordered by publication date
+    "CREATE INDEX IF NOT EXISTS ix_news_pubdate_ts_id ON news (pubdate_ts, id)",
+    # Conversion jobs refer to cached converted files
+    "ALTER TABLE conversion_jobs ADD COLUMN IF NOT EXISTS artifact_key VARCHAR",
+    # Running conversion jobs are leased by application instances
+    "ALTER TABLE conversion_jobs ADD COLUMN IF NOT EXISTS claimed_by VARCHAR",
+    "ALTER TABLE conversion_jobs ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMP WITH TIME ZONE",
+    # Keyset pagination of news of a single rss source ordered by id
+    "CREATE INDEX IF NOT EXISTS ix_news_rss_source_id ON news (rss_source, id)",
+]
 
-def create_database() -> database.Base:
-    """Creates database"""
-    return database.Base.metadata.create_all(bind=database.engine)
+
+def upgrade_database() -> None:
+    """
+    Creates missing tables and applies upgrade statements the database doesn't have yet,
+    'create_all' doesn't alter existing tables
+    :return: None
+    """
+    with database.engine.begin() as connection:
+        connection.execute(sqlalchemy.text("SELECT pg_advisory_xact_lock(:lock_id)"), {'lock_id': SCHEMA_LOCK_ID})
+        database.Base.metadata.create_all(bind=connection)
+        schema_version = connection.execute(sqlalchemy.select(models.SchemaVersion.version)).scalar()
+        if schema_version is None:
+            schema_version = 0
+            connection.execute(sqlalchemy.insert(models.SchemaVersion).values(version=schema_version))
+        if schema_version >= len(UPGRADE_STATEMENTS):
+            return
+        for statement in UPGRADE_STATEMENTS[schema_version:]:
+            connection.execute(sqlalchemy.text(statement))
+        connection.execute(sqlalchemy.update(models.SchemaVersion).values(version=len(UPGRADE_STATEMENTS)))
 
 
 def get_db() -> database.SessionLocal:
@@ -46,6 +101,23 @@ def create_target_path(folder: str, filename: str, extension: str) -> str:
     return os.path.join(folder, filename)
 
 
+def parse_pubdate(random_date_format: str) -> Optional[datetime]:
+    """
+    Parses publication date, dates without timezone are considered UTC
+    :param random_date_format: date in random format
+    :return: timezone aware datetime or None if date is missing or can't be parsed
+    """
+    if random_date_format in (None, 'Empty'):
+        return None
+    try:
+        parsed_date = parser.parse(random_date_format)
+    except (ValueError, OverflowError):
+        return None
+    if parsed_date.tzinfo is None:
+        parsed_date = parsed_date.replace(tzinfo=timezone.utc)
+    return parsed_date
+
+
 def format_pubdate(random_date_format: str) -> str:
     """
     Method formatting date to YYYYMMDD
@@ -1,10 +1,11 @@
 """Module combines various validator functions"""
-from typing import NoReturn, Optional
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
 
-import requests
-from bs4 import BeautifulSoup
+import httpx
 
 from errors import exception_handler
+from rss_parser.news_parser.news_parser import FeedDocument
 
 
 def validate_limit_arg(value: int) -> int:
@@ -23,19 +24,41 @@ def validate_limit_arg(value: int) -> int:
         return value
 
 
-def validate_url_is_rss_feed(url: str) -> None:
+def validate_date_arg(value: str) -> datetime:
     """
-    Validate url if it is a valid rss source
-    :param url: url
-    :return: None, raises if url doesn't lead to rss feed
+    Validate date argument
+    :param value: date in YYYYMMDD format
+    :return: start of the date in UTC
     """
     try:
-        request = requests.get(url)
-    except Exception:
-        raise
-    soup = BeautifulSoup(request.text, 'xml')
-    text = soup.find_all('rss')
-    if not text:
+        return datetime.strptime(value, "%Y%m%d").replace(tzinfo=timezone.utc)
+    except ValueError:
+        raise exception_handler.NotValidDateArg
+
+
+def validate_date_range(date_from: Optional[str],
+                        date_to: Optional[str]) -> Tuple[Optional[datetime], Optional[datetime]]:
+    """
+    Validate date range arguments, range end date is included
+    :param date_from: range start date in YYYYMMDD format or None
+    :param date_to: range end date in YYYYMMDD format or None
+    :return: range start and exclusive range end in UTC, None for not provided dates
+    """
+    range_start = validate_date_arg(date_from) if date_from else None
+    range_end = validate_date_arg(date_to) + timedelta(days=1) if date_to else None
+    return range_start, range_end
+
+
+def validate_url_is_rss_feed(feed: FeedDocument) -> None:
+    """
+    Validate fetched document if it is a valid rss source
+    :param feed: fetched rss feed document
+    :return: None, raises if url doesn't lead to rss feed
+    """
+    # Not modified feed body was validated before it was cached
+    if feed.not_modified:
+        return
+    if feed.root_tag != 'rss':
         raise exception_handler.NotRssFeedUrlError
 
 
@@ -45,14 +68,12 @@ def validate_filename(filename: Optional[str]) -> None:
         raise exception_handler.NotValidFilename
 
 
-def check_internet_connection() -> NoReturn:
+async def check_internet_connection_async(client: httpx.AsyncClient) -> None:
     """
-    Checks internet connection via accessing www.google.com web-site.
-    Maybe there is a better solution, didn't find any better.
+    Checks internet connection via accessing www.google.com web-site with shared async HTTP client,
+    kept alive connection is reused by subsequent checks
+    :param client: shared async HTTP client
     :return: None
-    :raise requests.exceptions.ConnectionError: if no connection to internet
+    :raise httpx.TransportError: if no connection to internet or it timed out
     """
-    try:
-        request = requests.get("https://www.google.com/")
-    except requests.exceptions.ConnectionError:
-        raise
+    await client.head("https://www.google.com/")
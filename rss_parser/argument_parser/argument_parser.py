@@ -1,6 +1,7 @@
 import argparse
 import logging
-from typing import NoReturn
+from datetime import datetime, timezone
+from typing import List, NoReturn
 
 import requests
 
@@ -8,6 +9,8 @@ from exceptions.custom_exceptions import (BlockedRequestError,
                                           NegativeOrZeroLimitArgError,
                                           PageNotFoundError)
 from logs.logger import func_debug_logger
+from news_parser.news_parser import FEED_TIMEOUT, FeedDocument
+from news_parser.stream_parser import read_opml_urls
 from version import version
 
 # Module logger setting up
@@ -20,12 +23,41 @@ def create_arg_parser() -> argparse.Namespace:
     :return: Parsed arguments
     """
     parser = argparse.ArgumentParser(description="Pure Python command-line RSS reader.")
-    parser.add_argument("source", nargs="?", default=False, help="RSS URL")
+    parser.add_argument("source", nargs="*", default=[], help="RSS URL, several URLs could be given")
     parser.add_argument("--version", action="version", version=f"Version {version}", help="Print version info")
     parser.add_argument("--json", action="store_true", help="Print result as JSON in stdout")
+    parser.add_argument("--json-lines",
+                        action="store_true",
+                        dest='json_lines',
+                        help="Print result as JSON Lines in stdout, one compact JSON object per news")
     parser.add_argument("--verbose", action="store_false", help="Outputs verbose status messages")
     parser.add_argument("--limit", action="store", default=False, help="Limit news topics if this parameter provided")
-    parser.add_argument("--date", action="store", default=False, help="Get news from cache, use date format: YYYYMMDD")
+    parser.add_argument("--date",
+                        action="store",
+                        default=False,
+                        help="Get news from cache published on this date in the feed's own timezone, "
+                             "use date format: YYYYMMDD")
+    parser.add_argument("--date-from",
+                        action="store",
+                        default=False,
+                        dest='date_from',
+                        help="Get news from cache published on this date (UTC) or later, newest first. "
+                             "Use date format: YYYYMMDD")
+    parser.add_argument("--date-to",
+                        action="store",
+                        default=False,
+                        dest='date_to',
+                        help="Get news from cache published on this date (UTC) or earlier, newest first. "
+                             "Use date format: YYYYMMDD")
+    parser.add_argument("--search",
+                        action="store",
+                        default=False,
+                        help="Search news in cache by words in titles and descriptions, best matches first")
+    parser.add_argument("--offset",
+                        action="store",
+                        type=int,
+                        default=0,
+                        help="Number of best matching news to skip, used with 'search' argument")
     parser.add_argument("--to-html",
                         action="store",
                         default=False,
@@ -47,6 +79,20 @@ def create_arg_parser() -> argparse.Namespace:
                         dest='path_epub',
                         help="Convert news into EPUB file. Indicate path, filename is optional")
     parser.add_argument("--colorize", action="store_true", help="Output colorization")
+    parser.add_argument("--sources-file",
+                        action="store",
+                        default=False,
+                        dest='sources_file',
+                        help="Read RSS URLs from a file, either plain list with one URL per line or OPML")
+    parser.add_argument("--workers",
+                        action="store",
+                        type=int,
+                        default=10,
+                        help="Number of RSS feeds fetched concurrently")
+    parser.add_argument("--prefetch-images",
+                        action="store_true",
+                        dest='prefetch_images',
+                        help="Download news images in background after news are read, for further offline conversions")
     args = parser.parse_args()
     return args
 
@@ -74,27 +120,38 @@ def validate_limit_arg(value: int) -> int:
 
 
 @func_debug_logger(argument_parser_logger)
-def validate_source(url: str) -> NoReturn:
+def validate_date_arg(value: str) -> int:
     """
-    Function requests source and raises multiple exceptions if
-    something wrong with a source.
-    :param url: source URL
-    :return: None
-    :raises: raises multiple exceptions if URL is not valid or not available
+    Function validates date range argument from args_parser
+    :param value: date in YYYYMMDD format
+    :return: UTC timestamp of the date start
+    :raise: ValueError if value is not a date in YYYYMMDD format
     """
     try:
-        request = requests.get(url)
-        if request.status_code == 404:
-            argument_parser_logger.error(f"Page {url} is not found")
-            raise PageNotFoundError
-        elif request.status_code == 403:
-            argument_parser_logger.error(f"Request to {url} was blocked on a server side")
-            raise BlockedRequestError
-    # Raise multiple exceptions if link is somehow broken
-    except Exception:
+        date = datetime.strptime(value, "%Y%m%d").replace(tzinfo=timezone.utc)
+    except ValueError:
+        argument_parser_logger.exception(f"Date argument is not in YYYYMMDD format ({value})", exc_info=False)
         raise
-    else:
-        argument_parser_logger.info(f"Source '{url}' is valid")
+    argument_parser_logger.info(f"Date argument is valid and equals {value}")
+    return int(date.timestamp())
+
+
+@func_debug_logger(argument_parser_logger)
+def validate_source(feed: FeedDocument) -> NoReturn:
+    """
+    Function checks already fetched source response and raises
+    exceptions if something wrong with a source.
+    :param feed: fetched source document
+    :return: None
+    :raises: raises exceptions if source is not available
+    """
+    if feed.status_code == 404:
+        argument_parser_logger.error(f"Page {feed.url} is not found")
+        raise PageNotFoundError
+    elif feed.status_code == 403:
+        argument_parser_logger.error(f"Request to {feed.url} was blocked on a server side")
+        raise BlockedRequestError
+    argument_parser_logger.info(f"Source '{feed.url}' is valid")
 
 
 @func_debug_logger(argument_parser_logger)
@@ -104,11 +161,32 @@ def check_internet_connection() -> NoReturn:
     Maybe there is a better solution, didn't find any better.
     :return: None
     :raise requests.exceptions.ConnectionError: if no connection to internet
+    :raise requests.exceptions.Timeout: if connection is too slow to respond within FEED_TIMEOUT
     """
     try:
-        request = requests.get("https://www.google.com/")
-    except requests.exceptions.ConnectionError:
+        request = requests.get("https://www.google.com/", timeout=FEED_TIMEOUT)
+    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
         argument_parser_logger.error("No internet connection")
         raise
     else:
         argument_parser_logger.info(f"Connection to internet exists")
+
+
+@func_debug_logger(argument_parser_logger)
+def read_sources_file(path: str) -> List[str]:
+    """
+    Function reads RSS URLs from a file. File could be an OPML document
+    or a plain list with one URL per line, empty lines and lines starting with '#' are skipped
+    :param path: path to a file
+    :return: list of RSS URLs
+    :raise FileNotFoundError: if file doesn't exist
+    """
+    with open(path, 'rb') as file:
+        content = file.read()
+    if content.lstrip().startswith(b'<'):
+        sources = read_opml_urls(content)
+    else:
+        lines = content.decode('utf-8', errors='replace').splitlines()
+        sources = [line.strip() for line in lines if line.strip() and not line.strip().startswith('#')]
+    argument_parser_logger.info(f"{len(sources)} RSS URLs read from {path}")
+    return sources
@@ -1,10 +1,13 @@
 """
 Module is used for news caching and handling database queries.
 """
+import json
 import logging
 import os
 import sqlite3
-from typing import Optional, Iterable
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Iterable, List, Optional
 
 from dateutil import parser
 
@@ -13,6 +16,8 @@ from logs.logger import func_debug_logger
 
 # db file locating
 DATABASE_FILE: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cached_news.db")
+# Version of 'cached_news' table schema, stored in db file 'user_version' pragma
+SCHEMA_VERSION: int = 3
 
 # Module logger setting up
 caching_logger = logging.getLogger("app.caching")
@@ -60,9 +65,95 @@ class DataBaseHandler(sqlite3.Connection):
                     pubdate_format  text,
                     link text,
                     img_link text,
-                    img_location text)"""
+                    img_location text,
+                    pubdate_ts integer)"""
         )
         caching_logger.info("'Cached news' table created (if not exists)")
+        self.upgrade_table_cached_news()
+
+    @func_debug_logger(caching_logger)
+    def upgrade_table_cached_news(self) -> None:
+        """
+        Method migrating 'cached_news' table of db files created by previous versions.
+        Version 1: duplicated titles are removed, keeping the first inserted news, so title could become a unique key,
+        indexes used by dedupe check and by search by publication date and source are created.
+        Version 2: publication dates are stored as UTC timestamps in indexed 'pubdate_ts' column.
+        Version 3: full-text index over titles and descriptions, 'cached_news_fts' FTS5 table
+        is kept in sync with 'cached_news' by triggers
+        :return: None
+        """
+        schema_version = self.execute("PRAGMA user_version").fetchone()[0]
+        if schema_version >= SCHEMA_VERSION:
+            return
+        with self:
+            if schema_version < 1:
+                self.execute("DELETE FROM cached_news "
+                             "WHERE rowid NOT IN (SELECT MIN(rowid) FROM cached_news GROUP BY title)")
+                self.execute("CREATE UNIQUE INDEX IF NOT EXISTS cached_news_title_idx ON cached_news (title)")
+                self.execute("CREATE INDEX IF NOT EXISTS cached_news_pubdate_idx ON cached_news (pubdate_format)")
+                self.execute("CREATE INDEX IF NOT EXISTS cached_news_url_pubdate_idx "
+                             "ON cached_news (url, pubdate_format)")
+            if schema_version < 2:
+                columns = [column[1] for column in self.execute("PRAGMA table_info(cached_news)")]
+                if 'pubdate_ts' not in columns:
+                    self.execute("ALTER TABLE cached_news ADD COLUMN pubdate_ts integer")
+                dated_news = self.execute("SELECT rowid, pubdate FROM cached_news "
+                                          "WHERE pubdate_ts IS NULL AND pubdate != 'Empty'").fetchall()
+                self.executemany("UPDATE cached_news SET pubdate_ts=? WHERE rowid=?",
+                                 [(self.pubdate_timestamp(pubdate), rowid) for rowid, pubdate in dated_news])
+                self.execute("CREATE INDEX IF NOT EXISTS cached_news_pubdate_ts_idx ON cached_news (pubdate_ts)")
+                self.execute("CREATE INDEX IF NOT EXISTS cached_news_url_pubdate_ts_idx "
+                             "ON cached_news (url, pubdate_ts)")
+            if schema_version < 3:
+                self.execute("CREATE VIRTUAL TABLE IF NOT EXISTS cached_news_fts "
+                             "USING fts5(title, description, content='cached_news', content_rowid='rowid')")
+                self.execute("CREATE TRIGGER IF NOT EXISTS cached_news_fts_insert AFTER INSERT ON cached_news BEGIN "
+                             "INSERT INTO cached_news_fts (rowid, title, description) "
+                             "VALUES (new.rowid, new.title, new.description); END")
+                self.execute("CREATE TRIGGER IF NOT EXISTS cached_news_fts_delete AFTER DELETE ON cached_news BEGIN "
+                             "INSERT INTO cached_news_fts (cached_news_fts, rowid, title, description) "
+                             "VALUES ('delete', old.rowid, old.title, old.description); END")
+                self.execute("CREATE TRIGGER IF NOT EXISTS cached_news_fts_update AFTER UPDATE ON cached_news BEGIN "
+                             "INSERT INTO cached_news_fts (cached_news_fts, rowid, title, description) "
+                             "VALUES ('delete', old.rowid, old.title, old.description); "
+                             "INSERT INTO cached_news_fts (rowid, title, description) "
+                             "VALUES (new.rowid, new.title, new.description); END")
+                # Index news cached before full-text search was introduced
+                self.execute("INSERT INTO cached_news_fts (cached_news_fts) VALUES ('rebuild')")
+            self.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        caching_logger.info(f"'Cached news' table upgraded to schema version {SCHEMA_VERSION}")
+
+    @func_debug_logger(caching_logger)
+    def create_table_http_cache(self) -> None:
+        """
+        Method creating a table called 'http_cache', storing last response
+        of each RSS feed with its validators and parsed news, table name is hardcoded.
+        :return: None
+        """
+        self.execute(
+            """CREATE TABLE IF NOT EXISTS http_cache (
+                    url text PRIMARY KEY,
+                    etag text,
+                    last_modified text,
+                    body blob,
+                    news text,
+                    news_limit integer)"""
+        )
+        caching_logger.info("'HTTP cache' table created (if not exists)")
+
+    @func_debug_logger(caching_logger)
+    def create_table_feed_dialects(self) -> None:
+        """
+        Method creating a table called 'feed_dialects', storing detected dialect
+        of each RSS feed, so it is not detected again, table name is hardcoded.
+        :return: None
+        """
+        self.execute(
+            """CREATE TABLE IF NOT EXISTS feed_dialects (
+                    url text PRIMARY KEY,
+                    dialect text)"""
+        )
+        caching_logger.info("'Feed dialects' table created (if not exists)")
 
     def drop_table_cached_news(self) -> None:
         """
@@ -71,6 +162,8 @@ class DataBaseHandler(sqlite3.Connection):
         :return: None
         """
         self.execute("DROP TABLE IF EXISTS cached_news")
+        self.execute("DROP TABLE IF EXISTS cached_news_fts")
+        self.execute("PRAGMA user_version = 0")
         caching_logger.info("'Cached news' table was dropped")
 
     @func_debug_logger(caching_logger)
@@ -124,6 +217,104 @@ class DataBaseHandler(sqlite3.Connection):
             caching_logger.error(f"'No news from {source} published in {pubdate} in cache found")
             raise NewsNotFoundError(f"No news from {source} published on {pubdate} in cache found")
 
+    @func_debug_logger(caching_logger)
+    def read_table_by_pubdate_range(self,
+                                    pubdate_from: Optional[int] = None,
+                                    pubdate_to: Optional[int] = None,
+                                    sources: Optional[List[str]] = None,
+                                    limit: Optional[int] = False) -> Iterable[dict]:
+        """
+        Method sending query to db and returning cache news published within a time range, newest first.
+        Query is served by a range scan over 'pubdate_ts' index
+        :param pubdate_from: range start as UTC timestamp, inclusive, unbounded if None
+        :param pubdate_to: range end as UTC timestamp, exclusive, unbounded if None
+        :param sources: RSS source URLs, news of all sources if None or empty
+        :param limit: number of news to proceed with
+        :return: list of 'cache news' dictionaries with same structure as from 'rss_feed_parser' func
+        """
+        conditions = ["pubdate_ts IS NOT NULL"]
+        parameters = []
+        if pubdate_from is not None:
+            conditions.append("pubdate_ts >= ?")
+            parameters.append(pubdate_from)
+        if pubdate_to is not None:
+            conditions.append("pubdate_ts < ?")
+            parameters.append(pubdate_to)
+        if sources:
+            conditions.append(f"url IN ({', '.join('?' * len(sources))})")
+            parameters.extend(sources)
+        parameters.append(limit if limit else -1)
+        self.row_factory = sqlite3.Row
+        self.__cursor = self.cursor()
+        self.__cursor.execute(
+            f"SELECT * FROM cached_news WHERE {' AND '.join(conditions)} ORDER BY pubdate_ts DESC LIMIT ?",
+            parameters,
+        )
+        retrieved_news = [dict(row) for row in self.__cursor.fetchall()]
+        if retrieved_news:
+            caching_logger.info(f"Found {len(retrieved_news)} news published from {pubdate_from} to {pubdate_to}")
+            return retrieved_news
+        caching_logger.error(f"No news published from {pubdate_from} to {pubdate_to} in cache found")
+        raise NewsNotFoundError("No news published within given dates in cache found")
+
+    @func_debug_logger(caching_logger)
+    def search_cached_news(self,
+                           search_query: str,
+                           sources: Optional[List[str]] = None,
+                           pubdate_from: Optional[int] = None,
+                           pubdate_to: Optional[int] = None,
+                           limit: Optional[int] = False,
+                           offset: int = 0) -> Iterable[dict]:
+        """
+        Method searching cache news by words in titles and descriptions with full-text index,
+        news are ranked by relevance. Every word of the query should be found in a news
+        :param search_query: words to search for
+        :param sources: RSS source URLs, news of all sources if None or empty
+        :param pubdate_from: range start as UTC timestamp, inclusive, unbounded if None
+        :param pubdate_to: range end as UTC timestamp, exclusive, unbounded if None
+        :param limit: number of news to proceed with
+        :param offset: number of best ranked news to skip
+        :return: list of 'cache news' dictionaries with same structure as from 'rss_feed_parser' func
+        """
+        conditions = ["cached_news_fts MATCH ?"]
+        parameters = [self.fts_query(search_query)]
+        if sources:
+            conditions.append(f"cached_news.url IN ({', '.join('?' * len(sources))})")
+            parameters.extend(sources)
+        if pubdate_from is not None:
+            conditions.append("cached_news.pubdate_ts >= ?")
+            parameters.append(pubdate_from)
+        if pubdate_to is not None:
+            conditions.append("cached_news.pubdate_ts < ?")
+            parameters.append(pubdate_to)
+        parameters.extend([limit if limit else -1, offset])
+        self.row_factory = sqlite3.Row
+        self.__cursor = self.cursor()
+        self.__cursor.execute(
+            "SELECT cached_news.* FROM cached_news_fts "
+            "JOIN cached_news ON cached_news.rowid = cached_news_fts.rowid "
+            f"WHERE {' AND '.join(conditions)} "
+            "ORDER BY bm25(cached_news_fts) LIMIT ? OFFSET ?",
+            parameters,
+        )
+        retrieved_news = [dict(row) for row in self.__cursor.fetchall()]
+        if retrieved_news:
+            caching_logger.info(f"Found {len(retrieved_news)} news matching '{search_query}'")
+            return retrieved_news
+        caching_logger.error(f"No news matching '{search_query}' in cache found")
+        raise NewsNotFoundError(f"No news matching '{search_query}' in cache found")
+
+    @staticmethod
+    def fts_query(search_query: str) -> str:
+        """
+        Method turning user input into FTS5 query, each word is quoted,
+        so characters of FTS5 query syntax are searched as they are
+        :param search_query: words to search for
+        :return: FTS5 query matching news with all the words
+        """
+        words = search_query.split()
+        return ' '.join('"' + word.replace('"', '""') + '"' for word in words) or '""'
+
     def read_all_table_cached_news(self) -> Iterable[dict]:
         """
         Method returning everything from 'cached_news' table for internal tests
@@ -132,6 +323,24 @@ class DataBaseHandler(sqlite3.Connection):
         self.__cursor.execute("SELECT * FROM cached_news")
         return self.__cursor.fetchall()
 
+    @staticmethod
+    def parse_pubdate(random_date_format: str) -> datetime:
+        """
+        Method parsing publication date, dates without timezone are considered UTC
+        :param random_date_format: date in random format
+        :return: timezone aware datetime
+        """
+        # RSS publication dates are in RFC 822 format, which is parsed much faster by email.utils
+        try:
+            parsed_date = parsedate_to_datetime(random_date_format)
+        except (TypeError, ValueError):
+            parsed_date = None
+        if parsed_date is None:
+            parsed_date = parser.parse(random_date_format)
+        if parsed_date.tzinfo is None:
+            parsed_date = parsed_date.replace(tzinfo=timezone.utc)
+        return parsed_date
+
     @staticmethod
     def format_pubdate(random_date_format: str) -> str:
         """
@@ -139,10 +348,24 @@ class DataBaseHandler(sqlite3.Connection):
         :param random_date_format: date in random format
         :return: formatted to YYYYMMDD date
         """
-        parsed_date = parser.parse(random_date_format)
+        parsed_date = DataBaseHandler.parse_pubdate(random_date_format)
         formatted_pubdate = parsed_date.strftime("%Y%m%d")
         return formatted_pubdate
 
+    @staticmethod
+    def pubdate_timestamp(random_date_format: str) -> Optional[int]:
+        """
+        Method converting publication date to UTC timestamp
+        :param random_date_format: date in random format
+        :return: timestamp in seconds or None if date is missing or can't be parsed
+        """
+        if random_date_format in (None, "Empty"):
+            return None
+        try:
+            return int(DataBaseHandler.parse_pubdate(random_date_format).timestamp())
+        except (ValueError, OverflowError):
+            return None
+
     @func_debug_logger(caching_logger)
     def check_news_in_table(self, title: str) -> bool:
         """
@@ -161,35 +384,121 @@ class DataBaseHandler(sqlite3.Connection):
     @func_debug_logger(caching_logger)
     def insert_into_table_cached_news(self, news_list: Iterable[dict]) -> None:
         """
-        Method inserting data into 'cached_news' db
+        Method inserting data into 'cached_news' db. All news are inserted in one batch,
+        news with titles already in the table are skipped by the unique title index
         :param news_list: list of 'cache news' dictionaries with same structure as from 'rss_feed_parser' func
         :return: None
         """
         try:
+            news_rows = []
             for news in news_list:
                 # Updating news with additional key 'pubdate_format',
                 # formatted date to YYYYMMDD for a further search in database
                 pubdate = news["pubdate"]
+                pubdate_ts = None
+                news["pubdate_format"] = "Empty"
                 if pubdate != "Empty":
-                    news["pubdate_format"] = self.format_pubdate(pubdate)
-                else:
-                    news["pubdate_format"] = "Empty"
-                # Check if entry already in table and insert data into a 'cached news' table
-                if not self.check_news_in_table(news['title']):
-                    self.__cursor.execute(
-                        "INSERT INTO cached_news "
-                        "VALUES (:url,"
-                        " :rss_header,"
-                        " :title,"
-                        " :description,"
-                        " :pubdate,"
-                        " :pubdate_format,"
-                        " :link,"
-                        " :img_link,"
-                        " :img_location)",
-                        news,
-                    )
-            caching_logger.info(f"Inserted parsed news into the database")
+                    try:
+                        parsed_date = self.parse_pubdate(pubdate)
+                    except (ValueError, OverflowError):
+                        # News with unparsable date is still cached, it is just not found by date
+                        caching_logger.warning(f"Unable to parse publication date: '{pubdate}'")
+                    else:
+                        news["pubdate_format"] = parsed_date.strftime("%Y%m%d")
+                        pubdate_ts = int(parsed_date.timestamp())
+                news_rows.append({**news, "pubdate_ts": pubdate_ts})
+            self.__cursor.executemany(
+                "INSERT OR IGNORE INTO cached_news "
+                "(url, rss_header, title, description, pubdate, pubdate_format, link, img_link, img_location,"
+                " pubdate_ts) "
+                "VALUES (:url,"
+                " :rss_header,"
+                " :title,"
+                " :description,"
+                " :pubdate,"
+                " :pubdate_format,"
+                " :link,"
+                " :img_link,"
+                " :img_location,"
+                " :pubdate_ts)",
+                news_rows,
+            )
+            caching_logger.info(f"Inserted {self.__cursor.rowcount} new parsed news into the database")
         except TypeError as exc:
             caching_logger.exception(f"Error occurred during inserting data into db: {exc.__doc__}")
             print(f"Error occurred during inserting data into db: {exc.__doc__}")
+
+    @func_debug_logger(caching_logger)
+    def read_http_cache(self, url: str) -> Optional[dict]:
+        """
+        Method returning HTTP cache entry of RSS feed
+        :param url: RSS source URL
+        :return: dictionary with 'etag', 'last_modified', 'body', 'news' and 'news_limit' keys or None
+        """
+        self.row_factory = sqlite3.Row
+        self.__cursor = self.cursor()
+        self.__cursor.execute("SELECT * FROM http_cache WHERE url=:url", {"url": url})
+        cache_entry = self.__cursor.fetchone()
+        if cache_entry is None:
+            caching_logger.info(f"No HTTP cache entry for {url}")
+            return None
+        caching_logger.info(f"Found HTTP cache entry for {url}")
+        return dict(cache_entry)
+
+    @func_debug_logger(caching_logger)
+    def insert_into_table_http_cache(self, feed, news_list: Iterable[dict], limit: Optional[int] = None) -> None:
+        """
+        Method storing RSS feed response validators, body and parsed news into 'http_cache' table.
+        Responses without ETag or Last-Modified validators are not stored,
+        as well as not modified feeds with reused parse result
+        :param feed: fetched FeedDocument
+        :param news_list: list of news parsed from the feed
+        :param limit: limit argument news were parsed with
+        :return: None
+        """
+        if feed.not_modified and feed.cached_news(limit) is not None:
+            return
+        if not feed.etag and not feed.last_modified:
+            caching_logger.info(f"Response from {feed.url} has no validators, not caching it")
+            return
+        self.__cursor.execute(
+            "INSERT OR REPLACE INTO http_cache "
+            "VALUES (:url, :etag, :last_modified, :body, :news, :news_limit)",
+            {
+                "url": feed.url,
+                "etag": feed.etag,
+                "last_modified": feed.last_modified,
+                "body": feed.content,
+                "news": json.dumps(news_list, ensure_ascii=False),
+                "news_limit": limit if limit else None
+            },
+        )
+        caching_logger.info(f"Response from {feed.url} stored in HTTP cache")
+
+    @func_debug_logger(caching_logger)
+    def read_feed_dialect(self, url: str) -> Optional[str]:
+        """
+        Method returning stored dialect of RSS feed
+        :param url: RSS source URL
+        :return: feed dialect or None if it was not detected yet
+        """
+        self.__cursor = self.cursor()
+        self.__cursor.execute("SELECT dialect FROM feed_dialects WHERE url=:url", {"url": url})
+        feed_dialect = self.__cursor.fetchone()
+        return feed_dialect[0] if feed_dialect is not None else None
+
+    @func_debug_logger(caching_logger)
+    def insert_into_table_feed_dialects(self, url: str, dialect: Optional[str]) -> None:
+        """
+        Method storing RSS feed dialect into 'feed_dialects' table
+        :param url: RSS source URL
+        :param dialect: detected feed dialect, nothing is stored if None
+        :return: None
+        """
+        if dialect is None:
+            return
+        self.__cursor.execute(
+            "INSERT OR REPLACE INTO feed_dialects VALUES (:url, :dialect)",
+            {"url": url, "dialect": dialect},
+        )
+        caching_logger.info(f"Feed dialect '{dialect}' of {url} stored in the database")
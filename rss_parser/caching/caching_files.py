@@ -0,0 +1,160 @@
+"""
+Module is used for caching converted files under keys derived from converted news and templates
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import uuid
+from typing import Iterable, List, Optional, Tuple
+
+from converters.converter import Converter
+from logs.logger import func_debug_logger
+
+# Module logger setting up
+caching_files_logger = logging.getLogger("app.caching_files_module")
+
+
+class ConvertedFileCache:
+    """
+        Class for caching converted files, least recently used files are evicted
+        when cache size exceeds the limit
+    """
+
+    CACHED_FILES_LOCATION: str = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'cached_files')
+    # Maximum total size of cached files, in bytes
+    MAX_CACHE_SIZE: int = 256 * 1024 * 1024
+
+    def __init__(self, location: str = CACHED_FILES_LOCATION, max_size: int = MAX_CACHE_SIZE) -> None:
+        """
+        ConvertedFileCache class initializing
+        :param location: folder cached files are stored in
+        :param max_size: maximum total size of cached files, in bytes
+        """
+        self.location = location
+        self.max_size = max_size
+
+    @staticmethod
+    def news_hash(news: dict) -> str:
+        """
+        Calculates hash of news content, cached image file size and modification time are included,
+        so news get a new hash when their image is re-downloaded or resized
+        :param news: parsed news
+        :return: sha256 hex digest
+        """
+        news_hash = hashlib.sha256(json.dumps(news, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8'))
+        if news.get('img_location', 'Empty') != 'Empty' and os.path.isfile(news['img_location']):
+            image_stat = os.stat(news['img_location'])
+            news_hash.update(f"{image_stat.st_size}:{image_stat.st_mtime_ns}".encode('utf-8'))
+        return news_hash.hexdigest()
+
+    @classmethod
+    def cache_key(cls, file_format: str, news_list: List[dict]) -> str:
+        """
+        Calculates cache key of converted file from format, templates version and ordered news hashes
+        :param file_format: 'html', 'pdf' or 'epub'
+        :param news_list: parsed news in the order they are converted
+        :return: sha256 hex digest
+        """
+        cache_key = hashlib.sha256(f"{file_format}:{Converter.template_version(file_format)}".encode('utf-8'))
+        for news in news_list:
+            cache_key.update(cls.news_hash(news).encode('utf-8'))
+        return cache_key.hexdigest()
+
+    def cached_file_path(self, cache_key: str, file_format: str) -> str:
+        """
+        Returns location of cached file
+        :param cache_key: cache key of converted file
+        :param file_format: 'html', 'pdf' or 'epub'
+        :return: cached file path
+        """
+        return os.path.join(self.location, f"{cache_key}.{file_format}")
+
+    @func_debug_logger(caching_files_logger)
+    def get(self, cache_key: str, file_format: str) -> Optional[str]:
+        """
+        Looks converted file up in the cache and marks it as recently used
+        :param cache_key: cache key of converted file
+        :param file_format: 'html', 'pdf' or 'epub'
+        :return: cached file path or None if file is not cached
+        """
+        cached_file = self.cached_file_path(cache_key, file_format)
+        try:
+            os.utime(cached_file)
+        except FileNotFoundError:
+            return None
+        return cached_file
+
+    @func_debug_logger(caching_files_logger)
+    def put(self, source_path: str, cache_key: str, file_format: str) -> str:
+        """
+        Copies converted file into the cache and evicts least recently used files if cache is full.
+        File is copied under a temporary name first, so readers never see a partially copied file
+        :param source_path: converted file path
+        :param cache_key: cache key of converted file
+        :param file_format: 'html', 'pdf' or 'epub'
+        :return: cached file path
+        """
+        os.makedirs(self.location, exist_ok=True)
+        cached_file = self.cached_file_path(cache_key, file_format)
+        temporary_file = f"{cached_file}.{uuid.uuid4().hex}.tmp"
+        shutil.copyfile(source_path, temporary_file)
+        os.replace(temporary_file, cached_file)
+        self.evict()
+        return cached_file
+
+    def _cached_files(self) -> Iterable[os.DirEntry]:
+        """
+        Lists cached files
+        :return: iterator over cached files directory entries
+        """
+        return (entry for entry in os.scandir(self.location)
+                if entry.is_file() and os.path.splitext(entry.name)[1][1:] in Converter.TEMPLATE_FILES)
+
+    @func_debug_logger(caching_files_logger)
+    def evict(self) -> None:
+        """
+        Removes least recently used files until total size of cached files fits the limit
+        :return: None
+        """
+        cached_files = []
+        for entry in self._cached_files():
+            try:
+                entry_stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            cached_files.append((entry_stat.st_mtime, entry_stat.st_size, entry.path))
+        cache_size = sum(size for _, size, _ in cached_files)
+        for _, size, path in sorted(cached_files):
+            if cache_size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            cache_size -= size
+            caching_files_logger.info(f"Cached file {path} evicted")
+
+    @func_debug_logger(caching_files_logger)
+    def convert(self, file_format: str, target_path: str, news_list: Iterable[dict]) -> Tuple[Optional[str], str]:
+        """
+        Converts news into a file, the same news converted before are copied from the cache instead
+        :param file_format: 'html', 'pdf' or 'epub'
+        :param target_path: path there to save converted file
+        :param news_list: parsed news
+        :return: path of converted file, None if conversion failed, and cache key of converted file
+        """
+        news_list = list(news_list)
+        cache_key = self.cache_key(file_format, news_list)
+        cached_file = self.get(cache_key, file_format)
+        if cached_file is not None:
+            target_path = Converter.target_file_path(target_path, file_format)
+            shutil.copyfile(cached_file, target_path)
+            caching_files_logger.info(f"{file_format.upper()} file copied from cache into {target_path}")
+            return target_path, cache_key
+        convert = getattr(Converter, f"convert_to_{file_format}")
+        target_path = convert(target_path, news_list)
+        if target_path is not None and os.path.isfile(target_path):
+            self.put(target_path, cache_key, file_format)
+        return target_path, cache_key
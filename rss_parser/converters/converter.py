@@ -1,30 +1,96 @@
 """
 Module is used for converting news into html format
 """
+import hashlib
 import json
 import logging
 import os
 import uuid
-from typing import Iterable, Optional
+from functools import lru_cache
+from typing import Iterable, Iterator, Optional, Tuple
 
 import jinja2.exceptions
 from ebooklib import epub
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
 from pygments import formatters, highlight, lexers
 from xhtml2pdf import pisa
 
+from caching.caching_images import image_variant
 from logs.logger import func_debug_logger
 
 # Module logger setting up
 converter_logger = logging.getLogger("app.converter")
 
 
+@lru_cache(maxsize=None)
+def jinja_environment() -> Environment:
+    """
+    Process-wide jinja environment, created on the first call. Compiled templates are kept in memory
+    and their bytecode is cached on disk, so templates are compiled once and not per process start.
+    Templates pick image variants with 'image_variant' filter
+    :return: jinja environment with converter templates
+    """
+    environment = Environment(loader=FileSystemLoader(Converter.TEMPLATES_LOCATION),
+                              bytecode_cache=FileSystemBytecodeCache(),
+                              auto_reload=False)
+    environment.filters['image_variant'] = image_variant
+    return environment
+
+
 class Converter:
     """
     Converter class handling conversions into different formats
     """
 
     TEMPLATES_LOCATION: str = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'templates')
+    # Template files each conversion format depends on
+    TEMPLATE_FILES: dict = {'html': ('html_template.html',),
+                            'pdf': ('html_template.html',),
+                            'epub': ('epub_template.html', 'epub_book_cover.jpg', 'epub_empty_image.jpg')}
+
+    @staticmethod
+    def target_file_path(target_path: str, extension: str) -> str:
+        """
+        Method returns path of converted file, random filename is generated if target path is a folder
+        :param target_path: path to a file or a folder
+        :param extension: converted file extension
+        :return: path to a file
+        """
+        if not os.path.join(target_path).endswith(f'.{extension}'):
+            target_path = os.path.join(target_path, f"rss_feed_{str(uuid.uuid4())[0:6]}.{extension}")
+        return target_path
+
+    @staticmethod
+    def template_version(file_format: str) -> str:
+        """
+        Method calculates version of templates used for a format, version changes with any template file change
+        :param file_format: 'html', 'pdf' or 'epub'
+        :return: sha256 hex digest of template files content
+        """
+        version = hashlib.sha256()
+        for template_file in Converter.TEMPLATE_FILES[file_format]:
+            with open(os.path.join(Converter.TEMPLATES_LOCATION, template_file), 'rb') as file:
+                version.update(file.read())
+        return version.hexdigest()
+
+    @staticmethod
+    def json_item(news: dict) -> dict:
+        """
+        Method restructures parsed news into an item of json output
+        :param news: parsed news
+        :return: json output item
+        """
+        return {
+            "Feed": news['rss_header'],
+            "URL": news['url'],
+            "Article": {
+                'title': news['title'],
+                'pubdate': news['pubdate'],
+                'description': news['description'],
+                'link': news['link'],
+                'img_link': news['img_link']
+            }
+        }
 
     @staticmethod
     @func_debug_logger(converter_logger)
@@ -35,57 +101,62 @@ class Converter:
         :param news_list: parsed list of news
         :return: json data
         """
-        news_list_array = []
-        for news in news_list:
-            news_list_modified = {
-                "Feed": news['rss_header'],
-                "URL": news['url'],
-                "Article": {
-                    'title': news['title'],
-                    'pubdate': news['pubdate'],
-                    'description': news['description'],
-                    'link': news['link'],
-                    'img_link': news['img_link']
-                }
-            }
-            news_list_array.append(news_list_modified)
+        news_list_array = [Converter.json_item(news) for news in news_list]
         json_dumped = json.dumps(news_list_array, indent=4, ensure_ascii=False)
         if colorize:
             json_dumped = highlight(json_dumped, lexers.JsonLexer(), formatters.TerminalFormatter())
         converter_logger.info("Converting to json was successful")
         return json_dumped
 
+    @staticmethod
+    def iter_json_lines(news_list: Iterable[dict], colorize: Optional[bool] = False) -> Iterator[str]:
+        """
+        Method converts parsed news into JSON Lines, one compact json object per news.
+        Lines are produced one by one, so output could be written before all news are converted
+        :param news_list: parsed news, could be a generator
+        :param colorize: bool, True if colorize each line
+        :return: iterator over lines ending with a newline character
+        """
+        if colorize:
+            lexer, formatter = lexers.JsonLexer(ensurenl=False), formatters.TerminalFormatter()
+        lines_count = 0
+        for news in news_list:
+            line = json.dumps(Converter.json_item(news), ensure_ascii=False, separators=(',', ':'))
+            if colorize:
+                line = highlight(line, lexer, formatter)
+            lines_count += 1
+            yield line + '\n'
+        converter_logger.info(f"Converting {lines_count} news to json lines was successful")
+
     @staticmethod
     @func_debug_logger(converter_logger)
     def setup_jinja(template_filename: str) -> jinja2.Template:
         """
-        Setting up jinja with a given template
+        Setting up jinja with a given template, template is compiled on the first call only
         :param template_filename: html template file name in templates folder
         :return: template jinja object
         """
-        jinja_env = Environment(loader=FileSystemLoader(Converter.TEMPLATES_LOCATION))
-        jinja_html_template = jinja_env.get_template(template_filename)
+        jinja_html_template = jinja_environment().get_template(template_filename)
 
         converter_logger.info("Setting up HTML template was done")
         return jinja_html_template
 
     @classmethod
     @func_debug_logger(converter_logger)
-    def convert_to_html(cls, target_path: str, news_list: Iterable[dict]) -> None:
+    def convert_to_html(cls, target_path: str, news_list: Iterable[dict]) -> Optional[str]:
         """
         Method converting RSS feed into HTML file and saves into specified location
         :param target_path: path there to save html file
         :param news_list: parsed news feed
-        :return: None
+        :return: path of converted file, None if conversion failed
         """
-        if not os.path.join(target_path).endswith('.html'):
-            html_file_name = f"rss_feed_{str(uuid.uuid4())[0:6]}.html"
-            target_path = os.path.join(target_path, html_file_name)
+        target_path = cls.target_file_path(target_path, 'html')
         try:
             template = cls.setup_jinja('html_template.html')
             with open(target_path, 'w+', encoding='utf-8') as file:
-                file.write(template.render(news_list=news_list))
+                file.write(template.render(news_list=news_list, variant='article'))
             converter_logger.info(f"Rendering HTML into {target_path}")
+            return target_path
         except TypeError:
             converter_logger.error("Not valid path or input data.")
             print("Not valid path or input data.")
@@ -101,34 +172,68 @@ class Converter:
 
     @classmethod
     @func_debug_logger(converter_logger)
-    def convert_to_pdf(cls, target_path: str, news_list: Iterable[dict]) -> None:
+    def convert_to_pdf(cls, target_path: str, news_list: Iterable[dict]) -> Optional[str]:
         """
         Method converting RSS feed into PDF file and saves into specified location
         :param target_path: path there to save html file
         :param news_list: parsed news feed
-        :return: None
+        :return: path of converted file, None if conversion failed
         """
-        if not os.path.join(target_path).endswith('.pdf'):
-            pdf_file_name = f"rss_feed_{str(uuid.uuid4())[0:6]}.pdf"
-            target_path = os.path.join(target_path, pdf_file_name)
+        target_path = cls.target_file_path(target_path, 'pdf')
         try:
             template = cls.setup_jinja('html_template.html')
-            source_html_text = template.render(news_list=news_list)
+            source_html_text = template.render(news_list=news_list, variant='document')
             with open(target_path, "w+b") as target:
                 pisa.CreatePDF(source_html_text, dest=target, encoding='utf-8')
             converter_logger.info(f"Rendering PDF into {target_path}")
+            return target_path
         except FileNotFoundError:
             converter_logger.error(f"Specified path/folder {target_path} doesn't exist or not valid.")
             raise
         except Exception as exc:
             print(exc)
 
+    @staticmethod
+    def epub_image_item(image_content: bytes, extension: str) -> epub.EpubItem:
+        """
+        Method creates EPUB image item named by image content hash, so equal images get the same item
+        :param image_content: image file content
+        :param extension: image file extension
+        :return: EPUB image item
+        """
+        image_hash = hashlib.sha256(image_content).hexdigest()
+        return epub.EpubItem(uid=f"image_{image_hash}",
+                             file_name=f"images/{image_hash}{extension}",
+                             content=image_content)
+
+    @classmethod
+    def render_epub_page(cls,
+                         template: jinja2.Template,
+                         page_number: int,
+                         news: dict,
+                         empty_image: epub.EpubItem) -> Tuple[str, epub.EpubItem]:
+        """
+        Method reads document variant of news image and renders EPUB page referencing it
+        :param template: EPUB page template
+        :param page_number: page number in the book
+        :param news: news rendered on the page
+        :param empty_image: image item used if news has no cached image
+        :return: rendered page and page image item
+        """
+        image_file = image_variant(news['img_location'], 'document')
+        # Image could be evicted from the image store since news were cached
+        if image_file != 'Empty' and os.path.isfile(image_file):
+            with open(image_file, 'rb') as image:
+                page_image = cls.epub_image_item(image.read(), os.path.splitext(image_file)[1])
+        else:
+            page_image = empty_image
+        source_html_text = template.render(news=news, page_number=page_number, image_file=page_image.file_name)
+        return source_html_text, page_image
+
     @classmethod
     @func_debug_logger(converter_logger)
-    def convert_to_epub(cls, target_path: str, news_list: Iterable[dict]) -> None:
-        if not os.path.join(target_path).endswith('.epub'):
-            epub_file_name = f"rss_feed_{str(uuid.uuid4())[0:6]}.epub"
-            target_path = os.path.join(target_path, epub_file_name)
+    def convert_to_epub(cls, target_path: str, news_list: Iterable[dict]) -> Optional[str]:
+        target_path = cls.target_file_path(target_path, 'epub')
         try:
             # Setting up an ebook
             book = epub.EpubBook()
@@ -145,9 +250,13 @@ class Converter:
             book.spine = ['cover', 'nav']
             # Table of contents
             toc = []
+            template = cls.setup_jinja('epub_template.html')
+            # Placeholder image is read once and shared by all news without an image
+            with open(os.path.join(Converter.TEMPLATES_LOCATION, 'epub_empty_image.jpg'), 'rb') as image:
+                empty_image = cls.epub_image_item(image.read(), '.jpg')
+            images = {}
             for page_number, news in enumerate(news_list):
-                template = cls.setup_jinja('epub_template.html')
-                source_html_text = template.render(news=news, page_number=page_number)
+                source_html_text, page_image = cls.render_epub_page(template, page_number, news, empty_image)
                 # Adding page to a book via html template
                 book_page = epub.EpubHtml(
                     title=news['title'],
@@ -156,24 +265,16 @@ class Converter:
                 )
                 book_page.content = source_html_text
                 book.add_item(book_page)
-                if news['img_location'] != 'Empty':
-                    with open(news['img_location'], 'rb') as image:
-                        page_image_file = image.read()
-                else:
-                    # Could be done using different template
-                    with open(os.path.join(Converter.TEMPLATES_LOCATION, 'epub_empty_image.jpg'), 'rb') as image:
-                        page_image_file = image.read()
-                page_image = epub.EpubItem(
-                    uid=f"image{page_number}",
-                    file_name=f"image{page_number}",
-                    content=page_image_file
-                )
-                book.add_item(page_image)
+                # Every distinct image is stored once, pages with the same image share it,
+                # placeholder image is stored only if some news has no image
+                images.setdefault(page_image.id, page_image)
                 # Updating book with a page
                 book.spine.append(book_page)
                 # Updating table of contents
                 toc.append(epub.Section(news['title']))
                 toc.append(book_page)
+            for page_image in images.values():
+                book.add_item(page_image)
 
             book.toc = tuple(toc)
             # Setting book navigation
@@ -182,6 +283,7 @@ class Converter:
             # Zipping into a book
             converter_logger.info(f"Rendering EPUB into {target_path}")
             epub.write_epub(target_path, book, {})
+            return target_path
         except FileNotFoundError:
             converter_logger.error(f"Specified path/folder {target_path} doesn't exist or not valid.")
             raise
@@ -41,3 +41,8 @@ class NewsNotFoundError(Exception):
 class WrongPathError(Exception):
     """Error is raised then specified path is not found"""
     pass
+
+
+class ImageRejectedError(Exception):
+    """Raised when downloaded image is not an image or exceeds size limits"""
+    pass
@@ -1,150 +1,318 @@
 """
 Module used for parsing and articles(items) from RSS feed
 """
+import json
 import logging
 from textwrap import TextWrapper
-from typing import Iterable, NoReturn, Optional
+from typing import Iterable, Mapping, NoReturn, Optional
 
 import requests
-from bs4 import BeautifulSoup
-from bs4.element import CData
 from colors import color
 
 from exceptions.custom_exceptions import NotRssFeedUrlError
 from logs.logger import func_debug_logger
+from news_parser.stream_parser import (extract_description, iterparse_items,
+                                       read_channel_title, read_root_tag)
 
 # Module logger setting up
 news_parser_logger = logging.getLogger('app.news_parser_module')
 
+# RSS feed dialects: regular xml feed and feed with HTML (usually under CDATA) in description field
+REGULAR_FEED: str = 'regular'
+NON_XML_FEED: str = 'non_xml'
+# Connect and read timeouts of feed requests, in seconds
+FEED_TIMEOUT: tuple = (5, 30)
 
-def request_url(url: str) -> str:
+
+class FeedDocument:
     """
-    Function requests URL and returns text response if any.
-    :param url: URL to request from
-    :return: requested URL text
+    Class holding RSS feed response fetched only once per run.
+    Validation, feed type checking, header extraction and news parsing
+    read the same response bytes with an incremental parser
     """
-    request = requests.get(url)
-    return request.text
+
+    def __init__(self,
+                 url: str,
+                 content: bytes,
+                 status_code: int,
+                 headers: Optional[Mapping[str, str]] = None,
+                 cache_entry: Optional[dict] = None,
+                 dialect: Optional[str] = None) -> None:
+        """
+        FeedDocument class initializing with response data
+        :param url: RSS feed URL
+        :param content: response body bytes
+        :param status_code: response HTTP status code
+        :param headers: response HTTP headers
+        :param cache_entry: HTTP cache entry of the feed from previous runs, if any
+        :param dialect: feed dialect known from previous runs, detected while parsing if None
+        """
+        self.url = url
+        self.content = content
+        self.status_code = status_code
+        self.headers = headers if headers is not None else {}
+        self.cache_entry = cache_entry
+        self.dialect = dialect
+
+    @classmethod
+    @func_debug_logger(news_parser_logger)
+    def fetch(cls, url: str, cache_entry: Optional[dict] = None, dialect: Optional[str] = None) -> 'FeedDocument':
+        """
+        Requests URL once and wraps the response into FeedDocument.
+        If HTTP cache entry is given, conditional request is sent and
+        cached body is used in case feed was not modified (response 304)
+        :param url: URL to request from
+        :param cache_entry: HTTP cache entry with 'etag', 'last_modified' and 'body' keys
+        :param dialect: feed dialect known from previous runs
+        :return: FeedDocument object
+        :raise: raises multiple requests exceptions if link is broken,
+        requests.exceptions.Timeout if feed is not read within FEED_TIMEOUT
+        """
+        headers = {}
+        if cache_entry is not None:
+            if cache_entry['etag']:
+                headers['If-None-Match'] = cache_entry['etag']
+            if cache_entry['last_modified']:
+                headers['If-Modified-Since'] = cache_entry['last_modified']
+        request = requests.get(url, headers=headers, timeout=FEED_TIMEOUT)
+        if request.status_code == 304 and cache_entry is not None:
+            news_parser_logger.info(f"Feed '{url}' is not modified, using cached response body")
+            return cls(url=url,
+                       content=cache_entry['body'],
+                       status_code=request.status_code,
+                       headers=request.headers,
+                       cache_entry=cache_entry,
+                       dialect=dialect)
+        news_parser_logger.info(f"Fetched {len(request.content)} bytes from '{url}'")
+        return cls(url=url,
+                   content=request.content,
+                   status_code=request.status_code,
+                   headers=request.headers,
+                   cache_entry=cache_entry,
+                   dialect=dialect)
+
+    @property
+    def not_modified(self) -> bool:
+        """
+        Whether feed was not modified since the cached response
+        :return: True if cached response body is used
+        """
+        return self.status_code == 304 and self.cache_entry is not None
+
+    @property
+    def etag(self) -> Optional[str]:
+        """
+        ETag validator of the response or of the cached one
+        :return: ETag header value if any
+        """
+        if self.headers.get('ETag'):
+            return self.headers.get('ETag')
+        return self.cache_entry['etag'] if self.not_modified else None
+
+    @property
+    def last_modified(self) -> Optional[str]:
+        """
+        Last-Modified validator of the response or of the cached one
+        :return: Last-Modified header value if any
+        """
+        if self.headers.get('Last-Modified'):
+            return self.headers.get('Last-Modified')
+        return self.cache_entry['last_modified'] if self.not_modified else None
+
+    def cached_news(self, limit_arg: Optional[int] = None) -> Optional[Iterable[dict]]:
+        """
+        Returns cached parse result if feed was not modified and
+        cached news cover requested limit
+        :param limit_arg: number of news to return in a list
+        :return: list of news as dictionaries or None if they can't be reused
+        """
+        if not self.not_modified or self.cache_entry['news'] is None:
+            return None
+        news_list = json.loads(self.cache_entry['news'])
+        cached_limit = self.cache_entry['news_limit']
+        # Cached news were parsed with a limit, and the feed could have more items
+        if cached_limit is not None and len(news_list) >= cached_limit:
+            if limit_arg is None or limit_arg > cached_limit:
+                return None
+        return news_list[0:limit_arg] if limit_arg else news_list
+
+    @property
+    def root_tag(self) -> Optional[str]:
+        """
+        Document root tag, only the first element of the response is read
+        :return: root tag name or None if response is not XML
+        """
+        return read_root_tag(self.content)
+
+    @property
+    def rss_header(self) -> str:
+        """
+        RSS feed channel title, response is read until the title is found
+        :return: RSS feed header
+        """
+        return read_channel_title(self.content)
 
 
 @func_debug_logger(news_parser_logger)
-def validate_url_is_rss_feed(url: str) -> NoReturn:
+def validate_url_is_rss_feed(feed: FeedDocument) -> NoReturn:
     """
-    Checks the link whether is it leading to RSS feed or not
-    :param url: URL to validate
+    Checks the fetched document whether is it RSS feed or not
+    :param feed: fetched RSS feed document
     :return: None
     :raise NotRssFeedUrlError: if URL is not an RSS feed
     """
-    soup = BeautifulSoup(request_url(url), 'xml')
-    text = soup.find_all('rss')
-    if not text:
-        news_parser_logger.error(f"URL '{url}' doesn't lead to RSS feed")
+    if feed.not_modified:
+        news_parser_logger.info(f"URL '{feed.url}' is not modified, cached RSS feed was already validated")
+        return
+    if feed.root_tag != 'rss':
+        news_parser_logger.error(f"URL '{feed.url}' doesn't lead to RSS feed")
         raise NotRssFeedUrlError
-    news_parser_logger.info(f"URL '{url}' is valid RSS feed")
+    news_parser_logger.info(f"URL '{feed.url}' is valid RSS feed")
 
 
-@func_debug_logger(news_parser_logger)
-def rss_feed_type_checker(url: str) -> bool:
+def detect_feed_dialect(item: dict) -> str:
     """
     Trying to separate RSS feeds with CDATA in description field
     with image links inside (mixed xml) and RSS feeds with plain description.
-    In the first case we will use "html.parser", in the second case 'lxml' parser.
-    Unfortunately, I haven't found any 'good enough' method to separate them, except this
-    solution via BeautifulSoup error raising
-    :param url: URL to RSS feed
+    Description of an item (the first one while parsing) is checked for a link inside it,
+    in that case description is treated as HTML for every item of the feed.
+    :param item: item fields from incremental parser
+    :return: NON_XML_FEED if description contains HTML with a link, REGULAR_FEED otherwise
+    """
+    if item['description'] and extract_description(item['description']).has_link:
+        news_parser_logger.info("RSS feed description field contains non-XML data")
+        return NON_XML_FEED
+    news_parser_logger.info(f"Regular RSS feed found")
+    return REGULAR_FEED
+
+
+@func_debug_logger(news_parser_logger)
+def rss_feed_type_checker(feed: FeedDocument) -> bool:
+    """
+    Checks RSS feed dialect, only the first item is read if dialect is not known yet
+    :param feed: fetched RSS feed document
     :return: True if RSS feed contains nonXML data, False if plain xml
     """
     try:
-        # Attempt to parse non-XMl data
-        soup = BeautifulSoup(request_url(url), 'html.parser')
-        description_soup = BeautifulSoup(
-            soup.find('item').find('description').find(text=lambda x: isinstance(x, CData)), 'html.parser'
-        )
-        # img_link = soup_test_2.find('img').get('src')
-        link_inside = description_soup.find('a')
-        if link_inside:
-            news_parser_logger.info("RSS feed description field contains non-XML data")
-            return True
-    # If attempt to find a link inside description field fails:
-    except AttributeError:
-        news_parser_logger.info(f"Regular RSS feed found")
-        return False
+        if feed.dialect is None:
+            for item in iterparse_items(feed.content, limit_arg=1):
+                feed.dialect = detect_feed_dialect(item)
+        return feed.dialect == NON_XML_FEED
     # In case missed something
     except Exception as exc:
         news_parser_logger.info(f"Exception from 'rss_feed_type_checker' func: {exc}")
         return False
 
 
-@func_debug_logger(news_parser_logger)
-def parse_rss_feed_with_non_xml(url: str, limit_arg: Optional[int] = None) -> Iterable[dict]:
+def news_from_non_xml_item(url: str, item: dict) -> dict:
     """
-    Function parses rss feed and returns list of news.
-    Parser used for RSS feed with CDATA under description tag
+    Function creates news from RSS feed item with CDATA under description tag,
+    description HTML is read with a light extractor instead of building a tree
+    :param url: URL to RSS feed
+    :param item: item fields from incremental parser
+    :return: news as dictionary
+    """
+    description = extract_description(item['description'] or '')
+    return {
+        'url': url,
+        'rss_header': item['rss_header'] or "Empty",
+        'title': item['title'] or "Empty",
+        'description': description.text or "Empty",
+        'pubdate': item['pubdate'] or "Empty",
+        'pubdate_format': 'Empty',
+        'link': item['link'].strip() if item['link'] else "Empty",
+        'img_link': description.img_link or "Empty",
+        'img_location': 'Empty'
+    }
+
+
+def news_from_regular_item(url: str, item: dict) -> dict:
+    """
+    Function creates news from regular xml RSS feed item
     :param url: URL to RSS feed
+    :param item: item fields from incremental parser
+    :return: news as dictionary
+    """
+    return {
+        'url': url,
+        'rss_header': item['rss_header'] or "Empty",
+        'title': item['title'] or "Empty",
+        'description': item['description'] if item['description'] is not None else "Empty",
+        'pubdate': item['pubdate'] or "Empty",
+        'pubdate_format': 'Empty',
+        'link': item['link'] or "Empty",
+        'img_link': item['img_link'] or "Empty",
+        'img_location': 'Empty'
+    }
+
+
+@func_debug_logger(news_parser_logger)
+def parse_rss_items(feed: FeedDocument,
+                    limit_arg: Optional[int] = None,
+                    dialect: Optional[str] = None) -> Iterable[dict]:
+    """
+    Function parses rss feed in a single pass and returns list of news.
+    If dialect is not given, it is decided by the first item and stored in the feed document
+    :param feed: fetched RSS feed document
     :param limit_arg: number of news to return in a list
+    :param dialect: NON_XML_FEED or REGULAR_FEED, detected while parsing if None
     :return: list of news as dictionaries
     """
-    soup = BeautifulSoup(request_url(url), 'html.parser')
-    # Looking for the top rss header title
-    rss_header = soup.channel.title.text
-    # Selecting all items of RSS feed with limit argument
-    rss_news_limited = soup.find_all('item', limit=limit_arg)
     news_list = []
-    for item in rss_news_limited:
-        # Generating new soup for second parsing iteration under description tag
-        new_soup = BeautifulSoup(item.find('description').find(text=lambda x: isinstance(x, CData)),
-                                 'html.parser')
-        news = {
-             'url': url,
-             'rss_header': rss_header,
-             'title': item.title.text,
-             'description': new_soup.p.text,
-             'pubdate': item.pubdate.text if item.pubdate is not None else "Empty",
-             'pubdate_format': 'Empty',
-             'link': item.link.next_sibling.strip(),
-             'img_link': new_soup.img.get('src') if new_soup.img is not None else "Empty",
-             'img_location': 'Empty'
-        }
-        news_list.append(news)
-    news_parser_logger.info(f"News successfully parsed from {url}")
+    # Items are read one by one, reading stops when limit is reached
+    for item in iterparse_items(feed.content, limit_arg=limit_arg):
+        if dialect is None:
+            dialect = feed.dialect = detect_feed_dialect(item)
+        if dialect == NON_XML_FEED:
+            news_list.append(news_from_non_xml_item(feed.url, item))
+        else:
+            news_list.append(news_from_regular_item(feed.url, item))
+    news_parser_logger.info(f"News successfully parsed from {feed.url}")
     return news_list
 
 
-@func_debug_logger(news_parser_logger)
-def parse_rss_feed_regularly(url: str, limit_arg: Optional[int] = None) -> Iterable[dict]:
+def parse_rss_feed_with_non_xml(feed: FeedDocument, limit_arg: Optional[int] = None) -> Iterable[dict]:
+    """
+    Function parses rss feed and returns list of news.
+    Parser used for RSS feed with CDATA under description tag
+    :param feed: fetched RSS feed document
+    :param limit_arg: number of news to return in a list
+    :return: list of news as dictionaries
+    """
+    return parse_rss_items(feed=feed, limit_arg=limit_arg, dialect=NON_XML_FEED)
+
+
+def parse_rss_feed_regularly(feed: FeedDocument, limit_arg: Optional[int] = None) -> Iterable[dict]:
     """
     Function parses rss feed and returns list of news.
     Parser used for regular xml RSS feed.
-    :param url: URL to RSS feed
+    :param feed: fetched RSS feed document
     :param limit_arg: number of news to return in a list
     :return: list of news as dictionaries
     """
-    soup = BeautifulSoup(request_url(url), 'xml')
-    # Looking for the top rss header
-    rss_header = soup.channel.title.text
-    # Selecting all items of RSS feed
-    rss_news_limited = soup.find_all('item', limit=limit_arg)
-    news_list = []
-    for item in rss_news_limited:
-        news = {
-            'url': url,
-            'rss_header': rss_header,
-            'title': item.title.text,
-            'description': item.description.text if item.description is not None else "Empty",
-            'pubdate': item.pubDate.text if item.pubDate is not None else "Empty",
-            'pubdate_format': 'Empty',
-            'link': item.link.text,
-            'img_link': item.find('media:content').get('url') if item.find('media:content') is not None else "Empty",
-            'img_location': 'Empty'
-        }
-        news_list.append(news)
-    news_parser_logger.info(f"News successfully parsed from {url}")
-    return news_list
+    return parse_rss_items(feed=feed, limit_arg=limit_arg, dialect=REGULAR_FEED)
+
+
+@func_debug_logger(news_parser_logger)
+def parse_rss_feed(feed: FeedDocument, limit_arg: Optional[int] = None) -> Iterable[dict]:
+    """
+    Function returns list of news of RSS feed, reusing cached parse result
+    if feed was not modified, otherwise parsing it in a single pass
+    with known or detected on the fly feed dialect
+    :param feed: fetched RSS feed document
+    :param limit_arg: number of news to return in a list
+    :return: list of news as dictionaries
+    """
+    news_list = feed.cached_news(limit_arg)
+    if news_list is not None:
+        news_parser_logger.info(f"News from {feed.url} are taken from HTTP cache")
+        return news_list
+    return parse_rss_items(feed=feed, limit_arg=limit_arg, dialect=feed.dialect)
 
 
 def pretty_print_out(news_list: Iterable[dict], colorize: Optional[bool] = False) -> None:
     """
-    Prints out news RSS feed in human-readable format
+    Prints out news RSS feed in human-readable format, news of several feeds are split by feed
     :param colorize: bool, True if colorize output to stdout
     :param news_list: list of RSS item as dictionary
     :return: None, just prints out items or exception message
@@ -152,9 +320,13 @@ def pretty_print_out(news_list: Iterable[dict], colorize: Optional[bool] = False
     wrap_text_box = TextWrapper(width=110)
     if news_list:
         news_parser_logger.info("Printing out articles:")
-        print(color(f"Feed: {news_list[0]['rss_header']}", bg='yellow' if colorize else 0))
-        print()
+        current_feed = None
         for news in news_list:
+            # News of several feeds are printed out split by feed headers
+            if (news['url'], news['rss_header']) != current_feed:
+                current_feed = (news['url'], news['rss_header'])
+                print(color(f"Feed: {news['rss_header']}", bg='yellow' if colorize else 0))
+                print()
             print(
                 color(f"Title: {news['title']}", bg='blue' if colorize else 0) + '\n' +
                 color(f"Date: {news['pubdate']}", bg='red' if colorize else 0) + '\n' + '\n' +
@@ -0,0 +1,198 @@
+"""
+Module used for incremental parsing of fetched RSS feed, reading items one by one
+without building a tree of the whole document
+"""
+import logging
+from html.parser import HTMLParser
+from io import BytesIO
+from typing import Iterator, List, Optional
+
+from lxml import etree
+
+from logs.logger import func_debug_logger
+
+# Module logger setting up
+stream_parser_logger = logging.getLogger('app.stream_parser_module')
+
+# Namespace of 'media:content' tag holding item image link
+MEDIA_CONTENT_TAG: str = '{http://search.yahoo.com/mrss/}content'
+
+
+class DescriptionExtractor(HTMLParser):
+    """
+    Class extracting first paragraph text, first image link and links presence
+    from HTML inside item description, without building an HTML tree
+    """
+
+    def __init__(self) -> None:
+        """
+        DescriptionExtractor class initializing
+        """
+        super().__init__(convert_charrefs=True)
+        self.paragraph: Optional[str] = None
+        self.img_link: Optional[str] = None
+        self.has_link: bool = False
+        self.text_parts = []
+        self._paragraph_parts = []
+        self._paragraph_depth = 0
+
+    def handle_starttag(self, tag: str, attrs: list) -> None:
+        if tag == 'p' and self.paragraph is None:
+            self._paragraph_depth += 1
+        elif tag == 'img' and self.img_link is None:
+            self.img_link = dict(attrs).get('src')
+        elif tag == 'a':
+            self.has_link = True
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag == 'p' and self._paragraph_depth:
+            self._paragraph_depth -= 1
+            if not self._paragraph_depth:
+                self.paragraph = ''.join(self._paragraph_parts)
+
+    def handle_data(self, data: str) -> None:
+        self.text_parts.append(data)
+        if self._paragraph_depth:
+            self._paragraph_parts.append(data)
+
+    def close(self) -> None:
+        super().close()
+        # Paragraph which was not closed lasts till the end of description
+        if self._paragraph_depth:
+            self.paragraph = ''.join(self._paragraph_parts)
+
+    @property
+    def text(self) -> str:
+        """
+        First paragraph text, or the whole description text if there are no paragraphs
+        :return: description text
+        """
+        return self.paragraph if self.paragraph is not None else ''.join(self.text_parts).strip()
+
+
+def extract_description(description_html: str) -> DescriptionExtractor:
+    """
+    Function runs DescriptionExtractor over item description HTML
+    :param description_html: HTML from description tag (usually under CDATA)
+    :return: DescriptionExtractor with extracted data
+    """
+    extractor = DescriptionExtractor()
+    extractor.feed(description_html)
+    extractor.close()
+    return extractor
+
+
+def _local_name(element: etree._Element) -> str:
+    """
+    Returns tag name of element without namespace
+    :param element: lxml element
+    :return: local tag name
+    """
+    return etree.QName(element).localname
+
+
+def _is_channel_title(element: etree._Element) -> bool:
+    """
+    Checks whether element is RSS channel title
+    :param element: lxml element
+    :return: True if element is channel title
+    """
+    parent = element.getparent()
+    return _local_name(element) == 'title' and parent is not None and _local_name(parent) == 'channel'
+
+
+def _iterparse(content: bytes, events: tuple) -> Iterator[tuple]:
+    """
+    Incremental XML parser over document bytes, tolerant to broken markup
+    :param content: document bytes
+    :param events: parser events to yield
+    :return: iterator over (event, element) tuples
+    """
+    return etree.iterparse(BytesIO(content), events=events, recover=True, huge_tree=True, resolve_entities=False)
+
+
+@func_debug_logger(stream_parser_logger)
+def read_root_tag(content: bytes) -> Optional[str]:
+    """
+    Reads only the first element of a document
+    :param content: document bytes
+    :return: root tag name without namespace or None if document is not XML
+    """
+    try:
+        for _, element in _iterparse(content, events=('start',)):
+            return _local_name(element)
+    except etree.XMLSyntaxError:
+        stream_parser_logger.error("Document is not an XML")
+    return None
+
+
+@func_debug_logger(stream_parser_logger)
+def read_channel_title(content: bytes) -> Optional[str]:
+    """
+    Reads a document until RSS channel title is found
+    :param content: RSS feed bytes
+    :return: RSS channel title or None if not found
+    """
+    try:
+        for _, element in _iterparse(content, events=('end',)):
+            if _is_channel_title(element):
+                return ''.join(element.itertext())
+    except etree.XMLSyntaxError:
+        stream_parser_logger.error("Document is not an XML")
+    return None
+
+
+def iterparse_items(content: bytes, limit_arg: Optional[int] = None) -> Iterator[dict]:
+    """
+    Generator yielding RSS feed items fields one by one. Fetched document is parsed incrementally,
+    parsing stops as soon as limit is reached and processed elements are cleared, so the parsed tree
+    doesn't grow with a feed size. Response body itself is read in full, it is kept in HTTP cache
+    :param content: RSS feed bytes
+    :param limit_arg: number of items to yield
+    :return: iterator over dictionaries with 'rss_header', 'title', 'description', 'pubdate', 'link'
+    and 'img_link' keys, values are None if item doesn't have such a field
+    """
+    rss_header = None
+    items_count = 0
+    for _, element in _iterparse(content, events=('end',)):
+        if rss_header is None and _is_channel_title(element):
+            rss_header = ''.join(element.itertext())
+        elif _local_name(element) == 'item':
+            fields = {'rss_header': rss_header, 'title': None, 'description': None, 'pubdate': None, 'link': None}
+            for child in element:
+                # Skipping comments and prefixed extension tags like 'media:title'
+                if not isinstance(child.tag, str) or child.prefix is not None:
+                    continue
+                child_tag = _local_name(child)
+                if child_tag == 'pubDate':
+                    fields['pubdate'] = ''.join(child.itertext())
+                elif child_tag in ('title', 'description', 'link'):
+                    fields[child_tag] = ''.join(child.itertext())
+            media_content = element.find(f".//{MEDIA_CONTENT_TAG}")
+            fields['img_link'] = media_content.get('url') if media_content is not None else None
+            yield fields
+            items_count += 1
+            # Free processed item and everything before it
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+            if limit_arg and items_count >= limit_arg:
+                stream_parser_logger.info(f"Limit of {limit_arg} items reached, stop reading the feed")
+                return
+
+
+@func_debug_logger(stream_parser_logger)
+def read_opml_urls(content: bytes) -> List[str]:
+    """
+    Reads RSS URLs from 'xmlUrl' attributes of OPML outlines
+    :param content: OPML document bytes
+    :return: list of RSS URLs in document order
+    """
+    urls = []
+    try:
+        for _, element in _iterparse(content, events=('end',)):
+            if _local_name(element) == 'outline' and element.get('xmlUrl'):
+                urls.append(element.get('xmlUrl').strip())
+    except etree.XMLSyntaxError:
+        stream_parser_logger.error("OPML document is not an XML")
+    return urls
@@ -1,25 +1,87 @@
 """
 Module used for parsing arguments from CLI and as entry point of a program
 """
-import os
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Optional, Tuple
 
 import requests
 
 from argument_parser.argument_parser import (check_internet_connection,
                                              create_arg_parser,
+                                             read_sources_file,
+                                             validate_date_arg,
                                              validate_limit_arg,
                                              validate_source)
 from caching.caching import DATABASE_FILE, DataBaseHandler
+from caching.caching_files import ConvertedFileCache
 from caching.caching_images import ImageHandler
 from converters.converter import Converter
 from exceptions import custom_exceptions
 from logs.logger import setup_app_logger
-from news_parser.news_parser import (parse_rss_feed_regularly,
-                                     parse_rss_feed_with_non_xml,
-                                     pretty_print_out, rss_feed_type_checker,
+from news_parser.news_parser import (FeedDocument, parse_rss_feed,
+                                     pretty_print_out,
                                      validate_url_is_rss_feed)
 
+SECONDS_IN_DAY: int = 24 * 60 * 60
+
+
+def read_feed(source: str,
+              limit: Optional[int] = None,
+              cache_entry: Optional[dict] = None,
+              dialect: Optional[str] = None) -> Tuple[FeedDocument, Iterable[dict]]:
+    """
+    Fetches RSS feed once, validates it and parses news from it.
+    Used by worker threads, so it doesn't touch the database
+    :param source: RSS URL
+    :param limit: number of news to parse
+    :param cache_entry: HTTP cache entry of the feed if any
+    :param dialect: feed dialect known from previous runs if any
+    :return: fetched feed document and list of parsed news
+    """
+    feed = FeedDocument.fetch(source, cache_entry, dialect)
+    validate_source(feed)
+    validate_url_is_rss_feed(feed)
+    # Parse news, cached parse result is reused if the feed was not modified,
+    # feed dialect is detected on the fly if it is not known from previous runs
+    news_list = parse_rss_feed(
+        feed=feed,
+        limit_arg=limit
+    )
+    return feed, news_list
+
+
+def source_error_message(source: str, exc: Exception) -> str:
+    """
+    Creates human-readable error message for a source which failed to be read
+    :param source: RSS URL
+    :param exc: raised exception
+    :return: error message
+    """
+    if isinstance(exc, custom_exceptions.NotRssFeedUrlError):
+        return f"Error. URL source '{source}' doesn't lead to RSS feed"
+    if isinstance(exc, custom_exceptions.BlockedRequestError):
+        return f"{source} blocked request on a server side"
+    if isinstance(exc, custom_exceptions.PageNotFoundError):
+        return f"Page {source} not found"
+    if isinstance(exc, requests.exceptions.Timeout):
+        return f"Source {source} did not respond in time"
+    # Broken links will raise multiple errors while fetching a feed
+    return f"Link is broken or source is missing. Check error:{exc.__doc__}"
+
+
+def cache_news_images(news_list: Iterable[dict]) -> None:
+    """
+    Downloads and resizes images of the news, news are updated with cached image locations.
+    Images are used by HTML, PDF and EPUB converters only, so they are cached when a converter needs them
+    :param news_list: parsed news
+    :return: None
+    """
+    cache_images = ImageHandler(news_list)
+    cache_images.download_images_concurrently()
+    cache_images.resize_cached_images_concurrently()
+
 
 def main() -> None:
     """
@@ -46,97 +108,165 @@ def main() -> None:
             # Setting limit argument to an integer
             args.limit = int(args.limit)
 
+    # Validate date range arguments, range end date is included
+    pubdate_from = pubdate_to = None
+    try:
+        if args.date_from:
+            pubdate_from = validate_date_arg(args.date_from)
+        if args.date_to:
+            pubdate_to = validate_date_arg(args.date_to) + SECONDS_IN_DAY
+    except ValueError:
+        sys.exit("Error. Date range arguments should be dates in YYYYMMDD format")
+    if args.offset < 0:
+        sys.exit(f"Error. Offset argument '{args.offset}' is negative. Please enter zero or a positive integer")
+    # News are read from cache if any date or search argument is given
+    read_from_cache = bool(args.date or args.date_from or args.date_to or args.search)
+
+    # Collecting RSS sources from CLI and sources file
+    sources = list(args.source)
+    if args.sources_file:
+        try:
+            sources.extend(read_sources_file(args.sources_file))
+        except OSError:
+            sys.exit(f"Sources file {args.sources_file} doesn't exist or can't be read")
+    # Skipping repeated sources, keeping the order
+    sources = list(dict.fromkeys(sources))
+
     # Check internet connection. Decided to do separately, due to
     # some interference with further validators and requests.exceptions.ConnectionError
-    if not args.date:
+    if not read_from_cache:
+        if not sources:
+            sys.exit("Link is broken or source is missing. Pass RSS URL or 'sources-file' argument")
         try:
             check_internet_connection()
-        except requests.exceptions.ConnectionError:
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
             sys.exit("No internet connection. Pass 'date' argument to get news from local cache")
 
-    # Validate URL and if it is leading to RSS feed
-    if not args.date:
-        try:
-            validate_source(args.source)
-            validate_url_is_rss_feed(args.source)
-        except custom_exceptions.NotRssFeedUrlError:
-            sys.exit(f"Error. URL source '{args.source}' doesn't lead to RSS feed")
-        except custom_exceptions.BlockedRequestError:
-            sys.exit(f"{args.source} blocked request on a server side")
-        except custom_exceptions.PageNotFoundError:
-            sys.exit(f"Page {args.source} not found")
-        # Broken links will raise multiple errors in 'validate source' func
-        # which are caught here
-        except Exception as exc:
-            sys.exit(f"Link is broken or source is missing. Check error:{exc.__doc__}")
-
-    # Creating db file if it doesn't exist
-    if not os.path.isfile(DATABASE_FILE):
+    # Creating db file and tables if they don't exist
+    with DataBaseHandler(DATABASE_FILE) as db:
+        db.create_table_cached_news()
+        db.create_table_http_cache()
+        db.create_table_feed_dialects()
+
+    # If no date argument is parsed get news from internet and insert them into the database
+    if not read_from_cache:
         with DataBaseHandler(DATABASE_FILE) as db:
-            db.create_table_cached_news()
-
-    # If args.date is not parsed get news from internet and insert them into the database
-    if not args.date:
-        # Check the type of RSS feed
-        rss_type = rss_feed_type_checker(args.source)
-        if rss_type:
-            news_list = parse_rss_feed_with_non_xml(
-                url=args.source,
-                limit_arg=args.limit
-            )
-        else:
-            news_list = parse_rss_feed_regularly(
-                url=args.source,
-                limit_arg=args.limit
-            )
-        # Cache images from parsed news for further offline news format converters
-        cache_images = ImageHandler(news_list)
-        cache_images.download_images_concurrently()
-        cache_images.resize_cached_images_concurrently()
-        # Insert parsed news into a database
+            cache_entries = {source: db.read_http_cache(source) for source in sources}
+            dialects = {source: db.read_feed_dialect(source) for source in sources}
+        # Fetch each RSS feed once (conditionally, if it is in HTTP cache), validate and parse it.
+        # Feeds are read concurrently by a bounded pool of worker threads
+        feeds = []
+        with ThreadPoolExecutor(max_workers=max(1, min(args.workers, len(sources)))) as executor:
+            futures = [
+                executor.submit(read_feed, source, args.limit, cache_entries[source], dialects[source])
+                for source in sources
+            ]
+            for source, future in zip(sources, futures):
+                try:
+                    feeds.append(future.result())
+                except Exception as exc:
+                    # Single source run stops on error, several sources are read despite broken ones
+                    if len(sources) == 1:
+                        sys.exit(source_error_message(source, exc))
+                    print(source_error_message(source, exc), file=sys.stderr)
+        if not feeds:
+            sys.exit("No news were read from given sources")
+        news_list = [news for _, feed_news_list in feeds for news in feed_news_list]
+        # Insert parsed news of all feeds into a database, store responses in HTTP cache
+        # and detected feed dialects in a single write phase
         with DataBaseHandler(DATABASE_FILE) as db:
             db.insert_into_table_cached_news(news_list)
+            for feed, feed_news_list in feeds:
+                db.insert_into_table_http_cache(feed, feed_news_list, args.limit)
+                if dialects[feed.url] is None:
+                    db.insert_into_table_feed_dialects(feed.url, feed.dialect)
+
+    # If search query parsed from CLI, search news in cache, best matches first
+    if args.search:
+        try:
+            with DataBaseHandler(DATABASE_FILE) as db:
+                news_list = db.search_cached_news(
+                    search_query=args.search,
+                    sources=sources,
+                    pubdate_from=pubdate_from,
+                    pubdate_to=pubdate_to,
+                    limit=args.limit,
+                    offset=args.offset)
+        except custom_exceptions.NewsNotFoundError as exc:
+            sys.exit(exc)
+
+    # If date range parsed from CLI, get news published within it from cache, newest first
+    elif args.date_from or args.date_to:
+        try:
+            with DataBaseHandler(DATABASE_FILE) as db:
+                news_list = db.read_table_by_pubdate_range(
+                    pubdate_from=pubdate_from,
+                    pubdate_to=pubdate_to,
+                    sources=sources,
+                    limit=args.limit)
+        except custom_exceptions.NewsNotFoundError as exc:
+            sys.exit(exc)
 
     # If args.date parsed from CLI, get news from cache
-    if args.date:
+    elif args.date:
         try:
-            if not args.source:
+            if not sources:
                 with DataBaseHandler(DATABASE_FILE) as db:
                     news_list = db.read_table_by_pubdate(
                         pubdate=args.date,
                         limit=args.limit)
             else:
+                news_list = []
                 with DataBaseHandler(DATABASE_FILE) as db:
-                    news_list = db.read_table_by_pubdate_source(
-                        pubdate=args.date,
-                        source=args.source,
-                        limit=args.limit)
+                    for source in sources:
+                        try:
+                            news_list.extend(db.read_table_by_pubdate_source(
+                                pubdate=args.date,
+                                source=source,
+                                limit=args.limit))
+                        except custom_exceptions.NewsNotFoundError as exc:
+                            # Single source run stops if there are no news, several sources are read further
+                            if len(sources) == 1:
+                                raise
+                            print(exc, file=sys.stderr)
+                if not news_list:
+                    raise custom_exceptions.NewsNotFoundError(
+                        f"No news from given sources published on {args.date} in cache found")
         except custom_exceptions.NewsNotFoundError as exc:
             sys.exit(exc)
 
-    # Convert to HTML
-    if args.path_html:
-        try:
-            Converter.convert_to_html(args.path_html, news_list)
-        except FileNotFoundError:
-            sys.exit(f"Specified path/folder {args.path_epub} doesn't exist.")
+    # Converted files are copied from cache if the same news were converted before
+    converted_file_cache = ConvertedFileCache()
+    converted_formats = [(file_format, path) for file_format, path in (('html', args.path_html),
+                                                                       ('pdf', args.path_pdf),
+                                                                       ('epub', args.path_epub)) if path]
 
-    # Convert to PDF
-    if args.path_pdf:
-        try:
-            Converter.convert_to_pdf(args.path_pdf, news_list)
-        except FileNotFoundError:
-            sys.exit(f"Specified path/folder {args.path_epub} doesn't exist.")
+    # Images are cached only if news are converted into a format showing them. Converted files are looked up
+    # with images already in the store first, so images are downloaded only if some file isn't in the cache.
+    # Otherwise images are prefetched in background on demand, for further offline conversions of news read from cache
+    if converted_formats:
+        ImageHandler(news_list).use_stored_images()
+        if any(converted_file_cache.get(converted_file_cache.cache_key(file_format, news_list), file_format) is None
+               for file_format, _ in converted_formats):
+            cache_news_images(news_list)
+    elif args.prefetch_images:
+        # News are copied, so their printing isn't affected by updated image locations
+        threading.Thread(target=cache_news_images,
+                         args=([dict(news) for news in news_list],),
+                         name="image-prefetch").start()
 
-    # Convert to EPUB
-    if args.path_epub:
+    # Convert to HTML, PDF and EPUB
+    for file_format, path in converted_formats:
         try:
-            Converter.convert_to_epub(args.path_epub, news_list)
+            converted_file_cache.convert(file_format, path, news_list)
         except FileNotFoundError:
-            sys.exit(f"Specified path/folder {args.path_epub} doesn't exist.")
+            sys.exit(f"Specified path/folder {path} doesn't exist.")
 
-    # Convert to JSON or pretty print
-    if args.json:
+    # Convert to JSON Lines, JSON or pretty print
+    if args.json_lines:
+        for line in Converter.iter_json_lines(news_list, args.colorize):
+            sys.stdout.write(line)
+    elif args.json:
         print(Converter.convert_to_json(news_list, args.colorize))
     else:
         pretty_print_out(news_list, args.colorize)
@@ -15,7 +15,6 @@ setup(
     python_requires=">=3.9",
     install_requires=[
         "requests",
-        "beautifulsoup4",
         "lxml",
         "python-dateutil",
         "fpdf2",
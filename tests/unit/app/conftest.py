@@ -0,0 +1,46 @@
+"""
+Web application modules are imported from 'app' folder. Its 'database' module connects to Postgres
+when imported, so tests use in-memory SQLite database with the same declarative base instead
+"""
+import os
+import sys
+import types
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..', '..', 'app'))
+
+engine = create_engine('sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool)
+database = types.ModuleType('database')
+database.engine = engine
+database.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+database.Base = declarative_base()
+sys.modules['database'] = database
+
+
+@compiles(TSVECTOR, 'sqlite')
+def compile_tsvector(type_, compiler, **kw):
+    return 'TEXT'
+
+
+@event.listens_for(engine, 'connect')
+def register_functions(connection, connection_record):
+    # Search vector column is generated with Postgres full-text search function
+    connection.create_function('to_tsvector', 2, lambda config, document: document, deterministic=True)
+
+
+@pytest.fixture
+def db():
+    from models import models
+    models.Base.metadata.create_all(bind=engine)
+    session = database.SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        models.Base.metadata.drop_all(bind=engine)
@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from crud import crud
+from errors import exception_handler
+from models import models
+
+
+def add_news(db, pubdates):
+    rss = models.Rss(rss_url='https://example.com/rss', rss_header='Example')
+    db.add(rss)
+    db.flush()
+    db.add_all([models.News(rss_source=rss.id, title=f'News {index}', pubdate_ts=pubdate)
+                for index, pubdate in enumerate(pubdates)])
+    db.commit()
+
+
+def page_titles(page):
+    return [news.title for news in page['news_list']]
+
+
+def test_news_pages_by_id(db):
+    add_news(db, [None] * 5)
+    first_page = crud.get_news_page(crud.query_news(db=db), page_size=2)
+    assert page_titles(first_page) == ['News 4', 'News 3'] and first_page['prev_cursor'] is None
+    second_page = crud.get_news_page(crud.query_news(db=db), page_size=2, after=first_page['next_cursor'])
+    assert page_titles(second_page) == ['News 2', 'News 1']
+    last_page = crud.get_news_page(crud.query_news(db=db), page_size=2, after=second_page['next_cursor'])
+    assert page_titles(last_page) == ['News 0'] and last_page['next_cursor'] is None
+    # Previous pages are the same as pages read forwards
+    assert crud.get_news_page(crud.query_news(db=db), page_size=2, before=last_page['prev_cursor']) == second_page
+    assert crud.get_news_page(crud.query_news(db=db), page_size=2, before=second_page['prev_cursor']) == first_page
+
+
+def test_news_pages_by_pubdate(db):
+    start = datetime(2022, 4, 17)
+    # News published at the same time are ordered by id, news without publication date are skipped
+    add_news(db, [start, None, start + timedelta(days=1), start, None])
+    news_query = crud.query_news(db=db)
+    first_page = crud.get_news_page(news_query, order=crud.ORDER_BY_PUBDATE, page_size=2)
+    assert page_titles(first_page) == ['News 2', 'News 3']
+    last_page = crud.get_news_page(news_query, order=crud.ORDER_BY_PUBDATE, page_size=2,
+                                   after=first_page['next_cursor'])
+    assert page_titles(last_page) == ['News 0'] and last_page['next_cursor'] is None
+    assert crud.get_news_page(news_query, order=crud.ORDER_BY_PUBDATE, page_size=2,
+                              before=last_page['prev_cursor']) == first_page
+    last_news = last_page['news_list'][0]
+    assert crud._decode_cursor(crud._encode_cursor(last_news, crud.ORDER_BY_PUBDATE), crud.ORDER_BY_PUBDATE) == \
+        [last_news.pubdate_ts, last_news.id]
+
+
+@pytest.mark.parametrize('cursor, order', [('not a cursor', crud.ORDER_BY_ID),
+                                           ('WyJhIl0=', crud.ORDER_BY_ID),
+                                           ('eyJpZCI6IDF9', crud.ORDER_BY_ID),
+                                           ('WzFd', crud.ORDER_BY_PUBDATE)])
+def test_not_valid_cursor(cursor, order):
+    with pytest.raises(exception_handler.NotValidCursor):
+        crud._decode_cursor(cursor, order)
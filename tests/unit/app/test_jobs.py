@@ -0,0 +1,28 @@
+import asyncio
+
+from services.jobs import ConversionQueue
+
+
+def test_queue_loop_survives_failed_iteration(monkeypatch):
+    queue = ConversionQueue(tick=0)
+    claims = []
+
+    def claim_next_job():
+        claims.append(len(claims))
+        if len(claims) == 1:
+            raise ConnectionError('database is unavailable')
+        return None
+
+    monkeypatch.setattr(queue, '_requeue_jobs', lambda claimed_by=None: None)
+    monkeypatch.setattr(queue, '_renew_leases', lambda job_ids: None)
+    monkeypatch.setattr(queue, '_claim_next_job', claim_next_job)
+    monkeypatch.setattr(queue, '_start_workers', lambda: None)
+
+    async def run_queue():
+        queue.start()
+        while len(claims) < 3:
+            await asyncio.sleep(0)
+        assert queue.is_running
+        await queue.stop()
+
+    asyncio.run(run_queue())
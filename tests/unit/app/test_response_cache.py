@@ -0,0 +1,58 @@
+import time
+
+import pytest
+from starlette.requests import Request
+
+from services.response_cache import MemoryBackend, ResponseCache, SQLiteBackend, news_tag, news_tags
+from services.responses import cached_content_response
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def backend(request, tmp_path):
+    if request.param == 'sqlite':
+        return SQLiteBackend(str(tmp_path / 'responses.db'), max_size=2)
+    return MemoryBackend(max_size=2)
+
+
+def test_response_cache_lru_and_ttl(backend):
+    cache = ResponseCache(backend, ttl=60)
+    for key in ('first', 'second'):
+        cache.put(key, {news_tag()}, key.encode(), 'text/html')
+        # Database backend orders responses by access time
+        time.sleep(0.01)
+    # First response becomes the most recently used one, second is evicted
+    assert cache.get('first')['body'] == b'first'
+    time.sleep(0.01)
+    cache.put('third', {news_tag()}, b'third', 'text/html')
+    assert cache.get('second') is None
+    assert [cache.get(key)['body'] for key in ('first', 'third')] == [b'first', b'third']
+    # Expired responses are not served
+    cache.ttl = -1
+    cache.put('expired', {news_tag()}, b'expired', 'text/html')
+    assert cache.get('expired') is None
+
+
+def test_response_cache_invalidation_by_tags(backend):
+    cache = ResponseCache(backend, ttl=60)
+    cache.put('source', {news_tag(source='https://example.com/rss')}, b'source', 'text/html')
+    cache.put('date', {news_tag(pubdate='20220417')}, b'date', 'application/json')
+    # Tags are matched as a whole, not as a part of another tag
+    cache.invalidate({news_tag(pubdate='2022041'), news_tag(source='https://example.com/rs')})
+    assert cache.get('source') is not None and cache.get('date')['media_type'] == 'application/json'
+    # News added to another source on the date invalidate responses of the date, but not of the source
+    cache.invalidate(news_tags([('https://example.org/rss', '20220417')]))
+    assert cache.get('source') is not None and cache.get('date') is None
+    cache.invalidate(news_tags([('https://example.com/rss', None)]))
+    assert cache.get('source') is None
+
+
+def test_response_key_and_conditional_request():
+    assert ResponseCache.key('GET /news', limit_arg=10, after=None, date_from='20220417') == \
+        'GET /news?date_from=20220417&limit_arg=10'
+    cached_response = ResponseCache(MemoryBackend()).put('page', set(), b'<html></html>', 'text/html')
+    etag = f'"{cached_response["etag"]}"'
+    response = cached_content_response(Request({'type': 'http', 'headers': []}), cached_response)
+    assert (response.status_code, response.body, response.headers['etag']) == (200, b'<html></html>', etag)
+    request = Request({'type': 'http', 'headers': [(b'if-none-match', etag.encode())]})
+    response = cached_content_response(request, cached_response)
+    assert (response.status_code, response.body) == (304, b'')
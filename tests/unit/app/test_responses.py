@@ -0,0 +1,20 @@
+import pytest
+
+from services.responses import _byte_range
+
+
+@pytest.mark.parametrize('range_header, file_size, expected_range', [
+    ('bytes=0-99', 1000, (0, 99)),
+    ('bytes=900-', 1000, (900, 999)),
+    ('bytes=900-2000', 1000, (900, 999)),
+    ('bytes=-100', 1000, (900, 999)),
+    ('bytes=-2000', 1000, (0, 999)),
+    ('bytes=1000-', 1000, None),
+    ('bytes=-0', 1000, None),
+    ('bytes=-100', 0, None),
+    ('bytes=0-', 0, None),
+    ('bytes=-', 1000, None),
+    ('bytes=0-1,5-9', 1000, None),
+])
+def test_byte_range(range_header, file_size, expected_range):
+    assert _byte_range(range_header, file_size) == expected_range
@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+
+from services.scheduler import BACKOFF_FACTOR, MAX_POLL_INTERVAL, MIN_POLL_INTERVAL, FeedPoller
+
+
+@pytest.mark.parametrize('interval, inserted_count, elapsed, expected_interval', [
+    # Publishing rate is unknown after the first poll
+    (1800, 30, None, 1800),
+    # Interval follows the average gap between new news
+    (1800, 4, 3600, 900),
+    # Interval grows while there is nothing new
+    (1800, 0, 3600, 1800 * BACKOFF_FACTOR),
+    # Interval stays within bounds
+    (1800, 100, 3600, MIN_POLL_INTERVAL),
+    (MAX_POLL_INTERVAL, 0, 3600, MAX_POLL_INTERVAL),
+])
+def test_next_interval(interval, inserted_count, elapsed, expected_interval):
+    assert FeedPoller.next_interval(interval, inserted_count, elapsed) == expected_interval
+
+
+def test_poller_loop_survives_failed_tick(monkeypatch):
+    poller = FeedPoller(tick=0)
+    # Poller error seen by each read of rss urls
+    rss_url_reads = []
+
+    def read_rss_urls():
+        rss_url_reads.append(poller.error)
+        if len(rss_url_reads) == 1:
+            raise ConnectionError('database is unavailable')
+        return []
+
+    monkeypatch.setattr(poller, '_hold_poller_lock', lambda: True)
+    monkeypatch.setattr(poller, '_read_rss_urls', read_rss_urls)
+
+    async def run_poller():
+        poller.start()
+        while len(rss_url_reads) < 3:
+            await asyncio.sleep(0)
+        assert poller.is_running
+        poller._task.cancel()
+
+    asyncio.run(run_poller())
+    # Failed tick is recorded and cleared by the next successful one
+    assert rss_url_reads == [None, 'ConnectionError: database is unavailable', None]
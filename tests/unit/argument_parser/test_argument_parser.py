@@ -1,6 +1,10 @@
+import sys
+
 import pytest
 
 from rss_parser.argument_parser.argument_parser import (NegativeOrZeroLimitArgError,
+                                                        create_arg_parser,
+                                                        read_sources_file,
                                                         validate_limit_arg)
 
 
@@ -11,3 +15,20 @@ from rss_parser.argument_parser.argument_parser import (NegativeOrZeroLimitArgEr
 def test_validate_limit_arg(expected_exception, limit_arg):
     with pytest.raises(expected_exception):
         validate_limit_arg(limit_arg)
+
+
+@pytest.mark.parametrize('content', ['# news\nhttps://example.com/rss\n\nhttps://example.org/rss\n',
+                                     '<?xml version="1.0"?><opml version="2.0"><body>'
+                                     '<outline text="News"><outline text="A" xmlUrl="https://example.com/rss"/>'
+                                     '<outline text="B" xmlUrl="https://example.org/rss"/></outline>'
+                                     '</body></opml>'])
+def test_read_sources_file(tmp_path, content):
+    sources_file = tmp_path / 'sources'
+    sources_file.write_text(content)
+    assert read_sources_file(str(sources_file)) == ['https://example.com/rss', 'https://example.org/rss']
+
+
+def test_json_lines_arg(monkeypatch):
+    monkeypatch.setattr(sys, 'argv', ['rss_reader.py', '--json-lines', '--colorize', 'https://example.com/rss'])
+    args = create_arg_parser()
+    assert (args.json_lines, args.json, args.colorize, args.source) == (True, False, True, ['https://example.com/rss'])
@@ -0,0 +1,63 @@
+import sqlite3
+
+from rss_parser.caching.caching import SCHEMA_VERSION, DataBaseHandler
+
+NEWS_FIELDS = ('url', 'rss_header', 'title', 'description', 'pubdate', 'link', 'img_link', 'img_location')
+
+
+def make_news(title):
+    return dict(zip(NEWS_FIELDS, ('https://example.com/rss', 'Example', title, 'Description',
+                                  'Sun, 17 Apr 2022 10:00:00 GMT', 'https://example.com/1', 'Empty', 'Empty')))
+
+
+def test_cached_news_table_upgrade_and_insert(tmp_path):
+    db_file = str(tmp_path / 'cached_news.db')
+    # Database file created before title became a unique key
+    connection = sqlite3.connect(db_file)
+    connection.execute("CREATE TABLE cached_news (url text, rss_header text, title text, description text, "
+                       "pubdate text, pubdate_format text, link text, img_link text, img_location text)")
+    connection.executemany("INSERT INTO cached_news VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                           [('https://example.com/rss', 'Example', 'First', '', '', '20220417', '', '', '')] * 2)
+    connection.commit()
+    connection.close()
+
+    with DataBaseHandler(db_file) as db:
+        db.create_table_cached_news()
+        db.insert_into_table_cached_news([make_news('First'), make_news('Second'), make_news('Second')])
+        assert db.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+        assert [row[2] for row in db.read_all_table_cached_news()] == ['First', 'Second']
+
+
+def test_read_table_by_pubdate_range(tmp_path):
+    pubdates = ['Sun, 17 Apr 2022 10:00:00 GMT', 'Mon, 18 Apr 2022 10:00:00 GMT', 'Empty']
+    news_list = [dict(make_news(f'News {index}'), pubdate=pubdate) for index, pubdate in enumerate(pubdates)]
+    with DataBaseHandler(str(tmp_path / 'cached_news.db')) as db:
+        db.create_table_cached_news()
+        db.insert_into_table_cached_news(news_list)
+        news_from_cache = db.read_table_by_pubdate_range(pubdate_from=DataBaseHandler.pubdate_timestamp(pubdates[0]))
+        assert [news['title'] for news in news_from_cache] == ['News 1', 'News 0']
+        news_from_cache = db.read_table_by_pubdate_range(pubdate_to=DataBaseHandler.pubdate_timestamp(pubdates[1]))
+        assert [news['title'] for news in news_from_cache] == ['News 0']
+
+
+def test_unparsable_pubdate_does_not_abort_batch(tmp_path):
+    pubdates = ['Sun, 17 Apr 2022 10:00:00 GMT', 'sometime last week', 'Mon, 18 Apr 2022 10:00:00 GMT']
+    news_list = [dict(make_news(f'News {index}'), pubdate=pubdate) for index, pubdate in enumerate(pubdates)]
+    with DataBaseHandler(str(tmp_path / 'cached_news.db')) as db:
+        db.create_table_cached_news()
+        db.insert_into_table_cached_news(news_list)
+        rows = db.execute("SELECT title, pubdate_format, pubdate_ts FROM cached_news ORDER BY title").fetchall()
+        assert [row[:2] for row in rows] == [('News 0', '20220417'), ('News 1', 'Empty'), ('News 2', '20220418')]
+        assert rows[1][2] is None and None not in (rows[0][2], rows[2][2])
+
+
+def test_search_cached_news(tmp_path):
+    news_list = [dict(make_news(title), description=description) for title, description in
+                 [('Markets fall', 'Stocks fall on rate fears'), ('Weather', 'Rain and "stormy" wind'),
+                  ('Rates', 'Central bank rate decision: rate hike')]]
+    with DataBaseHandler(str(tmp_path / 'cached_news.db')) as db:
+        db.create_table_cached_news()
+        db.insert_into_table_cached_news(news_list)
+        assert [news['title'] for news in db.search_cached_news('rate')] == ['Rates', 'Markets fall']
+        assert [news['title'] for news in db.search_cached_news('rate', limit=1, offset=1)] == ['Markets fall']
+        assert [news['title'] for news in db.search_cached_news('"stormy')] == ['Weather']
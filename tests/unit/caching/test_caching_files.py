@@ -0,0 +1,42 @@
+import os
+
+from rss_parser.caching.caching_files import ConvertedFileCache
+from rss_parser.caching.caching_images import ImageHandler, ImageStore
+from tests.unit.caching.test_caching import make_news
+
+
+def test_converted_file_cache_hit_and_eviction(tmp_path):
+    cache = ConvertedFileCache(location=str(tmp_path / 'cache'))
+    news_list = [make_news('First'), make_news('Second')]
+    first_path, cache_key = cache.convert('html', str(tmp_path / 'first.html'), news_list)
+    # The same news are copied from cache, changed news get a new key
+    second_path, second_key = cache.convert('html', str(tmp_path / 'second.html'), news_list)
+    assert second_key == cache_key
+    with open(first_path, 'rb') as first, open(second_path, 'rb') as second:
+        assert first.read() == second.read()
+    _, changed_key = cache.convert('html', str(tmp_path / 'third.html'), news_list[::-1])
+    assert changed_key != cache_key
+    # Least recently used file is evicted first
+    cache.get(changed_key, 'html')
+    cache.max_size = os.path.getsize(cache.cached_file_path(changed_key, 'html'))
+    cache.evict()
+    assert sorted(os.listdir(tmp_path / 'cache')) == [f'{changed_key}.html']
+
+
+def test_converted_file_found_with_stored_images(tmp_path):
+    cache = ConvertedFileCache(location=str(tmp_path / 'cache'))
+    store = ImageStore(location=str(tmp_path / 'images'))
+    news = dict(make_news('First'), img_link='https://example.com/first.jpg')
+    image_file = store.temporary_location(news['img_link'])
+    with open(image_file, 'wb') as file:
+        file.write(b'image')
+    store.put(news['img_link'], image_file)
+    news_list = [dict(news)]
+    ImageHandler(news_list, image_store=store).use_stored_images()
+    _, cache_key = cache.convert('html', str(tmp_path / 'first.html'), news_list)
+    # News read again get the same key once stored images are looked up, without downloading them
+    news_list = [dict(news)]
+    assert cache.get(cache.cache_key('html', news_list), 'html') is None
+    ImageHandler(news_list, image_store=store).use_stored_images()
+    assert news_list[0]['img_location'] == store.image_location(news['img_link'])
+    assert cache.get(cache.cache_key('html', news_list), 'html') == cache.cached_file_path(cache_key, 'html')
@@ -0,0 +1,71 @@
+import os
+
+import pytest
+from PIL import Image
+
+from rss_parser.caching.caching_images import (IMAGE_VARIANTS, MAX_IMAGE_PIXELS, ImageHandler, ImageRejectedError,
+                                               ImageStore, image_variant, prepare_image, variant_location)
+
+
+def put_image(store, img_link, content):
+    image_file = store.temporary_location(img_link)
+    with open(image_file, 'wb') as file:
+        file.write(content)
+    return store.put(img_link, image_file, etag=f'"{img_link}"')
+
+
+def test_image_store_put_lookup_and_eviction(tmp_path):
+    store = ImageStore(location=str(tmp_path / 'images'), max_size=20)
+    img_links = [f'https://example.com/images/{index}.jpg' for index in range(3)]
+    locations = [put_image(store, img_link, b'0123456789') for img_link in img_links]
+    assert len(set(locations)) == 3
+    assert all(location.endswith('.jpg') and os.path.isfile(location) for location in locations)
+    # First image becomes the most recently used one, second is evicted
+    assert store.lookup(img_links[:1] + ['https://example.com/missing.jpg']) == {img_links[0]: locations[0]}
+    store.evict()
+    assert store.lookup(img_links) == {img_links[0]: locations[0], img_links[2]: locations[2]}
+    assert not os.path.exists(locations[1])
+    # Images become stale after time to live and are revalidated with their validators
+    assert store.stale_images(img_links) == {}
+    assert store.stale_images(img_links[:1], ttl=-1) == {img_links[0]: (f'"{img_links[0]}"', None)}
+
+
+def test_prepare_image_makes_variants_and_keeps_original(tmp_path):
+    large_image, small_image, not_image = (str(tmp_path / name) for name in ('large.jpg', 'small.png', 'text.png'))
+    Image.new('RGB', (1000, 500)).save(large_image, format='JPEG')
+    Image.new('RGBA', (100, 50)).save(small_image, format='PNG')
+    with open(not_image, 'w') as file:
+        file.write('not an image')
+    assert prepare_image(large_image, large_image) == (1000, 500)
+    with Image.open(large_image) as image:
+        assert image.size == (1000, 500)
+    for variant, (max_width, image_format) in IMAGE_VARIANTS.items():
+        assert image_variant(large_image, variant) == variant_location(large_image, variant)
+        with Image.open(variant_location(large_image, variant)) as image:
+            assert (image.format, image.size) == (image_format, (max_width, max_width // 2))
+    # Small images are not enlarged, transparent images are saved as JPEG with white background
+    assert prepare_image(small_image, small_image) == (100, 50)
+    with Image.open(variant_location(small_image, 'document')) as image:
+        assert (image.mode, image.size, image.getpixel((0, 0))) == ('RGB', (100, 50), (255, 255, 255))
+    # Files which are not images and too large images are rejected
+    with pytest.raises(ImageRejectedError):
+        prepare_image(not_image, not_image)
+    assert image_variant(not_image, 'article') == not_image
+    assert image_variant('Empty', 'article') == 'Empty'
+    Image.new('1', (MAX_IMAGE_PIXELS // 1000 + 1, 1000)).save(large_image, format='PNG')
+    with pytest.raises(ImageRejectedError):
+        prepare_image(large_image, large_image)
+
+
+def test_undecodable_image_is_not_stored(tmp_path, monkeypatch):
+    monkeypatch.setattr('rss_parser.caching.caching_images.resize_in_pool', prepare_image)
+    store = ImageStore(location=str(tmp_path / 'images'))
+    handler = ImageHandler([], image_store=store)
+    img_link = 'https://example.com/images/text.png'
+    image_file = store.temporary_location(img_link)
+    with open(image_file, 'w') as file:
+        file.write('not an image')
+    downloaded_image = {'not_modified': False, 'image_file': image_file, 'etag': None, 'last_modified': None}
+    assert handler.store_image(img_link, downloaded_image) is None
+    assert not os.path.exists(image_file)
+    assert store.lookup([img_link]) == {}
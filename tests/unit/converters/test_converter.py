@@ -0,0 +1,68 @@
+import json
+import os
+import re
+import zipfile
+from collections import Counter
+
+from PIL import Image
+
+from rss_parser.converters.converter import Converter, jinja_environment
+from tests.unit.caching.test_caching import make_news
+
+
+def test_iter_json_lines():
+    consumed_titles = []
+
+    def news_generator():
+        for title in ('First', 'Second'):
+            consumed_titles.append(title)
+            yield make_news(title)
+
+    lines = Converter.iter_json_lines(news_generator())
+    # News are converted one by one as lines are read
+    first_line = next(lines)
+    assert consumed_titles == ['First']
+    assert first_line.endswith('}\n') and first_line.count('\n') == 1 and '": ' not in first_line
+    assert json.loads(first_line) == Converter.json_item(make_news('First'))
+    assert [json.loads(line)['Article']['title'] for line in lines] == ['Second']
+    # Colorized lines are the same json objects with terminal color codes
+    colorized_lines = list(Converter.iter_json_lines([make_news('First')], colorize=True))
+    assert len(colorized_lines) == 1 and '\x1b[' in colorized_lines[0]
+    assert re.sub(r'\x1b\[[0-9;]*m', '', colorized_lines[0]) == first_line
+
+
+def test_templates_are_loaded_once(tmp_path, monkeypatch):
+    jinja_environment.cache_clear()
+    loader = jinja_environment().loader
+    loaded_templates = Counter()
+
+    def get_source(environment, template):
+        loaded_templates[template] += 1
+        return type(loader).get_source(loader, environment, template)
+
+    monkeypatch.setattr(loader, 'get_source', get_source)
+    news_list = [make_news(f'News {index}') for index in range(1000)]
+    assert os.path.isfile(Converter.convert_to_epub(str(tmp_path / 'news.epub'), news_list))
+    for index in range(2):
+        assert os.path.isfile(Converter.convert_to_html(str(tmp_path / f'news_{index}.html'), news_list[:10]))
+        assert os.path.isfile(Converter.convert_to_pdf(str(tmp_path / f'news_{index}.pdf'), news_list[:10]))
+    assert loaded_templates == {'epub_template.html': 1, 'html_template.html': 1}
+
+
+def test_epub_stores_each_image_once(tmp_path):
+    # Two news have the same image under different locations, two news have no image
+    image_locations = [str(tmp_path / name) for name in ('first.jpg', 'second.jpg')]
+    for image_location in image_locations:
+        Image.new('RGB', (100, 50)).save(image_location, format='JPEG')
+    news_list = [dict(make_news(f'News {index}'), img_location=img_location)
+                 for index, img_location in enumerate(image_locations + ['Empty', 'Empty'])]
+    epub_path = Converter.convert_to_epub(str(tmp_path / 'news.epub'), news_list)
+    with zipfile.ZipFile(epub_path) as book:
+        file_names = book.namelist()
+    assert len([file_name for file_name in file_names if 'book_page_' in file_name]) == 4
+    # Shared image and placeholder image of news without an image
+    assert len([file_name for file_name in file_names if '/images/' in file_name]) == 2
+    # Placeholder image isn't stored if every news has an image
+    epub_path = Converter.convert_to_epub(str(tmp_path / 'images.epub'), news_list[:2])
+    with zipfile.ZipFile(epub_path) as book:
+        assert len([file_name for file_name in book.namelist() if '/images/' in file_name]) == 1
@@ -1,18 +1,107 @@
+import json
+
 import pytest
+import requests
 
-from rss_parser.news_parser.news_parser import (NotRssFeedUrlError,
+from rss_parser.news_parser.news_parser import (FEED_TIMEOUT, NON_XML_FEED, REGULAR_FEED,
+                                                FeedDocument, NotRssFeedUrlError,
                                                 rss_feed_type_checker,
-                                                validate_url_is_rss_feed, parse_rss_feed_regularly)
+                                                validate_url_is_rss_feed, parse_rss_feed,
+                                                parse_rss_feed_regularly, parse_rss_feed_with_non_xml)
+
+RSS_FEED = b"""<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0" xmlns:media="http://search.yahoo.com/mrss/">
+<channel>
+<title>Test feed</title>
+<item>
+<title>First news</title>
+<description>First description</description>
+<pubDate>Sun, 17 Apr 2022 10:00:00 +0000</pubDate>
+<link>https://example.com/first</link>
+<media:content url="https://example.com/first.jpg"/>
+</item>
+<item>
+<title>Second news</title>
+<link>https://example.com/second</link>
+</item>
+</channel>
+</rss>"""
 
 
 @pytest.mark.parametrize('expected_exception, url', [(NotRssFeedUrlError, 'http://www.google.com')])
 def test_validate_url_is_rss_feed(expected_exception, url):
     with pytest.raises(expected_exception):
-        validate_url_is_rss_feed(url)
+        validate_url_is_rss_feed(FeedDocument.fetch(url))
 
 
 @pytest.mark.parametrize('url, expected_result', [('https://lifehacker.com/rss', True),
                                                   ('https://news.yahoo.com/rss', False),
                                                   ('https://rss.dw.com/xml/rss-ru-ger', False)])
 def test_rss_feed_type_checker(url, expected_result):
-    assert rss_feed_type_checker(url) == expected_result
+    assert rss_feed_type_checker(FeedDocument.fetch(url)) == expected_result
+
+
+def test_fetch_times_out(monkeypatch):
+    def slow_get(url, **kwargs):
+        assert kwargs['timeout'] == FEED_TIMEOUT
+        raise requests.exceptions.ReadTimeout
+
+    monkeypatch.setattr(requests, 'get', slow_get)
+    with pytest.raises(requests.exceptions.Timeout):
+        FeedDocument.fetch('https://example.com/rss')
+
+
+def test_parse_rss_feed_regularly_from_feed_document():
+    feed = FeedDocument(url='https://example.com/rss', content=RSS_FEED, status_code=200)
+    validate_url_is_rss_feed(feed)
+    news_list = parse_rss_feed_regularly(feed, limit_arg=1)
+    assert news_list == [{
+        'url': 'https://example.com/rss',
+        'rss_header': 'Test feed',
+        'title': 'First news',
+        'description': 'First description',
+        'pubdate': 'Sun, 17 Apr 2022 10:00:00 +0000',
+        'pubdate_format': 'Empty',
+        'link': 'https://example.com/first',
+        'img_link': 'https://example.com/first.jpg',
+        'img_location': 'Empty'
+    }]
+
+
+@pytest.mark.parametrize('news_limit, limit_arg, expected_length', [(None, None, 2),
+                                                                    (None, 1, 1),
+                                                                    (1, 1, 1),
+                                                                    (1, None, None),
+                                                                    (1, 2, None),
+                                                                    (5, 3, 2)])
+def test_not_modified_feed_reuses_cached_news(news_limit, limit_arg, expected_length):
+    cached_news = [{'title': 'First news'}, {'title': 'Second news'}][0:news_limit]
+    cache_entry = {'etag': '"v1"', 'last_modified': None, 'body': RSS_FEED,
+                   'news': json.dumps(cached_news), 'news_limit': news_limit}
+    feed = FeedDocument(url='https://example.com/rss', content=RSS_FEED, status_code=304, cache_entry=cache_entry)
+    news_list = feed.cached_news(limit_arg)
+    assert (None if news_list is None else len(news_list)) == expected_length
+    assert feed.etag == '"v1"'
+
+
+def test_parse_rss_feed_with_non_xml_stops_at_limit():
+    item = (b"<item><title>News</title><link>https://example.com/news</link>"
+            b"<description><![CDATA[<p>Text &amp; <b>more</b></p><img src='https://example.com/img.jpg'/>"
+            b"<a href='https://example.com'>link</a>]]></description></item>")
+    content = b"<rss><channel><title>Test feed</title>" + item * 3 + b"<item><title>Broken"
+    feed = FeedDocument(url='https://example.com/rss', content=content, status_code=200)
+    assert rss_feed_type_checker(feed)
+    news_list = parse_rss_feed_with_non_xml(feed, limit_arg=2)
+    assert len(news_list) == 2
+    assert news_list[0]['description'] == 'Text & more'
+    assert news_list[0]['img_link'] == 'https://example.com/img.jpg'
+
+
+@pytest.mark.parametrize('dialect, expected_dialect, expected_img_link',
+                         [(None, REGULAR_FEED, 'https://example.com/first.jpg'),
+                          (NON_XML_FEED, NON_XML_FEED, 'Empty')])
+def test_parse_rss_feed_detects_dialect_once(dialect, expected_dialect, expected_img_link):
+    feed = FeedDocument(url='https://example.com/rss', content=RSS_FEED, status_code=200, dialect=dialect)
+    news_list = parse_rss_feed(feed)
+    assert feed.dialect == expected_dialect
+    assert news_list[0]['img_link'] == expected_img_link